@@ -10,15 +10,45 @@ import pandas as pd
 import numpy as np
 from PIL import Image
 import io
-import re
-import sqlite3
+import os
 import hashlib
+import time
 from datetime import datetime
 import plotly.express as px
-import plotly.graph_objects as go
 import warnings
+from autocomplete import PINYIN_AVAILABLE, build_name_index
+from catalog import build_catalog
+from contraindications import CONTRAINDICATED, PROFILE_OPTIONS, build_contraindication_index
+from dashboard import DASHBOARD_TABLES, build_dashboard, review_trend_figure
+from database import MEDICINE_COLUMNS, REVIEW_COLUMNS, format_day, get_data_versions, init_database
+from export import (PARQUET_AVAILABLE, ExportFile, export_query, medicine_filter_query, review_filter_query,
+                    sweep_exports)
+from hot_reload import CatalogStore
+from query_cache import QueryCache
+from recommend import build_similarity_table, get_similar_medicines
+from review_ingest import ReviewIngestor
+from review_trends import ensure_review_rollups, get_review_trend
+from reviewer_signals import get_flagged_reviewers, update_reviewer_signals
+from screening import (DUPLICATE_INGREDIENT, build_screening_index, check_duplications, check_interactions,
+                       find_allergy_warnings, interactions_for_drug, lookup_interaction, resolve_medicine)
+from segmentation import segment_reviews, top_review_terms
+from side_effect_mining import get_side_effect_mentions, mine_side_effects
+from snapshot import build_facets, open_snapshot
+from symptom_search import build_symptom_index
 warnings.filterwarnings('ignore')
 
+# 可视化页面把预先序列化的 Plotly JSON 直接作为图表元素发送，不经 st.plotly_chart 再次校验和序列化；
+# 这依赖 Streamlit 的内部接口，版本不支持时退回 st.plotly_chart
+try:
+    from streamlit.elements.lib.layout_utils import LayoutConfig
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+    PLOTLY_JSON_AVAILABLE = 'spec' in PlotlyChartProto.DESCRIPTOR.fields_by_name
+except ImportError:
+    PLOTLY_JSON_AVAILABLE = False
+
+# Plotly 图表未设置高度时的默认高度（与 plotly.js 一致）
+PLOTLY_DEFAULT_HEIGHT = 450
+
 # 设置页面
 st.set_page_config(
     page_title="识药匙 - 药品信息智能分析系统",
@@ -27,142 +57,132 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 初始化数据库
-def init_database():
-    conn = sqlite3.connect(':memory:')  # 使用内存数据库，避免文件权限问题
-    cursor = conn.cursor()
-    
-    # 创建药品信息表
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS medicines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        generic_name TEXT NOT NULL,
-        brand_name TEXT,
-        indications TEXT,
-        contraindications TEXT,
-        side_effects TEXT,
-        ingredients TEXT,
-        suitable_for TEXT,
-        price_range TEXT,
-        category TEXT
-    )
-    ''')
-    
-    # 创建评论表
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS reviews (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        medicine_id INTEGER,
-        user_id TEXT,
-        rating INTEGER,
-        content TEXT,
-        date TEXT,
-        helpful_count INTEGER,
-        verified_purchase INTEGER,
-        credibility_score REAL,
-        tags TEXT,
-        FOREIGN KEY (medicine_id) REFERENCES medicines (id)
-    )
-    ''')
-    
-    # 创建药品相互作用表
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS drug_interactions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        drug1 TEXT,
-        drug2 TEXT,
-        interaction_type TEXT,
-        severity TEXT,
-        description TEXT,
-        recommendation TEXT
-    )
-    ''')
-    
-    # 插入示例药品数据
-    sample_medicines = [
-        ('布洛芬', '芬必得', '头痛、牙痛、痛经、关节痛', 
-         '对阿司匹林或其他非甾体抗炎药过敏者禁用，胃溃疡患者禁用', 
-         '恶心、胃痛、头晕、皮疹', '布洛芬', '成人', '20-40元', '非处方药'),
-        ('对乙酰氨基酚', '泰诺', '感冒发热、头痛、关节痛、神经痛', 
-         '严重肝肾功能不全者禁用', '恶心、皮疹、肝功能异常', '对乙酰氨基酚', 
-         '成人、儿童', '15-30元', '非处方药'),
-        ('奥美拉唑', '洛赛克', '胃溃疡、十二指肠溃疡、反流性食管炎', 
-         '孕妇、哺乳期妇女禁用', '头痛、腹泻、恶心、皮疹', '奥美拉唑', 
-         '成人', '30-60元', '处方药'),
-        ('维生素C', '力度伸', '预防和治疗坏血病，增强免疫力', 
-         '对成分过敏者禁用', '腹泻、恶心、胃痉挛', '维生素C', 
-         '全人群', '20-50元', '保健品'),
-        ('蒙脱石散', '思密达', '成人及儿童急、慢性腹泻', 
-         '肠道梗阻者禁用', '便秘、大便干结', '蒙脱石', 
-         '成人、儿童', '15-30元', '非处方药'),
-        ('板蓝根颗粒', '白云山', '肺胃热盛所致的咽喉肿痛、口咽干燥', 
-         '风寒感冒者不适用，糖尿病患者慎用', '恶心、腹泻、皮疹', 
-         '板蓝根', '全人群', '10-25元', '中成药'),
-        ('阿莫西林', '阿莫仙', '敏感菌所致的感染', 
-         '青霉素过敏者禁用', '皮疹、恶心、腹泻', '阿莫西林', 
-         '成人、儿童', '15-40元', '处方药'),
-        ('葡萄糖酸钙', '钙尔奇', '预防和治疗钙缺乏症', 
-         '高钙血症、高钙尿症患者禁用', '便秘、恶心、腹痛', 
-         '葡萄糖酸钙、维生素D', '全人群', '30-80元', '保健品')
-    ]
-    
-    cursor.executemany('''
-    INSERT INTO medicines (generic_name, brand_name, indications, contraindications, 
-                          side_effects, ingredients, suitable_for, price_range, category)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sample_medicines)
-    
-    # 插入示例评论数据
-    sample_reviews = [
-        (1, 'user001', 5, '效果很好，头痛很快缓解了，没有副作用', '2023-10-15', 12, 1, 0.9, '可信'),
-        (1, 'user002', 1, '吃了胃不舒服，不建议胃不好的人使用', '2023-11-20', 8, 1, 0.8, '可信'),
-        (1, 'user003', 5, '好', '2023-12-01', 0, 0, 0.2, '疑似灌水'),
-        (1, 'user004', 5, '物流很快，包装完好，客服态度很好', '2023-12-05', 2, 1, 0.3, '无关内容'),
-        (1, 'user005', 5, '这个药太神奇了，吃了马上见效，简直是神药！', '2023-12-10', 1, 0, 0.4, '夸大宣传'),
-        (2, 'user006', 4, '退烧效果不错，孩子发烧时用的', '2023-10-22', 15, 1, 0.85, '可信'),
-        (2, 'user007', 3, '效果一般，没有明显退烧', '2023-11-05', 5, 1, 0.75, '可信'),
-        (3, 'user008', 5, '胃痛缓解很明显，医生推荐的', '2023-09-30', 20, 1, 0.95, '可信'),
-        (4, 'user009', 4, '增强免疫力，感冒少了', '2023-11-15', 10, 1, 0.8, '可信'),
-        (5, 'user010', 5, '腹泻很快止住了，效果很好', '2023-12-03', 18, 1, 0.9, '可信'),
-        (6, 'user011', 4, '感冒时喝效果不错', '2023-11-10', 7, 1, 0.7, '可信'),
-        (7, 'user012', 5, '感染控制得很好', '2023-10-05', 9, 1, 0.85, '可信'),
-        (8, 'user013', 4, '补钙效果不错，腿不抽筋了', '2023-12-01', 6, 1, 0.75, '可信')
-    ]
-    
-    cursor.executemany('''
-    INSERT INTO reviews (medicine_id, user_id, rating, content, date, helpful_count, verified_purchase, credibility_score, tags)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sample_reviews)
-    
-    # 插入药品相互作用数据
-    interactions = [
-        ('布洛芬', '阿司匹林', '药效叠加', '中度', '两者均为非甾体抗炎药，同时使用可能增加胃肠道副作用风险', '避免同时使用，如需合用请咨询医生'),
-        ('布洛芬', '华法林', '增加出血风险', '重度', '布洛芬可能增强华法林的抗凝效果，增加出血风险', '避免同时使用，如需合用需密切监测凝血功能'),
-        ('阿莫西林', '避孕药', '降低药效', '轻度', '阿莫西林可能降低避孕药效果', '使用阿莫西林期间建议采取额外避孕措施'),
-        ('对乙酰氨基酚', '酒精', '肝损伤', '重度', '同时使用可能增加肝损伤风险', '使用期间避免饮酒'),
-        ('奥美拉唑', '氯吡格雷', '降低药效', '中度', '奥美拉唑可能降低氯吡格雷的抗血小板效果', '如需合用请咨询医生，考虑使用其他胃药'),
-        ('维生素C', '铁剂', '促进吸收', '轻度', '维生素C可以促进铁的吸收', '可以同时服用，增强补铁效果'),
-        ('蒙脱石散', '其他药物', '影响吸收', '中度', '蒙脱石散可能影响其他药物的吸收', '与其他药物间隔1-2小时服用')
-    ]
-    
-    cursor.executemany('''
-    INSERT INTO drug_interactions (drug1, drug2, interaction_type, severity, description, recommendation)
-    VALUES (?, ?, ?, ?, ?, ?)
-    ''', interactions)
-    
-    conn.commit()
-    return conn
+# 数据库路径：未指定时使用程序目录下的 WAL 模式文件数据库，所有会话和后台线程看到同一份已提交的数据；
+# 共享缓存的内存数据库（file:名称?mode=memory&cache=shared）是表级锁，只适合不开启评论导入等后台写入的场景
+DB_PATH = os.environ.get('MEDICINE_DB_PATH',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'medicines.db'))
+
+# 预构建快照：由 snapshot.py 生成，默认位于程序目录下（不随工作目录变化），可通过环境变量 MEDICINE_SNAPSHOT 指定
+SNAPSHOT_PATH = os.environ.get('MEDICINE_SNAPSHOT',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.snapshot'))
+
+# 页面下载的导出文件上限：下载按钮会把整个文件读入内存，更大的结果请用 export.py 命令行导出
+EXPORT_MAX_DOWNLOAD_BYTES = int(os.environ.get('MEDICINE_EXPORT_MAX_BYTES', 50 * 1024 * 1024))
+
+# 新评论队列目录：设置 MEDICINE_REVIEW_SPOOL 后在后台线程中持续写入新评论
+REVIEW_SPOOL = os.environ.get('MEDICINE_REVIEW_SPOOL')
+
+# 派生索引及其依赖的表；某张表变化时只重建依赖它的索引
+INDEX_BUILDERS = {
+    'catalog': (['medicines'], build_catalog),
+    'name_index': (['medicines'], build_name_index),
+    'contraindication_index': (['medicines'], build_contraindication_index),
+    'screening_index': (['medicines', 'drug_interactions', 'drug_classes'], build_screening_index),
+    'symptom_index': (['medicines'], build_symptom_index),
+    'facets': (['medicines'], build_facets),
+    'similarity_table': (['medicines'], build_similarity_table),
+    'dashboard': (DASHBOARD_TABLES, build_dashboard)
+}
+
+@st.cache_resource
+def get_catalog_store():
+    # 同一进程内所有会话共用一个数据仓库，后台线程负责热更新
+    init_conn = init_database(DB_PATH)
+    ensure_review_rollups(init_conn)
+    update_reviewer_signals(init_conn)
+    mine_side_effects(init_conn)
+    segment_reviews(init_conn, workers=1)
+    seed, seed_versions = {}, None
+    snapshot = open_snapshot(SNAPSHOT_PATH, init_conn)
+    if snapshot is not None:
+        seed_versions = snapshot.versions
+        seed = {
+            'screening_index': snapshot.screening_index,
+            'symptom_index': snapshot.symptom_index,
+            'facets': snapshot.facets
+        }
+    store = CatalogStore(DB_PATH, INDEX_BUILDERS, seed=seed, seed_versions=seed_versions).start()
+    init_conn.close()
+    return store
+
+# 初始化数据库连接：每个会话一个读连接，脚本重跑时复用，会话结束时随会话状态回收
+catalog_store = get_catalog_store()
+if 'db_conn' not in st.session_state:
+    st.session_state['db_conn'] = catalog_store.connect()
+conn = st.session_state['db_conn']
 
-# 初始化数据库连接
-conn = init_database()
+@st.cache_resource
+def get_query_cache():
+    # 所有会话共用的查询结果缓存，数据变化时清理依赖的条目
+    cache = QueryCache()
+    catalog_store.subscribe(cache.invalidate)
+    return cache
+
+query_cache = get_query_cache()
+
+@st.cache_resource
+def get_review_ingestor():
+    # 数据库初始化完成后再启动写入线程；未配置队列目录时不启动
+    if not REVIEW_SPOOL:
+        return None
+    return ReviewIngestor(DB_PATH, REVIEW_SPOOL).start()
+
+review_ingestor = get_review_ingestor()
+
+# 带缓存的查询，tables 为结果依赖的表
+# 键使用数据库当前的数据版本，而不是热更新索引的版本：索引重建较慢或失败时，写入后的查询也不会命中旧结果
+def cached_query(sql, params=(), tables=('medicines',)):
+    return query_cache.fetchall(conn, sql, params, tables, get_data_versions(conn))
+
+def get_screening_index():
+    return catalog_store.get('screening_index')
+
+def get_symptom_index():
+    return catalog_store.get('symptom_index')
+
+def get_facets():
+    return catalog_store.get('facets')
+
+# 列式药品目录，所有页面共用，不再逐次重跑拷贝药品表
+def get_catalog():
+    return catalog_store.get('catalog')
+
+def get_name_index():
+    return catalog_store.get('name_index')
+
+def get_contraindication_index():
+    return catalog_store.get('contraindication_index')
+
+# 可视化页面的图表由后台线程预先生成
+def get_dashboard():
+    return catalog_store.get('dashboard')
+
+# 显示某药品对当前患者情况的禁忌提示
+def render_profile_warnings(medicine_id):
+    for condition, level, reason in get_contraindication_index().warnings_for(medicine_id, profile_conditions):
+        if level == CONTRAINDICATED:
+            st.error(f"⛔ **{condition}禁用**: {reason}")
+        else:
+            st.warning(f"⚠️ **{condition}慎用**: {reason}")
 
 # 显示药品结果的函数 - 需要在调用之前定义
-def display_medicine_results(medicines, cursor, conn):
+def display_medicine_results(medicines):
+    # 按患者情况隐藏禁用药品
+    if exclude_unsafe and excluded_ids:
+        visible = [med for med in medicines if med[0] not in excluded_ids]
+        if len(visible) < len(medicines):
+            st.info(f"👤 已根据患者情况隐藏 {len(medicines) - len(visible)} 个禁用药品")
+        medicines = visible
+    
     if medicines:
         st.success(f"✅ 找到 {len(medicines)} 个相关药品")
+        screening_index = get_screening_index()
         
         for med in medicines:
             with st.expander(f"💊 {med[1]} ({med[2]}) - {med[9]}", expanded=True):
+                if med[0] in excluded_ids or med[0] in flagged_ids:
+                    render_profile_warnings(med[0])
+                
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -178,8 +198,8 @@ def display_medicine_results(medicines, cursor, conn):
                     st.markdown(f"**价格范围**: {med[8]}")
                 
                 # 获取药品评论
-                cursor.execute("SELECT * FROM reviews WHERE medicine_id = ? ORDER BY credibility_score DESC LIMIT 3", (med[0],))
-                reviews = cursor.fetchall()
+                reviews = cached_query("SELECT * FROM reviews WHERE medicine_id = ? ORDER BY credibility_score DESC LIMIT 3",
+                                       (med[0],), ['reviews'])
                 
                 if reviews:
                     st.subheader("💬 可信用户评论（前3条）")
@@ -187,61 +207,122 @@ def display_medicine_results(medicines, cursor, conn):
                         rating_stars = "⭐" * review[3]
                         credibility_color = "🟢" if review[8] >= 0.7 else "🟡" if review[8] >= 0.4 else "🔴"
                         st.markdown(f"{credibility_color} **{rating_stars}** - {review[4]}")
-                        st.caption(f"可信度: {review[8]*100:.1f}% | 有用数: {review[6]} | 日期: {review[5]}")
+                        st.caption(f"可信度: {review[8]*100:.1f}% | 有用数: {review[6]} | 日期: {format_day(review[5])}")
                 else:
                     st.info("暂无评论")
                 
                 # 安全提示
                 st.subheader("🛡️ 安全提示")
                 
-                # 检查药物相互作用
-                cursor.execute("""
-                SELECT * FROM drug_interactions 
-                WHERE drug1 = ? OR drug2 = ?
-                """, (med[1], med[1]))
-                
-                interactions = cursor.fetchall()
+                # 检查药物相互作用（含类别规则与通配规则）
+                interactions = interactions_for_drug(med[1], screening_index)
                 
                 if interactions:
-                    for interaction in interactions:
-                        other_drug = interaction[2] if interaction[1] == med[1] else interaction[1]
+                    for other_drug, interaction in interactions:
                         severity_color = {
                             '重度': '🔴',
                             '中度': '🟡',
                             '轻度': '🟢'
-                        }.get(interaction[4], '⚪')
+                        }.get(interaction['severity'], '⚪')
                         
-                        st.warning(f"{severity_color} **相互作用提醒**: {med[1]}与{other_drug}同时使用可能导致{interaction[5]}")
+                        st.warning(f"{severity_color} **相互作用提醒**: {med[1]}与{other_drug}同时使用可能导致{interaction['description']}")
+                
+                # 用户评论中提及的副作用（预先汇总）
+                observed = get_side_effect_mentions(conn, med[0])
+                if observed:
+                    st.markdown("**👥 用户反馈的副作用**: " + "、".join(
+                        f"{term}（{count}次{'' if listed else '，说明书未列出'}）"
+                        for term, count, weighted, listed in observed
+                    ))
                 
                 # 过敏提示（示例）
                 st.info("💡 **过敏提示**: 使用前请确认无相关成分过敏史")
                 
-                # 推荐同类药品
+                # 推荐相似药品（按内容相似度预先计算）
                 st.subheader("🔍 同类药品推荐")
-                cursor.execute("""
-                SELECT generic_name, brand_name, indications, price_range 
-                FROM medicines 
-                WHERE category = ? AND id != ? 
-                LIMIT 3
-                """, (med[9], med[0]))
-                
-                similar_drugs = cursor.fetchall()
+                similar_drugs = get_similar_medicines(conn, med[0], limit=3)
+                if exclude_unsafe:
+                    similar_drugs = [similar for similar in similar_drugs if similar[5] not in excluded_ids]
                 
                 if similar_drugs:
                     for similar in similar_drugs:
-                        st.markdown(f"- **{similar[0]} ({similar[1]})**: {similar[2][:50]}... | 价格: {similar[3]}")
+                        caution = " ⚠️ 不适合当前患者情况" if similar[5] in excluded_ids or similar[5] in flagged_ids else ""
+                        st.markdown(f"- **{similar[0]} ({similar[1]})**: {similar[2][:50]}... | 价格: {similar[3]} | 相似度: {similar[4]:.2f}{caution}")
                 else:
                     st.info("暂无同类药品推荐")
     else:
         st.warning("❌ 未在数据库中找到匹配的药品信息")
         
         st.markdown("### 📋 数据库中的药品列表：")
-        cursor.execute("SELECT generic_name, brand_name, category FROM medicines")
-        all_drugs = cursor.fetchall()
-        
-        drug_list = pd.DataFrame(all_drugs, columns=['通用名', '品牌名', '类别'])
+        catalog = get_catalog()
+        drug_list = pd.DataFrame({
+            '通用名': catalog.column('generic_name'),
+            '品牌名': catalog.column('brand_name'),
+            '类别': catalog.column('category')
+        })
         st.dataframe(drug_list, use_container_width=True)
 
+# 药品选择器：按输入前缀在服务端补全，只把前 k 个候选发送到浏览器
+def render_medicine_picker(label, key):
+    hint = "通用名、品牌名或拼音首字母" if PINYIN_AVAILABLE else "通用名或品牌名"
+    prefix = st.text_input(f"输入药品名称（{hint}）", key=f"{key}_prefix")
+    completions = get_name_index().complete(prefix)
+    
+    if not completions:
+        st.info("没有匹配的药品")
+        return None
+    
+    options = {name: medicine_id for medicine_id, name in completions}
+    selected_name = st.selectbox(label, list(options.keys()), key=f"{key}_picker")
+    return options[selected_name]
+
+# 导出按钮：点击后才从数据库流式写出临时文件，再提供下载
+def render_export_buttons(sql, params, columns, file_stem, key):
+    formats = ['CSV'] + (['Parquet'] if PARQUET_AVAILABLE else [])
+    col1, col2 = st.columns([1, 3])
+    
+    with col1:
+        export_format = st.selectbox("导出格式", formats, key=f"{key}_export_format")
+    suffix = '.csv' if export_format == 'CSV' else '.parquet'
+    signature = (sql, tuple(params), suffix)
+    
+    # 筛选条件变化后，旧的导出文件立即删除；会话结束时随会话状态一起回收
+    prepared = st.session_state.get(f"{key}_export")
+    if prepared is not None and prepared.signature != signature:
+        prepared.remove()
+        prepared = st.session_state[f"{key}_export"] = None
+    
+    with col2:
+        if st.button("📥 生成导出文件", key=f"{key}_export_prepare"):
+            sweep_exports()
+            if prepared is not None:
+                prepared.remove()
+            prepared = ExportFile(suffix, signature)
+            prepared.row_count = export_query(conn, sql, params, columns, prepared.path)
+            st.session_state[f"{key}_export"] = prepared
+        
+        if prepared is not None:
+            size = prepared.size
+            if size > EXPORT_MAX_DOWNLOAD_BYTES:
+                st.warning(f"导出文件 {size / 1024 / 1024:.0f} MB，超过页面下载上限 "
+                           f"{EXPORT_MAX_DOWNLOAD_BYTES / 1024 / 1024:.0f} MB，请使用 export.py 命令行导出")
+            else:
+                with open(prepared.path, 'rb') as f:
+                    st.download_button(f"⬇️ 下载（{prepared.row_count} 行）", f, file_name=f"{file_stem}{suffix}",
+                                       key=f"{key}_export_download")
+
+# 评论趋势图：直接读取预先分桶的汇总表
+def render_review_trend(medicine_id, key):
+    bucket_label = st.radio("统计粒度", ["按月", "按天"], horizontal=True, key=f"{key}_trend_bucket")
+    bucket = 'month' if bucket_label == "按月" else 'day'
+    trend = get_review_trend(conn, medicine_id, bucket)
+    
+    if not trend:
+        st.info("暂无评论趋势数据")
+        return
+    
+    st.plotly_chart(review_trend_figure(trend), use_container_width=True)
+
 # 标题和介绍
 st.title("💊 识药匙 - 药品与保健品信息智能分析系统")
 st.markdown("### 通过智能技术辅助您的健康决策，让用药更安全、更安心")
@@ -255,6 +336,13 @@ page = st.sidebar.radio(
      "🛡️ 个性化安全查询", "📊 数据可视化", "ℹ️ 关于系统"]
 )
 
+# 患者情况：搜索、筛选和推荐结果按禁忌症索引排除或提示不宜使用的药品
+st.sidebar.markdown("### 👤 患者情况")
+profile_labels = st.sidebar.multiselect("选择符合的情况", list(PROFILE_OPTIONS.keys()), key="patient_profile")
+profile_conditions = [PROFILE_OPTIONS[label] for label in profile_labels]
+exclude_unsafe = st.sidebar.checkbox("隐藏禁用药品", value=True, key="exclude_unsafe")
+excluded_ids, flagged_ids = get_contraindication_index().assess(profile_conditions)
+
 # 首页
 if page == "🏠 首页":
     st.header("欢迎使用识药匙")
@@ -285,15 +373,12 @@ if page == "🏠 首页":
     
     with col2:
         # 显示统计信息
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM medicines")
-        med_count = cursor.fetchone()[0]
+        med_count = len(get_catalog())
         
-        cursor.execute("SELECT COUNT(*) FROM reviews")
-        review_count = cursor.fetchone()[0]
+        review_count = cached_query("SELECT COUNT(*) FROM reviews", (), ['reviews'])[0][0]
         
-        cursor.execute("SELECT AVG(credibility_score) FROM reviews WHERE credibility_score > 0")
-        avg_credibility = cursor.fetchone()[0] or 0
+        avg_credibility = cached_query("SELECT AVG(credibility_score) FROM reviews WHERE credibility_score > 0",
+                                       (), ['reviews'])[0][0] or 0
         
         st.metric("药品数量", med_count)
         st.metric("评论数量", review_count)
@@ -313,13 +398,13 @@ if page == "🏠 首页":
     
     st.markdown("---")
     st.markdown("### 📋 药品库预览")
-    cursor.execute("SELECT generic_name, brand_name, category, indications FROM medicines LIMIT 5")
-    preview_data = cursor.fetchall()
+    catalog = get_catalog()
+    preview_data = catalog.records(range(min(5, len(catalog))))
     
     for med in preview_data:
-        with st.expander(f"{med[0]} ({med[1]}) - {med[2]}", expanded=False):
-            st.write(f"**适应症**: {med[3]}")
-            st.write(f"**类别**: {med[2]}")
+        with st.expander(f"{med.generic_name} ({med.brand_name}) - {med.category}", expanded=False):
+            st.write(f"**适应症**: {med.indications}")
+            st.write(f"**类别**: {med.category}")
 
 # 拍照识药功能（模拟版本）
 elif page == "📸 拍照识药":
@@ -352,15 +437,12 @@ elif page == "📸 拍照识药":
     
     if use_manual_input:
         # 手动输入模式
-        drug_name = st.text_input("请输入药品名称", "布洛芬")
+        drug_name = st.text_input("请输入药品名称", "布洛芬").strip()
         
         if drug_name:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM medicines WHERE generic_name LIKE ? OR brand_name LIKE ?", 
-                          (f"%{drug_name}%", f"%{drug_name}%"))
-            medicines = cursor.fetchall()
+            medicines = get_catalog().search_names(drug_name)
             
-            display_medicine_results(medicines, cursor, conn)
+            display_medicine_results(medicines)
     
     elif uploaded_file is not None:
         # 智能识别模式
@@ -421,13 +503,11 @@ elif page == "📸 拍照识药":
                 st.warning("⚠️ 未能自动识别药品名称，请手动输入")
                 drug_to_search = st.text_input("请输入药品名称：", "布洛芬")
         
-        if 'drug_to_search' in locals() and drug_to_search:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM medicines WHERE generic_name LIKE ? OR brand_name LIKE ?", 
-                          (f"%{drug_to_search}%", f"%{drug_to_search}%"))
-            medicines = cursor.fetchall()
+        if 'drug_to_search' in locals() and drug_to_search.strip():
+            drug_to_search = drug_to_search.strip()
+            medicines = get_catalog().search_names(drug_to_search)
             
-            display_medicine_results(medicines, cursor, conn)
+            display_medicine_results(medicines)
     
     else:
         st.info("👆 请上传药品包装图片，或勾选'直接手动输入药品名称'")
@@ -438,20 +518,14 @@ elif page == "💬 评论可信度分析":
     st.markdown("智能过滤虚假评论，展示真实用户反馈")
     
     # 选择药品
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, generic_name, brand_name FROM medicines")
-    medicines = cursor.fetchall()
+    catalog = get_catalog()
     
-    if medicines:
-        medicine_options = {f"{m[1]} ({m[2]})": m[0] for m in medicines}
-        selected_medicine_name = st.selectbox("选择药品", list(medicine_options.keys()))
+    if len(catalog):
+        medicine_id = render_medicine_picker("选择药品", "review")
         
-        if selected_medicine_name:
-            medicine_id = medicine_options[selected_medicine_name]
-            
+        if medicine_id is not None:
             # 获取该药品的所有评论
-            cursor.execute("SELECT * FROM reviews WHERE medicine_id = ?", (medicine_id,))
-            reviews = cursor.fetchall()
+            reviews = cached_query("SELECT * FROM reviews WHERE medicine_id = ?", (medicine_id,), ['reviews'])
             
             if reviews:
                 # 转换为DataFrame
@@ -460,6 +534,9 @@ elif page == "💬 评论可信度分析":
                     'date', 'helpful_count', 'verified_purchase', 'credibility_score', 'tags'
                 ])
                 
+                # 集中刷评的用户
+                flagged_users = get_flagged_reviewers(conn, df_reviews['user_id'].unique().tolist())
+                
                 # 显示统计信息
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
@@ -477,6 +554,11 @@ elif page == "💬 评论可信度分析":
                     else:
                         st.metric("主要标签", "无")
                 
+                # 评论高频词（读取分词缓存）
+                review_terms = top_review_terms(conn, medicine_id)
+                if review_terms:
+                    st.markdown("**🔤 评论高频词**: " + "、".join(f"{term}（{count}条）" for term, count in review_terms))
+                
                 # 可信度筛选
                 st.subheader("🔍 评论筛选")
                 min_credibility = st.slider("最小可信度阈值", 0.0, 1.0, 0.6, 0.05)
@@ -495,13 +577,19 @@ elif page == "💬 评论可信度分析":
                 
                 st.subheader(f"📋 筛选后的评论 ({len(filtered_reviews)}条)")
                 
+                review_sql, review_params = review_filter_query(medicine_id, min_credibility, tags)
+                render_export_buttons(review_sql, review_params, REVIEW_COLUMNS, "评论筛选结果", "review")
+                
                 # 显示评论
                 for _, review in filtered_reviews.iterrows():
-                    with st.expander(f"👤 用户{review['user_id']} | 评分:{'⭐' * review['rating']} | 可信度:{review['credibility_score']:.2f} | 标签:{review['tags']}", expanded=False):
+                    flag = "🚩 " if review['user_id'] in flagged_users else ""
+                    with st.expander(f"{flag}👤 用户{review['user_id']} | 评分:{'⭐' * review['rating']} | 可信度:{review['credibility_score']:.2f} | 标签:{review['tags']}", expanded=False):
+                        if flag:
+                            st.warning("该用户存在集中刷评行为，可信度已下调")
                         col1, col2 = st.columns([3, 1])
                         with col1:
                             st.markdown(f"**评论内容**: {review['content']}")
-                            st.markdown(f"**日期**: {review['date']}")
+                            st.markdown(f"**日期**: {format_day(review['date'])}")
                             st.markdown(f"**有用数**: {review['helpful_count']}")
                             st.markdown(f"**验证购买**: {'✅ 是' if review['verified_purchase'] == 1 else '❌ 否'}")
                         with col2:
@@ -537,6 +625,10 @@ elif page == "💬 评论可信度分析":
                 fig3.update_layout(xaxis_title="评分", yaxis_title="可信度")
                 st.plotly_chart(fig3, use_container_width=True)
                 
+                # 评论趋势
+                st.subheader("📈 评论趋势")
+                render_review_trend(medicine_id, "review")
+                
             else:
                 st.info("该药品暂无评论")
     else:
@@ -547,18 +639,27 @@ elif page == "🔎 多维智能筛选":
     st.header("🔎 多维智能筛选")
     st.markdown("基于多个维度精准筛选适合您的药品")
     
-    # 获取所有药品数据
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM medicines")
-    medicines = cursor.fetchall()
+    # 症状搜索
+    st.subheader("🩺 按症状搜索")
+    symptom_query = st.text_input("描述您的症状（如：孩子发烧头痛）", "")
     
-    if medicines:
-        # 转换为DataFrame
-        df_medicines = pd.DataFrame(medicines, columns=[
-            'id', 'generic_name', 'brand_name', 'indications', 'contraindications',
-            'side_effects', 'ingredients', 'suitable_for', 'price_range', 'category'
-        ])
+    if symptom_query:
+        symptom_results = get_symptom_index().search(symptom_query, limit=10,
+                                                     exclude_ids=excluded_ids if exclude_unsafe else None)
         
+        if symptom_results:
+            for row, score, may_cause in symptom_results:
+                caution = " ⚠️ 副作用中也包含相关症状" if may_cause else ""
+                if row[0] in excluded_ids or row[0] in flagged_ids:
+                    caution += " ⛔ 不适合当前患者情况"
+                st.markdown(f"- **{row[1]} ({row[2]})**: {row[3]} | 适用人群: {row[5]} | 相关度: {score:.2f}{caution}")
+        else:
+            st.info("没有找到与该症状相关的药品")
+    
+    # 获取筛选项（优先使用预构建快照）
+    facets = get_facets()
+    
+    if facets['categories']:
         # 创建筛选器
         st.subheader("🔍 筛选条件")
         
@@ -566,132 +667,73 @@ elif page == "🔎 多维智能筛选":
         
         with col1:
             # 症状筛选
-            all_indications = []
-            for indications in df_medicines['indications'].dropna():
-                if '、' in indications:
-                    all_indications.extend([i.strip() for i in indications.split('、')])
-                else:
-                    all_indications.append(indications.strip())
-            
-            unique_indications = sorted(set(all_indications))
-            selected_indications = st.multiselect("适用症状", unique_indications)
+            selected_indications = st.multiselect("适用症状", facets['indications'])
             
             # 人群筛选
-            all_groups = []
-            for group in df_medicines['suitable_for'].dropna():
-                if '、' in group:
-                    all_groups.extend([g.strip() for g in group.split('、')])
-                else:
-                    all_groups.append(group.strip())
-            
-            unique_groups = sorted(set(all_groups))
-            selected_groups = st.multiselect("适用人群", unique_groups)
+            selected_groups = st.multiselect("适用人群", facets['groups'])
         
         with col2:
             # 成分筛选
-            all_ingredients = []
-            for ingredients in df_medicines['ingredients'].dropna():
-                if '、' in ingredients:
-                    all_ingredients.extend([i.strip() for i in ingredients.split('、')])
-                else:
-                    all_ingredients.append(ingredients.strip())
-            
-            unique_ingredients = sorted(set(all_ingredients))
-            selected_ingredients = st.multiselect("成分要求", unique_ingredients)
+            selected_ingredients = st.multiselect("成分要求", facets['ingredients'])
             
             # 价格范围筛选
-            price_options = df_medicines['price_range'].unique()
-            selected_price = st.multiselect("价格范围", price_options)
+            selected_price = st.multiselect("价格范围", facets['prices'])
         
         # 药品类别筛选
-        category_options = df_medicines['category'].unique()
-        selected_category = st.multiselect("药品类别", category_options)
-        
-        # 应用筛选
-        filtered_df = df_medicines.copy()
+        selected_category = st.multiselect("药品类别", facets['categories'])
         
-        if selected_indications:
-            def matches_indications(indications_str, selected_list):
-                if pd.isna(indications_str):
-                    return False
-                if '、' in indications_str:
-                    indications_list = [i.strip() for i in indications_str.split('、')]
-                else:
-                    indications_list = [indications_str.strip()]
-                return any(selected in indications_list for selected in selected_list)
-            
-            filtered_df = filtered_df[filtered_df['indications'].apply(
-                lambda x: matches_indications(x, selected_indications)
-            )]
-        
-        if selected_groups:
-            def matches_groups(groups_str, selected_list):
-                if pd.isna(groups_str):
-                    return False
-                if '、' in groups_str:
-                    groups_list = [g.strip() for g in groups_str.split('、')]
-                else:
-                    groups_list = [groups_str.strip()]
-                return any(selected in groups_list for selected in selected_list)
-            
-            filtered_df = filtered_df[filtered_df['suitable_for'].apply(
-                lambda x: matches_groups(x, selected_groups)
-            )]
-        
-        if selected_ingredients:
-            def contains_ingredients(ingredients_str, selected_list):
-                if pd.isna(ingredients_str):
-                    return False
-                if '、' in ingredients_str:
-                    ingredients_list = [i.strip() for i in ingredients_str.split('、')]
-                else:
-                    ingredients_list = [ingredients_str.strip()]
-                return any(selected in ingredients_list for selected in selected_list)
-            
-            filtered_df = filtered_df[filtered_df['ingredients'].apply(
-                lambda x: contains_ingredients(x, selected_ingredients)
-            )]
-        
-        if selected_price:
-            filtered_df = filtered_df[filtered_df['price_range'].isin(selected_price)]
+        # 应用筛选（在列式目录上求交集；导出使用等价的 SQL）
+        catalog = get_catalog()
+        filtered_positions = catalog.filter(
+            selected_indications, selected_groups, selected_ingredients,
+            selected_price, selected_category
+        )
+        if exclude_unsafe and excluded_ids:
+            filtered_positions = [pos for pos in filtered_positions if catalog.ids[pos] not in excluded_ids]
+        # 导出与页面一致，不含已隐藏的禁用药品
+        filter_sql, filter_params = medicine_filter_query(
+            selected_indications, selected_groups, selected_ingredients,
+            selected_price, selected_category,
+            excluded_ids if exclude_unsafe else ()
+        )
         
-        if selected_category:
-            filtered_df = filtered_df[filtered_df['category'].isin(selected_category)]
+        render_export_buttons(filter_sql, filter_params, MEDICINE_COLUMNS, "药品筛选结果", "medicine")
         
         # 显示筛选结果
-        st.subheader(f"📋 筛选结果 ({len(filtered_df)}个药品)")
+        st.subheader(f"📋 筛选结果 ({len(filtered_positions)}个药品)")
         
-        if len(filtered_df) > 0:
-            for _, medicine in filtered_df.iterrows():
-                with st.expander(f"💊 {medicine['generic_name']} ({medicine['brand_name']}) - {medicine['category']}", expanded=False):
+        if filtered_positions:
+            for medicine in catalog.records(filtered_positions):
+                with st.expander(f"💊 {medicine.generic_name} ({medicine.brand_name}) - {medicine.category}", expanded=False):
+                    if medicine.id in excluded_ids or medicine.id in flagged_ids:
+                        render_profile_warnings(medicine.id)
+                    
                     col1, col2, col3 = st.columns(3)
                     
                     with col1:
-                        st.markdown(f"**通用名**: {medicine['generic_name']}")
-                        st.markdown(f"**品牌**: {medicine['brand_name']}")
-                        st.markdown(f"**类别**: {medicine['category']}")
-                        st.markdown(f"**价格**: {medicine['price_range']}")
+                        st.markdown(f"**通用名**: {medicine.generic_name}")
+                        st.markdown(f"**品牌**: {medicine.brand_name}")
+                        st.markdown(f"**类别**: {medicine.category}")
+                        st.markdown(f"**价格**: {medicine.price_range}")
                     
                     with col2:
-                        st.markdown(f"**适应症**: {medicine['indications']}")
-                        st.markdown(f"**适用人群**: {medicine['suitable_for']}")
-                        st.markdown(f"**成分**: {medicine['ingredients']}")
+                        st.markdown(f"**适应症**: {medicine.indications}")
+                        st.markdown(f"**适用人群**: {medicine.suitable_for}")
+                        st.markdown(f"**成分**: {medicine.ingredients}")
                     
                     with col3:
-                        st.markdown(f"**禁忌症**: {medicine['contraindications'][:100]}...")
-                        st.markdown(f"**副作用**: {medicine['side_effects']}")
+                        st.markdown(f"**禁忌症**: {medicine.contraindications[:100]}...")
+                        st.markdown(f"**副作用**: {medicine.side_effects}")
                     
                     # 获取该药品的评论统计
-                    cursor.execute("""
+                    stats = cached_query("""
                     SELECT 
                         COUNT(*) as total_reviews,
                         AVG(rating) as avg_rating,
                         AVG(credibility_score) as avg_credibility
                     FROM reviews 
                     WHERE medicine_id = ?
-                    """, (medicine['id'],))
-                    
-                    stats = cursor.fetchone()
+                    """, (medicine.id,), ['reviews'])[0]
                     
                     if stats and stats[0] > 0:
                         col_stat1, col_stat2, col_stat3 = st.columns(3)
@@ -751,32 +793,11 @@ elif page == "🛡️ 个性化安全查询":
     # 药品相互作用检查
     st.subheader("⚡ 药品相互作用检查")
     
+    # 载入相互作用与成分索引
+    screening_index = get_screening_index()
+    
     if current_meds:
-        # 获取相互作用数据
-        cursor = conn.cursor()
-        
-        interactions_found = []
-        for i in range(len(current_meds)):
-            for j in range(i+1, len(current_meds)):
-                med1, med2 = current_meds[i], current_meds[j]
-                
-                # 查询相互作用
-                cursor.execute("""
-                SELECT * FROM drug_interactions 
-                WHERE (drug1 = ? AND drug2 = ?) OR (drug1 = ? AND drug2 = ?)
-                """, (med1, med2, med2, med1))
-                
-                interaction = cursor.fetchone()
-                
-                if interaction:
-                    interactions_found.append({
-                        'drug1': interaction[1],
-                        'drug2': interaction[2],
-                        'type': interaction[3],
-                        'severity': interaction[4],
-                        'description': interaction[5],
-                        'recommendation': interaction[6]
-                    })
+        interactions_found = check_interactions(current_meds, screening_index)
         
         # 显示相互作用结果
         if interactions_found:
@@ -792,6 +813,8 @@ elif page == "🛡️ 个性化安全查询":
                 
                 with st.expander(f"⚠️ {interaction['drug1']} + {interaction['drug2']} - {interaction['severity']}风险", expanded=True):
                     st.markdown(f"**相互作用类型**: {interaction['type']}")
+                    if (interaction['ingredient1'], interaction['ingredient2']) != (interaction['drug1'], interaction['drug2']):
+                        st.markdown(f"**涉及成分**: {interaction['ingredient1']} + {interaction['ingredient2']}")
                     st.markdown(f"**严重程度**: <span style='color:{severity_color};font-weight:bold'>{interaction['severity']}</span>", unsafe_allow_html=True)
                     st.markdown(f"**描述**: {interaction['description']}")
                     st.markdown(f"**建议**: {interaction['recommendation']}")
@@ -800,26 +823,35 @@ elif page == "🛡️ 个性化安全查询":
     else:
         st.info("请先输入您的用药清单")
     
+    # 重复用药检查：品牌名按别名表解析为通用名后，按成分和类别分组
+    st.subheader("🔁 重复用药检查")
+    
+    if current_meds:
+        resolved_names = [(med, resolve_medicine(med, screening_index)) for med in current_meds]
+        aliases_used = [f"{med} → {resolved}" for med, resolved in resolved_names if resolved != med]
+        if aliases_used:
+            st.caption("已识别品牌名: " + "；".join(aliases_used))
+        
+        duplications = check_duplications(current_meds, screening_index)
+        if duplications:
+            st.error(f"⚠️ 发现 {len(duplications)} 组重复用药")
+            for duplication in duplications:
+                icon = "💊" if duplication['type'] == DUPLICATE_INGREDIENT else "🧬"
+                with st.expander(f"{icon} {' + '.join(duplication['drugs'])} - {duplication['type']}", expanded=True):
+                    st.markdown(f"**{'相同成分' if duplication['type'] == DUPLICATE_INGREDIENT else '同一类别'}**: {'、'.join(duplication['shared'])}")
+                    st.markdown(f"**严重程度**: {duplication['severity']}")
+                    st.markdown(f"**描述**: {duplication['description']}")
+                    st.markdown(f"**建议**: {duplication['recommendation']}")
+        else:
+            st.success("✅ 未发现重复用药")
+    else:
+        st.info("请先输入您的用药清单")
+    
     # 过敏成分检查
     st.subheader("🤧 过敏成分检查")
     
-    # 查询所有药品的成分
-    cursor = conn.cursor()
-    cursor.execute("SELECT generic_name, ingredients FROM medicines")
-    all_medicines = cursor.fetchall()
-    
-    allergy_warnings = []
-    if allergies:
-        for medicine in all_medicines:
-            med_name, ingredients_str = medicine
-            if ingredients_str and allergies:
-                ingredients = [ing.strip() for ing in ingredients_str.split('、')]
-                for allergy in allergies:
-                    if allergy in ingredients_str:
-                        allergy_warnings.append({
-                            'medicine': med_name,
-                            'allergen': allergy
-                        })
+    # 检查药品库中含有过敏成分的药品
+    allergy_warnings = find_allergy_warnings(allergies, screening_index)
     
     # 显示过敏警告
     if allergy_warnings:
@@ -834,21 +866,22 @@ elif page == "🛡️ 个性化安全查询":
     st.subheader("🔍 特定药品安全查询")
     
     # 选择药品
-    cursor.execute("SELECT generic_name FROM medicines")
-    medicine_names = [row[0] for row in cursor.fetchall()]
-    
-    selected_medicine = st.selectbox("选择要查询的药品", medicine_names)
+    catalog = get_catalog()
+    selected_id = render_medicine_picker("选择要查询的药品", "safety")
+    selected_record = catalog.get(selected_id) if selected_id is not None else None
+    selected_medicine = selected_record.generic_name if selected_record else None
     
     if selected_medicine:
+        # 患者情况相关的禁忌
+        render_profile_warnings(selected_id)
+        
         if current_meds:
             # 检查与当前用药的相互作用
-            placeholders = ','.join(['?'] * len(current_meds))
-            cursor.execute(f"""
-            SELECT * FROM drug_interactions 
-            WHERE (drug1 = ? AND drug2 IN ({placeholders})) OR (drug2 = ? AND drug1 IN ({placeholders}))
-            """, [selected_medicine] + current_meds + [selected_medicine] + current_meds)
-            
-            interactions = cursor.fetchall()
+            interactions = [
+                interaction for interaction in
+                (lookup_interaction(selected_medicine, med, screening_index) for med in current_meds)
+                if interaction
+            ]
             
             if interactions:
                 st.warning(f"⚠️ 发现 {len(interactions)} 个与您当前用药的相互作用")
@@ -858,19 +891,16 @@ elif page == "🛡️ 个性化安全查询":
                         '重度': 'red',
                         '中度': 'orange',
                         '轻度': 'yellow'
-                    }.get(interaction[4], 'gray')
+                    }.get(interaction['severity'], 'gray')
                     
-                    st.markdown(f"**{interaction[1]} + {interaction[2]}**: {interaction[5]}")
-                    st.markdown(f"<span style='color:{severity_color}'>**{interaction[4]}风险**</span>", unsafe_allow_html=True)
+                    st.markdown(f"**{interaction['drug1']} + {interaction['drug2']}**: {interaction['description']}")
+                    st.markdown(f"<span style='color:{severity_color}'>**{interaction['severity']}风险**</span>", unsafe_allow_html=True)
             else:
                 st.success(f"✅ {selected_medicine} 与您当前用药无明显相互作用")
         
         # 检查过敏成分
-        cursor.execute("SELECT ingredients FROM medicines WHERE generic_name = ?", (selected_medicine,))
-        ingredients_result = cursor.fetchone()
-        
-        if ingredients_result and allergies:
-            ingredients = ingredients_result[0]
+        if allergies:
+            ingredients = selected_record.ingredients
             if ingredients:
                 for allergy in allergies:
                     if allergy in ingredients:
@@ -903,130 +933,69 @@ elif page == "📊 数据可视化":
     st.header("📊 数据可视化")
     st.markdown("药品信息与用户评论的可视化分析")
     
-    # 获取数据
-    cursor = conn.cursor()
+    # 图表由后台线程在数据变化后生成，这里只读取序列化好的结果
+    dashboard = get_dashboard()
+    age = int(time.time() - dashboard.built_at)
+    status = f"图表生成于 {datetime.fromtimestamp(dashboard.built_at).strftime('%H:%M:%S')}（{age} 秒前，用时 {dashboard.build_seconds:.1f} 秒）"
+    if dashboard.is_stale(get_data_versions(conn)):
+        st.info(f"🔄 {status}，已有新数据，后台正在重新生成")
+    else:
+        st.caption(f"🕒 {status}")
+    
+    def render_figure(name):
+        spec = dashboard.spec(name)
+        if spec is None:
+            return False
+        if PLOTLY_JSON_AVAILABLE:
+            proto = PlotlyChartProto()
+            proto.spec = spec
+            proto.config = '{}'
+            proto.theme = 'streamlit'
+            # 同一次生成的图表编号不变，前端可以保留缩放等交互状态
+            proto.id = f"dashboard-{name}-{dashboard.built_at:.3f}"
+            st._main._enqueue('plotly_chart', proto,
+                              layout_config=LayoutConfig(width='stretch', height=PLOTLY_DEFAULT_HEIGHT))
+        else:
+            st.plotly_chart(dashboard.figure(name), use_container_width=True)
+        return True
     
     # 药品类别分布
-    cursor.execute("SELECT category, COUNT(*) as count FROM medicines GROUP BY category")
-    category_data = cursor.fetchall()
-    
-    if category_data:
-        df_category = pd.DataFrame(category_data, columns=['category', 'count'])
-        
+    if 'category_pie' in dashboard.figures:
         col1, col2 = st.columns(2)
         
         with col1:
-            # 药品类别饼图
-            fig1 = px.pie(df_category, values='count', names='category', 
-                         title='药品类别分布', hole=0.3,
-                         color_discrete_sequence=px.colors.qualitative.Set3)
-            st.plotly_chart(fig1, use_container_width=True)
+            render_figure('category_pie')
         
         with col2:
-            # 药品类别柱状图
-            fig2 = px.bar(df_category, x='category', y='count', 
-                         title='药品类别分布', color='category',
-                         color_discrete_sequence=px.colors.qualitative.Set2)
-            st.plotly_chart(fig2, use_container_width=True)
+            render_figure('category_bar')
     
     # 评论数据分析
-    cursor.execute("""
-    SELECT m.generic_name, 
-           COUNT(r.id) as review_count,
-           AVG(r.rating) as avg_rating,
-           AVG(r.credibility_score) as avg_credibility
-    FROM medicines m
-    LEFT JOIN reviews r ON m.id = r.medicine_id
-    GROUP BY m.id, m.generic_name
-    HAVING COUNT(r.id) > 0
-    """)
+    if 'review_counts' in dashboard.figures:
+        st.subheader("💬 药品评论统计")
+        render_figure('review_counts')
+        render_figure('rating_credibility')
     
-    review_stats = cursor.fetchall()
+    # 评论趋势
+    st.subheader("📈 全部药品评论趋势")
+    bucket_label = st.radio("统计粒度", ["按月", "按天"], horizontal=True, key="dashboard_trend_bucket")
+    if not render_figure('trend_month' if bucket_label == "按月" else 'trend_day'):
+        st.info("暂无评论趋势数据")
     
-    if review_stats:
-        df_review_stats = pd.DataFrame(review_stats, 
-                                      columns=['medicine', 'review_count', 'avg_rating', 'avg_credibility'])
-        
-        st.subheader("💬 药品评论统计")
-        
-        # 创建多指标图表
-        fig3 = go.Figure(data=[
-            go.Bar(name='评论数量', x=df_review_stats['medicine'], y=df_review_stats['review_count'],
-                   marker_color='#2E86AB'),
-            go.Scatter(name='平均评分', x=df_review_stats['medicine'], 
-                      y=df_review_stats['avg_rating'], yaxis='y2', mode='lines+markers',
-                      line=dict(color='#A23B72', width=3))
-        ])
-        
-        fig3.update_layout(
-            title='药品评论数量与平均评分',
-            yaxis=dict(title='评论数量'),
-            yaxis2=dict(title='平均评分', overlaying='y', side='right'),
-            xaxis_tickangle=-45
-        )
-        
-        st.plotly_chart(fig3, use_container_width=True)
-        
-        # 可信度与评分关系
-        fig4 = px.scatter(df_review_stats, x='avg_rating', y='avg_credibility',
-                         size='review_count', hover_name='medicine',
-                         title='药品平均评分与可信度关系',
-                         labels={'avg_rating': '平均评分', 'avg_credibility': '平均可信度'},
-                         color='review_count', color_continuous_scale='viridis')
-        
-        st.plotly_chart(fig4, use_container_width=True)
+    # 用户反馈的副作用
+    if 'side_effects' in dashboard.figures:
+        st.subheader("🤒 用户反馈的副作用")
+        render_figure('side_effects')
     
     # 价格分析
-    cursor.execute("SELECT price_range, COUNT(*) as count FROM medicines GROUP BY price_range")
-    price_data = cursor.fetchall()
-    
-    if price_data:
-        df_price = pd.DataFrame(price_data, columns=['price_range', 'count'])
-        
-        # 提取价格数值用于排序
-        def extract_price(price_str):
-            numbers = re.findall(r'\d+', price_str)
-            if numbers:
-                return int(numbers[0])
-            return 0
-        
-        df_price['price_num'] = df_price['price_range'].apply(extract_price)
-        df_price = df_price.sort_values('price_num')
-        
-        fig5 = px.bar(df_price, x='price_range', y='count', 
-                     title='药品价格分布', color='count',
-                     color_continuous_scale='tealrose')
-        st.plotly_chart(fig5, use_container_width=True)
+    render_figure('price')
     
     # 药品成分分析
     st.subheader("🧪 常见药品成分分析")
     
-    cursor.execute("SELECT ingredients FROM medicines")
-    ingredients_data = cursor.fetchall()
-    
-    if ingredients_data:
-        all_ingredients = []
-        for row in ingredients_data:
-            if row[0]:
-                ingredients = [ing.strip() for ing in row[0].split('、')]
-                all_ingredients.extend(ingredients)
-        
-        if all_ingredients:
-            from collections import Counter
-            ingredient_counts = Counter(all_ingredients)
-            
-            df_ingredients = pd.DataFrame.from_dict(ingredient_counts, 
-                                                   orient='index', columns=['count']).reset_index()
-            df_ingredients.columns = ['ingredient', 'count']
-            df_ingredients = df_ingredients.sort_values('count', ascending=False)
-            
-            # 显示最常见成分
-            st.markdown("**最常见成分前10名**")
-            fig6 = px.bar(df_ingredients.head(10), x='ingredient', y='count',
-                         title='最常见药品成分', color='count',
-                         color_continuous_scale='sunset')
-            fig6.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig6, use_container_width=True)
+    if 'ingredients' in dashboard.figures:
+        # 显示最常见成分
+        st.markdown("**最常见成分前10名**")
+        render_figure('ingredients')
 
 # 关于系统
 elif page == "ℹ️ 关于系统":
@@ -1050,7 +1019,7 @@ elif page == "ℹ️ 关于系统":
     - **前端框架**: Streamlit
     - **数据处理**: Pandas, NumPy
     - **数据可视化**: Plotly
-    - **数据库**: SQLite (内存数据库)
+    - **数据库**: SQLite (WAL 模式)
     - **编程语言**: Python 3.x
     
     ## ✨ 核心功能
@@ -1094,15 +1063,9 @@ elif page == "ℹ️ 关于系统":
     st.markdown("---")
     
     # 显示系统统计
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM medicines")
-    med_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM reviews")
-    review_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM drug_interactions")
-    interaction_count = cursor.fetchone()[0]
+    med_count = len(get_catalog())
+    review_count = cached_query("SELECT COUNT(*) FROM reviews", (), ['reviews'])[0][0]
+    interaction_count = cached_query("SELECT COUNT(*) FROM drug_interactions", (), ['drug_interactions'])[0][0]
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -1134,15 +1097,29 @@ if st.session_state.show_status:
     st.sidebar.markdown("### 📊 系统状态")
     st.sidebar.success("✅ 系统运行正常")
     
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM medicines")
-    med_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM reviews")
-    review_count = cursor.fetchone()[0]
+    med_count = len(get_catalog())
+    review_count = cached_query("SELECT COUNT(*) FROM reviews", (), ['reviews'])[0][0]
     
     st.sidebar.info(f"📁 数据库: {med_count} 种药品，{review_count} 条评论")
     st.sidebar.warning("⚠️ 信息仅供参考")
     
+    generation = catalog_store.generation
+    st.sidebar.caption(f"🕒 数据更新于 {datetime.fromtimestamp(generation.built_at).strftime('%Y-%m-%d %H:%M:%S')}，"
+                       f"已热更新 {catalog_store.reload_count} 次")
+    cache_stats = query_cache.stats()
+    st.sidebar.caption(f"⚡ 查询缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}"
+                       f"（命中率 {cache_stats['hit_rate'] * 100:.1f}%），{cache_stats['entries']} 条，"
+                       f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+    if review_ingestor is not None:
+        ingest_stats = review_ingestor.stats()
+        st.sidebar.caption(f"📥 评论写入: 累计 {ingest_stats['ingested']} 条，队列 {ingest_stats['queue_depth']} 个文件，"
+                           f"延迟 {ingest_stats['last_lag_s']:.1f} 秒，吞吐 {ingest_stats['throughput_per_s']:.1f} 条/秒")
+        if ingest_stats['last_error']:
+            st.sidebar.error(f"评论写入失败: {ingest_stats['last_error']}")
+    if catalog_store.last_error:
+        st.sidebar.error(f"后台更新失败: {catalog_store.last_error}")
+    
+    # 只通知后台线程立即检查，索引重建不占用当前请求
     if st.sidebar.button("🔄 刷新数据"):
-        st.rerun()
\ No newline at end of file
+        catalog_store.request_refresh()
+        st.sidebar.caption("已通知后台检查数据更新，重建完成后刷新页面即可看到新数据")
\ No newline at end of file
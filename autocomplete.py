@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 药品名称自动补全
+把通用名、品牌名和拼音首字母作为键，按字典序排成一个扁平的前缀树（排序数组），
+前缀查询只需两次二分查找；命中范围很大的短前缀预先算好前 k 个结果。
+每次按键只返回少量候选，不再把全部药品名称发送到浏览器
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 拼音首字母补全为可选功能
+    lazy_pinyin = None
+
+PINYIN_AVAILABLE = lazy_pinyin is not None
+
+# 命中键数超过该值的前缀预先计算结果，其余前缀查询时现算
+HOT_PREFIX_KEYS = 256
+_MAX_CHAR = '\U0010ffff'
+
+
+def normalize(text):
+    return ''.join((text or '').split()).lower()
+
+
+# 拼音首字母，如 布洛芬 -> blf；未安装 pypinyin 时返回空串
+def pinyin_initials(text):
+    if not PINYIN_AVAILABLE or not text:
+        return ''
+    return normalize(''.join(lazy_pinyin(text, style=Style.FIRST_LETTER)))
+
+
+class PrefixIndex:
+    # entries: [(medicine_id, generic_name, brand_name), ...]
+    def __init__(self, entries, top_k=20):
+        self.top_k = top_k
+        # 名称越短越靠前（输入“布洛芬”时“布洛芬”排在“布洛芬缓释胶囊”之前）
+        entries = sorted(entries, key=lambda e: (len(e[1] or ''), e[1] or '', e[2] or '', e[0]))
+        self.ids = array('q', [e[0] for e in entries])
+        self.labels = [f"{e[1]} ({e[2]})" if e[2] else e[1] for e in entries]
+
+        keyed = []
+        for rank, (_, generic_name, brand_name) in enumerate(entries):
+            keys = {normalize(generic_name), normalize(brand_name),
+                    pinyin_initials(generic_name), pinyin_initials(brand_name)}
+            keyed.extend((key, rank) for key in keys if key)
+        keyed.sort()
+        self._keys = [key for key, _ in keyed]
+        self._ranks = array('I', [rank for _, rank in keyed])
+        self._hot = self._build_hot_prefixes()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # 命中键数超过 HOT_PREFIX_KEYS 的前缀预先算好前 k 个结果，逐层只细分这些大区间
+    def _build_hot_prefixes(self):
+        keys = self._keys
+        hot = {'': list(range(min(self.top_k, len(self.ids))))}
+        pending = [(0, len(keys), 1)]
+        while pending:
+            start, end, length = pending.pop()
+            i = start
+            while i < end:
+                prefix = keys[i][:length]
+                if len(prefix) < length:
+                    # 键本身比当前前缀短，上一层已经处理
+                    i = bisect_right(keys, prefix, i, end)
+                    continue
+                j = bisect_left(keys, prefix + _MAX_CHAR, i, end)
+                if j - i > HOT_PREFIX_KEYS:
+                    hot[prefix] = heapq.nsmallest(self.top_k, set(self._ranks[i:j]))
+                    pending.append((i, j, length + 1))
+                i = j
+        return hot
+
+    def _ranks_for(self, prefix, limit):
+        if limit <= self.top_k and prefix in self._hot:
+            return self._hot[prefix][:limit]
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + _MAX_CHAR, lo)
+        return heapq.nsmallest(limit, set(self._ranks[lo:hi]))
+
+    # 返回 [(medicine_id, 显示名), ...]
+    def complete(self, prefix, limit=None):
+        ranks = self._ranks_for(normalize(prefix), limit or self.top_k)
+        return [(self.ids[rank], self.labels[rank]) for rank in ranks]
+
+
+def build_name_index(conn, top_k=20):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, generic_name, brand_name FROM medicines")
+    return PrefixIndex(cursor.fetchall(), top_k)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 批量用药筛查
+按患者逐行读取 CSV/JSONL 用药清单与过敏史，多进程执行相互作用、重复用药和过敏检查，
+结果边算边写出，不把全部患者读入内存；相同的用药清单在每个工作进程内只筛查一次
+
+用法:
+    python batch_screening.py patients.csv findings.jsonl --workers 4
+输入字段: patient_id, medications, allergies（多个值用分号、顿号或换行分隔）
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+
+from database import init_database
+from screening import build_screening_index, check_duplications, check_interactions, find_allergy_warnings
+
+FINDING_FIELDS = ['patient_id', 'finding_type', 'drug1', 'drug2', 'allergen',
+                  'severity', 'description', 'recommendation']
+
+# 每个工作进程缓存的不同用药清单数上限，超出后清空重新累积
+REGIMEN_CACHE_SIZE = 100000
+
+# 每个工作进程持有一份筛查索引，以及按用药清单缓存的筛查结果
+_worker_index = None
+_worker_cache = {}
+
+
+# 拆分单元格中的多个药品/过敏物质
+def parse_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in re.split(r'[;；、\n]', str(value)) if item.strip()]
+
+
+# 逐行读取患者记录，按扩展名区分 CSV 与 JSONL
+def iter_patients(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                yield row
+
+
+# 把患者流切成固定大小的批次
+def iter_chunks(patients, chunk_size):
+    chunk = []
+    for patient in patients:
+        chunk.append(patient)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(db_path):
+    global _worker_index
+    conn = init_database(db_path)
+    _worker_index = build_screening_index(conn)
+    _worker_cache.clear()
+    conn.close()
+
+
+# 一份用药清单的相互作用与重复用药发现（不含患者编号）
+def _regimen_findings(meds, index):
+    findings = []
+    for interaction in check_interactions(meds, index):
+        findings.append({
+            'finding_type': 'interaction',
+            'drug1': interaction['drug1'],
+            'drug2': interaction['drug2'],
+            'allergen': '',
+            'severity': interaction['severity'],
+            'description': interaction['description'],
+            'recommendation': interaction['recommendation']
+        })
+
+    # 同一成分或同类药物出现多次时，drug2 列出其余药品
+    for duplication in check_duplications(meds, index):
+        findings.append({
+            'finding_type': 'duplication',
+            'drug1': duplication['drugs'][0],
+            'drug2': '、'.join(duplication['drugs'][1:]),
+            'allergen': '',
+            'severity': duplication['severity'],
+            'description': duplication['description'],
+            'recommendation': duplication['recommendation']
+        })
+    return findings
+
+
+def _allergy_findings(meds, allergies, index):
+    findings = []
+    for warning in find_allergy_warnings(allergies, index, meds):
+        findings.append({
+            'finding_type': 'allergy',
+            'drug1': warning['medicine'],
+            'drug2': '',
+            'allergen': warning['allergen'],
+            'severity': '重度',
+            'description': f"{warning['medicine']} 含有过敏成分 {warning['allergen']}",
+            'recommendation': '避免使用，请咨询医生更换药品'
+        })
+    return findings
+
+
+# 筛查一个批次的患者，返回该批次的全部发现
+# 患者名册中大量患者的用药清单相同，按清单（及过敏史）缓存结果，每种组合只检查一次
+def screen_chunk(patients, index=None):
+    if index is None:
+        index, cache = _worker_index, _worker_cache
+    else:
+        cache = {}
+    findings = []
+    for patient in patients:
+        patient_id = patient.get('patient_id', '')
+        meds = tuple(parse_list(patient.get('medications')))
+        allergies = tuple(parse_list(patient.get('allergies')))
+
+        regimen = cache.get(meds)
+        if regimen is None:
+            if len(cache) >= REGIMEN_CACHE_SIZE:
+                cache.clear()
+            regimen = cache[meds] = _regimen_findings(meds, index)
+        allergy = []
+        if allergies:
+            allergy = cache.get((meds, allergies))
+            if allergy is None:
+                allergy = cache[(meds, allergies)] = _allergy_findings(meds, allergies, index)
+
+        findings.extend({'patient_id': patient_id, **finding} for finding in regimen)
+        findings.extend({'patient_id': patient_id, **finding} for finding in allergy)
+    return len(patients), findings
+
+
+class FindingWriter:
+    def __init__(self, path):
+        self.f = open(path, 'w', encoding='utf-8', newline='')
+        self.is_jsonl = path.endswith('.jsonl')
+        if not self.is_jsonl:
+            self.writer = csv.DictWriter(self.f, fieldnames=FINDING_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, findings):
+        if self.is_jsonl:
+            for finding in findings:
+                self.f.write(json.dumps(finding, ensure_ascii=False) + '\n')
+        else:
+            self.writer.writerows(findings)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def run_batch(input_path, output_path, db_path=':memory:', workers=None, chunk_size=1000):
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    chunks = iter_chunks(iter_patients(input_path), chunk_size)
+    writer = FindingWriter(output_path)
+    patient_count = 0
+    finding_count = 0
+
+    def emit(result):
+        nonlocal patient_count, finding_count
+        count, findings = result
+        patient_count += count
+        finding_count += len(findings)
+        writer.write(findings)
+
+    try:
+        if workers <= 1:
+            _init_worker(db_path)
+            for chunk in chunks:
+                emit(screen_chunk(chunk))
+        else:
+            # 限制在途批次数量，避免读入速度远超处理速度时占满内存
+            with Pool(workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(screen_chunk, (chunk,)))
+                    if len(pending) >= workers * 2:
+                        emit(pending.popleft().get())
+                while pending:
+                    emit(pending.popleft().get())
+    finally:
+        writer.close()
+
+    return patient_count, finding_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量筛查患者用药清单的相互作用、重复用药与过敏风险')
+    parser.add_argument('input', help='患者清单（.csv 或 .jsonl）')
+    parser.add_argument('output', help='筛查结果（.csv 或 .jsonl）')
+    parser.add_argument('--db', default=':memory:', help='SQLite 数据库路径，默认使用内置示例数据')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认等于 CPU 核数')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='每批患者数')
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    patient_count, finding_count = run_batch(args.input, args.output, args.db,
+                                             args.workers, args.chunk_size)
+    elapsed = time.time() - start
+    print(f"筛查完成: {patient_count} 位患者，{finding_count} 条风险，用时 {elapsed:.1f} 秒",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
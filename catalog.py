@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 列式药品目录
+药品表按列存放：文本列为驻留（intern）字符串列表，重复的说明文字只保存一份；
+类别和价格范围编码为整数数组；多值字段（适应症、人群、成分）预先建立“值 -> 行号”倒排表。
+同一进程内所有页面共用一份，只在需要展示时按行组装记录，不做逐次重跑的整表拷贝
+"""
+
+import sys
+from array import array
+from collections import namedtuple
+
+from database import MEDICINE_COLUMNS
+from screening import split_items
+
+# 与 medicines 表列顺序一致，既可 med[1] 按位置访问，也可 med.generic_name 按名访问
+Medicine = namedtuple('Medicine', MEDICINE_COLUMNS)
+
+# 以整数编码存储的低基数列
+CODED_COLUMNS = ['price_range', 'category']
+TEXT_COLUMNS = [c for c in MEDICINE_COLUMNS[1:] if c not in CODED_COLUMNS]
+# 建立倒排表的多值字段
+MULTI_VALUE_COLUMNS = ['indications', 'suitable_for', 'ingredients']
+
+
+def _intern(value):
+    return sys.intern(value) if value else ''
+
+
+class Catalog:
+    def __init__(self, rows):
+        self.ids = array('q')
+        self.text = {column: [] for column in TEXT_COLUMNS}
+        # 编码列: 编码数组 + 取值表
+        self.codes = {column: array('I') for column in CODED_COLUMNS}
+        self.values = {column: [] for column in CODED_COLUMNS}
+        code_of = {column: {} for column in CODED_COLUMNS}
+        postings = {column: {} for column in MULTI_VALUE_COLUMNS}
+
+        text_columns = [(MEDICINE_COLUMNS.index(column), self.text[column]) for column in TEXT_COLUMNS]
+        coded_columns = [(MEDICINE_COLUMNS.index(column), self.codes[column], self.values[column], code_of[column])
+                         for column in CODED_COLUMNS]
+        multi_columns = [(MEDICINE_COLUMNS.index(column), postings[column]) for column in MULTI_VALUE_COLUMNS]
+
+        for pos, row in enumerate(rows):
+            self.ids.append(row[0])
+            for idx, values in text_columns:
+                values.append(_intern(row[idx]))
+            for idx, codes, values, codes_by_value in coded_columns:
+                value = row[idx] or ''
+                code = codes_by_value.get(value)
+                if code is None:
+                    code = codes_by_value[value] = len(values)
+                    values.append(value)
+                codes.append(code)
+            for idx, column_postings in multi_columns:
+                for item in set(split_items(row[idx])):
+                    column_postings.setdefault(_intern(item), array('I')).append(pos)
+
+        self.postings = postings
+        self._code_of = code_of
+        self.position = {medicine_id: pos for pos, medicine_id in enumerate(self.ids)}
+        # 名称搜索用的小写“通用名\0品牌名”，首次搜索时生成
+        self._name_keys = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def value(self, column, pos):
+        if column == 'id':
+            return self.ids[pos]
+        if column in self.codes:
+            return self.values[column][self.codes[column][pos]]
+        return self.text[column][pos]
+
+    def column(self, column):
+        if column == 'id':
+            return self.ids
+        if column in self.codes:
+            values = self.values[column]
+            return [values[code] for code in self.codes[column]]
+        return self.text[column]
+
+    # 按行号组装一条记录
+    def record(self, pos):
+        return Medicine(*(self.value(column, pos) for column in MEDICINE_COLUMNS))
+
+    def records(self, positions):
+        return [self.record(pos) for pos in positions]
+
+    def get(self, medicine_id):
+        pos = self.position.get(medicine_id)
+        return None if pos is None else self.record(pos)
+
+    # 按通用名或品牌名子串查找，与原先的 LIKE '%name%' 查询结果一致（不区分大小写，如“维生素c”）
+    def search_names(self, term, limit=None):
+        term = term.strip().lower()
+        if not term:
+            return []
+        keys = self._name_keys
+        if keys is None:
+            keys = self._name_keys = [f"{generic}\0{brand}".lower() for generic, brand
+                                      in zip(self.text['generic_name'], self.text['brand_name'])]
+        positions = [pos for pos, key in enumerate(keys) if term in key]
+        return self.records(positions[:limit] if limit else positions)
+
+    # 多维筛选：同一维度内任一值命中即可，不同维度之间同时满足；返回行号列表
+    def filter(self, indications=(), groups=(), ingredients=(), prices=(), categories=()):
+        selected = None
+        for column, items in (('indications', indications), ('suitable_for', groups),
+                              ('ingredients', ingredients)):
+            if items:
+                matched = set()
+                for item in items:
+                    matched.update(self.postings[column].get(item, ()))
+                selected = matched if selected is None else selected & matched
+        for column, items in (('price_range', prices), ('category', categories)):
+            if items:
+                wanted = {self._code_of[column][item] for item in items if item in self._code_of[column]}
+                codes = self.codes[column]
+                candidates = range(len(self.ids)) if selected is None else selected
+                selected = {pos for pos in candidates if codes[pos] in wanted}
+        if selected is None:
+            return list(range(len(self.ids)))
+        return sorted(selected)
+
+    # 编码列各取值的行数 [(取值, 行数), ...]，按首次出现顺序
+    def value_counts(self, column):
+        counts = [0] * len(self.values[column])
+        for code in self.codes[column]:
+            counts[code] += 1
+        return list(zip(self.values[column], counts))
+
+    # 多值字段各取值出现的药品数 {取值: 药品数}
+    def item_counts(self, column):
+        return {item: len(positions) for item, positions in self.postings[column].items()}
+
+
+def build_catalog(conn, batch_size=10000):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(MEDICINE_COLUMNS)} FROM medicines ORDER BY id")
+
+    def iter_rows():
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    return Catalog(iter_rows())
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 禁忌症索引
+数据载入时把自由文本的禁忌症、适用人群解析为规范化的病情/人群标记，建立“标记 -> 药品编号”索引；
+查询时按患者情况对索引做集合运算，得到应排除和需提示的药品，不再逐条扫描文本
+"""
+
+import re
+
+from screening import split_items
+
+# 规范化标记 -> 文本中的写法，分句中出现任一写法即命中
+CONDITION_PATTERNS = {
+    '妊娠': ['孕妇', '妊娠', '怀孕'],
+    '哺乳': ['哺乳期', '哺乳'],
+    '儿童': ['儿童', '小儿', '婴幼儿', '新生儿'],
+    '老年': ['老年人', '老人'],
+    '肝功能不全': ['肝肾功能不全', '肝功能不全', '肝功能损害', '肝病'],
+    '肾功能不全': ['肝肾功能不全', '肾功能不全', '肾功能损害', '肾病'],
+    '消化性溃疡': ['胃溃疡', '十二指肠溃疡', '消化性溃疡', '消化道溃疡'],
+    '肠梗阻': ['肠道梗阻', '肠梗阻'],
+    '糖尿病': ['糖尿病'],
+    '高钙血症': ['高钙血症', '高钙尿症'],
+    '青霉素过敏': ['青霉素过敏'],
+    '非甾体抗炎药过敏': ['阿司匹林或其他非甾体抗炎药过敏', '非甾体抗炎药过敏', '阿司匹林过敏'],
+    '风寒感冒': ['风寒感冒']
+}
+
+# 患者情况选项 -> 规范化标记
+PROFILE_OPTIONS = {
+    '孕妇': '妊娠',
+    '哺乳期': '哺乳',
+    '儿童': '儿童',
+    '老年人': '老年',
+    '肝功能不全': '肝功能不全',
+    '肾功能不全': '肾功能不全',
+    '胃/十二指肠溃疡': '消化性溃疡',
+    '糖尿病': '糖尿病',
+    '高钙血症': '高钙血症',
+    '青霉素过敏': '青霉素过敏',
+    '阿司匹林/非甾体抗炎药过敏': '非甾体抗炎药过敏'
+}
+
+# 适用人群中的这些值表示任何人都适用
+UNIVERSAL_POPULATIONS = {'全人群'}
+# 适用人群明确列出而不含这些人群时需要提示（“成人”已包含老年人，孕妇等不在人群取值中）
+LISTED_POPULATIONS = {'儿童'}
+POPULATION_ALIASES = {'小儿': '儿童', '孩子': '儿童'}
+
+CONTRAINDICATED = '禁用'
+CAUTION = '慎用'
+
+_CLAUSE_SPLIT = re.compile(r'[，,。；;\n]+')
+
+
+# 解析一段禁忌症文本，返回 [(标记, 级别, 原文分句), ...]
+def parse_contraindications(text):
+    findings = []
+    for clause in _CLAUSE_SPLIT.split(text or ''):
+        clause = clause.strip()
+        if not clause:
+            continue
+        # 未写明级别的分句按禁用处理
+        level = CAUTION if '慎用' in clause or '注意' in clause else CONTRAINDICATED
+        for condition, patterns in CONDITION_PATTERNS.items():
+            if any(pattern in clause for pattern in patterns):
+                findings.append((condition, level, clause))
+    return findings
+
+
+def parse_populations(text):
+    return {POPULATION_ALIASES.get(item, item) for item in split_items(text)}
+
+
+class ContraindicationIndex:
+    # rows: [(id, contraindications, suitable_for), ...]
+    def __init__(self, rows):
+        self.contraindicated = {}
+        self.caution = {}
+        # (药品编号, 标记) -> 说明，仅在展示时查询
+        self.reasons = {}
+
+        for medicine_id, contraindications, suitable_for in rows:
+            for condition, level, clause in parse_contraindications(contraindications):
+                target = self.contraindicated if level == CONTRAINDICATED else self.caution
+                target.setdefault(condition, set()).add(medicine_id)
+                self.reasons.setdefault((medicine_id, condition), clause)
+
+            # 适用人群明确列出且不含该人群时提示，而不直接排除
+            populations = parse_populations(suitable_for)
+            if populations and not populations & UNIVERSAL_POPULATIONS:
+                for population in LISTED_POPULATIONS - populations:
+                    self.caution.setdefault(population, set()).add(medicine_id)
+                    self.reasons.setdefault((medicine_id, population), f"适用人群为{suitable_for}")
+
+        self.contraindicated = {c: frozenset(ids) for c, ids in self.contraindicated.items()}
+        self.caution = {c: frozenset(ids) for c, ids in self.caution.items()}
+
+    # 按患者情况（规范化标记）计算 (应排除的药品编号, 需提示的药品编号)
+    def assess(self, conditions):
+        excluded = frozenset().union(*(self.contraindicated.get(c, ()) for c in conditions))
+        flagged = frozenset().union(*(self.caution.get(c, ()) for c in conditions)) - excluded
+        return excluded, flagged
+
+    # 某药品对患者情况的全部提示 [(标记, 级别, 说明), ...]
+    def warnings_for(self, medicine_id, conditions):
+        warnings = []
+        for condition in conditions:
+            if medicine_id in self.contraindicated.get(condition, ()):
+                warnings.append((condition, CONTRAINDICATED, self.reasons.get((medicine_id, condition), '')))
+            elif medicine_id in self.caution.get(condition, ()):
+                warnings.append((condition, CAUTION, self.reasons.get((medicine_id, condition), '')))
+        return warnings
+
+
+def build_contraindication_index(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, contraindications, suitable_for FROM medicines")
+    return ContraindicationIndex(cursor.fetchall())
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 数据可视化图表预计算
+作为数据热更新的派生索引注册：药品或评论数据变化后由后台线程重新汇总并生成全部图表，
+序列化为 Plotly JSON 保存；可视化页面把 JSON 原样发给前端，不在请求时查询、绘图或重新序列化
+"""
+
+import re
+import time
+from collections import Counter
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from database import get_data_versions
+from review_trends import get_review_trend
+from screening import split_items
+from side_effect_mining import get_top_side_effects
+
+# 图表依赖的表，任一变化时重新生成
+DASHBOARD_TABLES = ['medicines', 'reviews']
+TREND_BUCKETS = ['month', 'day']
+
+
+# 一次生成的全部图表，创建后不再修改
+class Dashboard:
+    def __init__(self, figures, versions, built_at, build_seconds):
+        # figures: {图表名: Plotly JSON 字符串}，无数据的图表不出现
+        self.figures = figures
+        self.versions = versions
+        self.built_at = built_at
+        self.build_seconds = build_seconds
+        # 只能传图表对象时按需解析，每份图表只解析一次
+        self._parsed = {}
+
+    def spec(self, name):
+        return self.figures.get(name)
+
+    def figure(self, name):
+        fig = self._parsed.get(name)
+        if fig is None and name in self.figures:
+            fig = self._parsed[name] = pio.from_json(self.figures[name])
+        return fig
+
+    # 图表生成后数据是否又有变化（后台线程尚未重建）
+    def is_stale(self, versions):
+        return any(self.versions.get(table) != versions.get(table) for table in DASHBOARD_TABLES)
+
+
+# 评论趋势图，详情页和可视化页面共用
+def review_trend_figure(trend):
+    df_trend = pd.DataFrame(trend, columns=['period', 'review_count', 'avg_rating', 'avg_credibility', 'suspicious_share'])
+    fig = go.Figure(data=[
+        go.Bar(name='评论数量', x=df_trend['period'], y=df_trend['review_count'], marker_color='#2E86AB'),
+        go.Scatter(name='平均评分', x=df_trend['period'], y=df_trend['avg_rating'], yaxis='y2',
+                   mode='lines+markers', line=dict(color='#A23B72', width=3)),
+        go.Scatter(name='可疑评论占比', x=df_trend['period'], y=df_trend['suspicious_share'] * 5, yaxis='y2',
+                   mode='lines+markers', line=dict(color='#F18F01', dash='dot'),
+                   customdata=df_trend['suspicious_share'], hovertemplate='%{customdata:.0%}')
+    ])
+    fig.update_layout(
+        title='评论趋势',
+        yaxis=dict(title='评论数量'),
+        yaxis2=dict(title='平均评分 / 可疑占比(×5)', overlaying='y', side='right', range=[0, 5.5])
+    )
+    return fig
+
+
+def extract_price(price_str):
+    numbers = re.findall(r'\d+', price_str or '')
+    if numbers:
+        return int(numbers[0])
+    return 0
+
+
+def _category_figures(cursor):
+    # 按首次出现顺序，与原先的页面一致
+    cursor.execute("SELECT category, COUNT(*) FROM medicines GROUP BY category ORDER BY MIN(id)")
+    category_data = cursor.fetchall()
+    if not category_data:
+        return {}
+    df_category = pd.DataFrame(category_data, columns=['category', 'count'])
+    pie = px.pie(df_category, values='count', names='category',
+                 title='药品类别分布', hole=0.3,
+                 color_discrete_sequence=px.colors.qualitative.Set3)
+    bar = px.bar(df_category, x='category', y='count',
+                 title='药品类别分布', color='category',
+                 color_discrete_sequence=px.colors.qualitative.Set2)
+    return {'category_pie': pie, 'category_bar': bar}
+
+
+def _review_figures(cursor):
+    cursor.execute("""
+    SELECT m.generic_name,
+           COUNT(r.id) as review_count,
+           AVG(r.rating) as avg_rating,
+           AVG(r.credibility_score) as avg_credibility
+    FROM medicines m
+    LEFT JOIN reviews r ON m.id = r.medicine_id
+    GROUP BY m.id, m.generic_name
+    HAVING COUNT(r.id) > 0
+    """)
+    review_stats = cursor.fetchall()
+    if not review_stats:
+        return {}
+    df_review_stats = pd.DataFrame(review_stats,
+                                   columns=['medicine', 'review_count', 'avg_rating', 'avg_credibility'])
+
+    # 评论数量与平均评分
+    counts = go.Figure(data=[
+        go.Bar(name='评论数量', x=df_review_stats['medicine'], y=df_review_stats['review_count'],
+               marker_color='#2E86AB'),
+        go.Scatter(name='平均评分', x=df_review_stats['medicine'],
+                   y=df_review_stats['avg_rating'], yaxis='y2', mode='lines+markers',
+                   line=dict(color='#A23B72', width=3))
+    ])
+    counts.update_layout(
+        title='药品评论数量与平均评分',
+        yaxis=dict(title='评论数量'),
+        yaxis2=dict(title='平均评分', overlaying='y', side='right'),
+        xaxis_tickangle=-45
+    )
+
+    # 可信度与评分关系
+    credibility = px.scatter(df_review_stats, x='avg_rating', y='avg_credibility',
+                             size='review_count', hover_name='medicine',
+                             title='药品平均评分与可信度关系',
+                             labels={'avg_rating': '平均评分', 'avg_credibility': '平均可信度'},
+                             color='review_count', color_continuous_scale='viridis')
+    return {'review_counts': counts, 'rating_credibility': credibility}
+
+
+def _trend_figures(conn):
+    figures = {}
+    for bucket in TREND_BUCKETS:
+        trend = get_review_trend(conn, None, bucket)
+        if trend:
+            figures[f'trend_{bucket}'] = review_trend_figure(trend)
+    return figures
+
+
+def _side_effect_figures(conn):
+    side_effect_data = get_top_side_effects(conn)
+    if not side_effect_data:
+        return {}
+    df_side_effects = pd.DataFrame(side_effect_data, columns=['term', 'mention_count', 'weighted_count'])
+    fig = px.bar(df_side_effects, x='term', y='weighted_count',
+                 title='评论中提及的副作用（按可信度加权）', color='mention_count',
+                 labels={'term': '副作用', 'weighted_count': '加权提及次数', 'mention_count': '提及次数'},
+                 color_continuous_scale='reds')
+    return {'side_effects': fig}
+
+
+def _price_figures(cursor):
+    cursor.execute("SELECT price_range, COUNT(*) FROM medicines GROUP BY price_range")
+    price_data = cursor.fetchall()
+    if not price_data:
+        return {}
+    df_price = pd.DataFrame(price_data, columns=['price_range', 'count'])
+    df_price['price_num'] = df_price['price_range'].apply(extract_price)
+    df_price = df_price.sort_values('price_num')
+    fig = px.bar(df_price, x='price_range', y='count',
+                 title='药品价格分布', color='count',
+                 color_continuous_scale='tealrose')
+    return {'price': fig}
+
+
+def _ingredient_figures(cursor, batch_size=10000):
+    # 每个药品的成分去重后计数
+    ingredient_counts = Counter()
+    cursor.execute("SELECT ingredients FROM medicines")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for (ingredients,) in rows:
+            ingredient_counts.update(set(split_items(ingredients)))
+    if not ingredient_counts:
+        return {}
+    df_ingredients = pd.DataFrame(ingredient_counts.most_common(10), columns=['ingredient', 'count'])
+    fig = px.bar(df_ingredients, x='ingredient', y='count',
+                 title='最常见药品成分', color='count',
+                 color_continuous_scale='sunset')
+    fig.update_layout(xaxis_tickangle=-45)
+    return {'ingredients': fig}
+
+
+def build_dashboard(conn):
+    start = time.time()
+    # 先记录版本号：生成期间若有新数据写入，页面会显示为待更新，下一轮再重建
+    versions = get_data_versions(conn)
+    cursor = conn.cursor()
+    figures = {}
+    figures.update(_category_figures(cursor))
+    figures.update(_review_figures(cursor))
+    figures.update(_trend_figures(conn))
+    figures.update(_side_effect_figures(conn))
+    figures.update(_price_figures(cursor))
+    figures.update(_ingredient_figures(cursor))
+    serialized = {name: fig.to_json() for name, fig in figures.items()}
+    return Dashboard(serialized, versions, time.time(), time.time() - start)
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 数据库初始化
+建表并写入示例数据，供 Streamlit 页面与批处理脚本共用
+"""
+
+import sqlite3
+from datetime import date, timedelta
+
+# 需要跟踪数据版本的表，热更新按表判断哪些索引需要重建
+VERSIONED_TABLES = ['medicines', 'reviews', 'drug_interactions', 'drug_classes']
+
+# 评论表结构，建表和旧数据迁移共用
+REVIEWS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    medicine_id INTEGER,
+    user_id TEXT,
+    rating INTEGER,
+    content TEXT,
+    date INTEGER,
+    helpful_count INTEGER,
+    verified_purchase INTEGER,
+    credibility_score REAL,
+    tags TEXT,
+    FOREIGN KEY (medicine_id) REFERENCES medicines (id)
+)
+'''
+
+# 药品表和评论表的列顺序，目录、快照和导出共用
+MEDICINE_COLUMNS = ['id', 'generic_name', 'brand_name', 'indications', 'contraindications',
+                    'side_effects', 'ingredients', 'suitable_for', 'price_range', 'category']
+
+REVIEW_COLUMNS = ['id', 'medicine_id', 'user_id', 'rating', 'content', 'date',
+                  'helpful_count', 'verified_purchase', 'credibility_score', 'tags']
+
+# 打开连接；file: 开头的路径按 URI 处理（如进程内共享的内存数据库）
+# 文件数据库使用 WAL 模式：写事务进行中读连接仍能读取，且只看到已提交的数据
+def connect(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False, uri=db_path.startswith('file:'))
+    if db_path != ':memory:' and 'mode=memory' not in db_path:
+        conn.execute("PRAGMA journal_mode = WAL")
+    return conn
+
+# 评论日期以“1970-01-01 起的天数”整数存储，便于建索引和按天/月分桶
+EPOCH = date(1970, 1, 1)
+
+def to_day_number(date_str):
+    return (date.fromisoformat(date_str) - EPOCH).days
+
+# 迁移旧数据时使用：无法解析的日期记为空值，而不是中断迁移
+def _day_number_or_none(value):
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return to_day_number(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+# 早期的文件数据库把评论日期存为 TEXT（YYYY-MM-DD）；列的 TEXT 类型亲和性会把整数又转回文本，
+# 所以按新表结构重建评论表，逐行转换为天数后替换旧表（评论编号不变）
+def _migrate_review_dates(conn):
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(reviews)")
+    column_types = {row[1]: (row[2] or '').upper() for row in cursor.fetchall()}
+    if column_types.get('date') == 'INTEGER':
+        return False
+    
+    columns = 'id, medicine_id, user_id, rating, content, date, helpful_count, verified_purchase, credibility_score, tags'
+    conn.create_function('day_number', 1, _day_number_or_none)
+    cursor.execute("DROP TABLE IF EXISTS reviews_migrating")
+    cursor.execute(REVIEWS_SCHEMA.replace('reviews (', 'reviews_migrating (', 1))
+    cursor.execute(f'''
+    INSERT INTO reviews_migrating ({columns})
+    SELECT {columns.replace('date', 'day_number(date)', 1)} FROM reviews
+    ''')
+    cursor.execute("DROP TABLE reviews")
+    cursor.execute("ALTER TABLE reviews_migrating RENAME TO reviews")
+    conn.commit()
+    return True
+
+# 天数 -> 'YYYY-MM-DD'；缺失日期（None，或经 pandas 读入后的 NaN）返回空串
+def format_day(day):
+    if day is None or day != day:
+        return ''
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+# 读取各表当前数据版本 {表名: 版本号}
+def get_data_versions(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT table_name, version FROM data_versions")
+    return dict(cursor.fetchall())
+
+# 数据库标识：建库时随机生成并保存，与数据版本一起判断预计算结果（如快照）是否出自这个数据库
+def get_database_id(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM database_info WHERE key = 'database_id'")
+    return cursor.fetchone()[0]
+
+# 初始化数据库
+def init_database(db_path=':memory:'):
+    # 默认使用内存数据库，避免文件权限问题；批处理等场景可传入文件路径
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    
+    # 创建药品信息表
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS medicines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        generic_name TEXT NOT NULL,
+        brand_name TEXT,
+        indications TEXT,
+        contraindications TEXT,
+        side_effects TEXT,
+        ingredients TEXT,
+        suitable_for TEXT,
+        price_range TEXT,
+        category TEXT
+    )
+    ''')
+    
+    # 创建评论表；旧数据库中的文本日期转换为天数
+    cursor.execute(REVIEWS_SCHEMA)
+    _migrate_review_dates(conn)
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_medicine_date ON reviews (medicine_id, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews (user_id)")
+    
+    # 创建药品相互作用表
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS drug_interactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        drug1 TEXT,
+        drug2 TEXT,
+        interaction_type TEXT,
+        severity TEXT,
+        description TEXT,
+        recommendation TEXT
+    )
+    ''')
+    
+    # 创建药品类别成员表，相互作用规则可直接引用类别名
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS drug_classes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        class_name TEXT NOT NULL,
+        drug_name TEXT NOT NULL
+    )
+    ''')
+    
+    # 创建数据版本表，每张表的任何增删改都通过触发器把版本号加一
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    
+    for table in VERSIONED_TABLES:
+        cursor.execute("INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)", (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+            END
+            ''')
+    
+    # 创建数据库信息表，首次建库时写入随机标识
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS database_info (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO database_info (key, value) VALUES ('database_id', lower(hex(randomblob(16))))")
+    conn.commit()
+    
+    # 已有数据的文件数据库不重复写入示例数据
+    cursor.execute("SELECT COUNT(*) FROM medicines")
+    if cursor.fetchone()[0] > 0:
+        return conn
+    
+    # 插入示例药品数据
+    sample_medicines = [
+        ('布洛芬', '芬必得', '头痛、牙痛、痛经、关节痛', 
+         '对阿司匹林或其他非甾体抗炎药过敏者禁用，胃溃疡患者禁用', 
+         '恶心、胃痛、头晕、皮疹', '布洛芬', '成人', '20-40元', '非处方药'),
+        ('对乙酰氨基酚', '泰诺', '感冒发热、头痛、关节痛、神经痛', 
+         '严重肝肾功能不全者禁用', '恶心、皮疹、肝功能异常', '对乙酰氨基酚', 
+         '成人、儿童', '15-30元', '非处方药'),
+        ('奥美拉唑', '洛赛克', '胃溃疡、十二指肠溃疡、反流性食管炎', 
+         '孕妇、哺乳期妇女禁用', '头痛、腹泻、恶心、皮疹', '奥美拉唑', 
+         '成人', '30-60元', '处方药'),
+        ('维生素C', '力度伸', '预防和治疗坏血病，增强免疫力', 
+         '对成分过敏者禁用', '腹泻、恶心、胃痉挛', '维生素C', 
+         '全人群', '20-50元', '保健品'),
+        ('蒙脱石散', '思密达', '成人及儿童急、慢性腹泻', 
+         '肠道梗阻者禁用', '便秘、大便干结', '蒙脱石', 
+         '成人、儿童', '15-30元', '非处方药'),
+        ('板蓝根颗粒', '白云山', '肺胃热盛所致的咽喉肿痛、口咽干燥', 
+         '风寒感冒者不适用，糖尿病患者慎用', '恶心、腹泻、皮疹', 
+         '板蓝根', '全人群', '10-25元', '中成药'),
+        ('阿莫西林', '阿莫仙', '敏感菌所致的感染', 
+         '青霉素过敏者禁用', '皮疹、恶心、腹泻', '阿莫西林', 
+         '成人、儿童', '15-40元', '处方药'),
+        ('葡萄糖酸钙', '钙尔奇', '预防和治疗钙缺乏症', 
+         '高钙血症、高钙尿症患者禁用', '便秘、恶心、腹痛', 
+         '葡萄糖酸钙、维生素D', '全人群', '30-80元', '保健品')
+    ]
+    
+    cursor.executemany('''
+    INSERT INTO medicines (generic_name, brand_name, indications, contraindications, 
+                          side_effects, ingredients, suitable_for, price_range, category)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', sample_medicines)
+    
+    # 插入示例评论数据
+    sample_reviews = [
+        (1, 'user001', 5, '效果很好，头痛很快缓解了，没有副作用', '2023-10-15', 12, 1, 0.9, '可信'),
+        (1, 'user002', 1, '吃了胃不舒服，不建议胃不好的人使用', '2023-11-20', 8, 1, 0.8, '可信'),
+        (1, 'user003', 5, '好', '2023-12-01', 0, 0, 0.2, '疑似灌水'),
+        (1, 'user004', 5, '物流很快，包装完好，客服态度很好', '2023-12-05', 2, 1, 0.3, '无关内容'),
+        (1, 'user005', 5, '这个药太神奇了，吃了马上见效，简直是神药！', '2023-12-10', 1, 0, 0.4, '夸大宣传'),
+        (2, 'user006', 4, '退烧效果不错，孩子发烧时用的', '2023-10-22', 15, 1, 0.85, '可信'),
+        (2, 'user007', 3, '效果一般，没有明显退烧', '2023-11-05', 5, 1, 0.75, '可信'),
+        (3, 'user008', 5, '胃痛缓解很明显，医生推荐的', '2023-09-30', 20, 1, 0.95, '可信'),
+        (4, 'user009', 4, '增强免疫力，感冒少了', '2023-11-15', 10, 1, 0.8, '可信'),
+        (5, 'user010', 5, '腹泻很快止住了，效果很好', '2023-12-03', 18, 1, 0.9, '可信'),
+        (6, 'user011', 4, '感冒时喝效果不错', '2023-11-10', 7, 1, 0.7, '可信'),
+        (7, 'user012', 5, '感染控制得很好', '2023-10-05', 9, 1, 0.85, '可信'),
+        (8, 'user013', 4, '补钙效果不错，腿不抽筋了', '2023-12-01', 6, 1, 0.75, '可信')
+    ]
+    
+    cursor.executemany('''
+    INSERT INTO reviews (medicine_id, user_id, rating, content, date, helpful_count, verified_purchase, credibility_score, tags)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [review[:4] + (to_day_number(review[4]),) + review[5:] for review in sample_reviews])
+    
+    # 插入药品相互作用数据
+    interactions = [
+        ('布洛芬', '阿司匹林', '药效叠加', '中度', '两者均为非甾体抗炎药，同时使用可能增加胃肠道副作用风险', '避免同时使用，如需合用请咨询医生'),
+        ('布洛芬', '华法林', '增加出血风险', '重度', '布洛芬可能增强华法林的抗凝效果，增加出血风险', '避免同时使用，如需合用需密切监测凝血功能'),
+        ('阿莫西林', '避孕药', '降低药效', '轻度', '阿莫西林可能降低避孕药效果', '使用阿莫西林期间建议采取额外避孕措施'),
+        ('对乙酰氨基酚', '酒精', '肝损伤', '重度', '同时使用可能增加肝损伤风险', '使用期间避免饮酒'),
+        ('奥美拉唑', '氯吡格雷', '降低药效', '中度', '奥美拉唑可能降低氯吡格雷的抗血小板效果', '如需合用请咨询医生，考虑使用其他胃药'),
+        ('维生素C', '铁剂', '促进吸收', '轻度', '维生素C可以促进铁的吸收', '可以同时服用，增强补铁效果'),
+        ('蒙脱石散', '其他药物', '影响吸收', '中度', '蒙脱石散可能影响其他药物的吸收', '与其他药物间隔1-2小时服用'),
+        ('非甾体抗炎药', '抗凝药', '增加出血风险', '重度', '非甾体抗炎药与抗凝药合用会增加消化道出血风险', '避免同时使用，如需合用需密切监测凝血功能'),
+        ('非甾体抗炎药', '非甾体抗炎药', '药效叠加', '中度', '两种非甾体抗炎药合用疗效不增加，胃肠道损伤风险增加', '避免同时使用两种非甾体抗炎药'),
+        ('质子泵抑制剂', '抗血小板药', '降低药效', '中度', '部分质子泵抑制剂可能降低抗血小板药的效果', '如需合用请咨询医生，考虑使用其他胃药'),
+        ('维生素D', '氢氯噻嗪', '升高血钙', '中度', '氢氯噻嗪减少钙排泄，与维生素D合用可能导致高钙血症', '合用期间定期监测血钙')
+    ]
+    
+    cursor.executemany('''
+    INSERT INTO drug_interactions (drug1, drug2, interaction_type, severity, description, recommendation)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', interactions)
+    
+    # 插入药品类别成员数据
+    drug_classes = [
+        ('非甾体抗炎药', '布洛芬'),
+        ('非甾体抗炎药', '阿司匹林'),
+        ('非甾体抗炎药', '双氯芬酸'),
+        ('非甾体抗炎药', '萘普生'),
+        ('抗凝药', '华法林'),
+        ('抗凝药', '利伐沙班'),
+        ('质子泵抑制剂', '奥美拉唑'),
+        ('质子泵抑制剂', '兰索拉唑'),
+        ('质子泵抑制剂', '泮托拉唑'),
+        ('抗血小板药', '氯吡格雷'),
+        ('抗血小板药', '阿司匹林')
+    ]
+    
+    cursor.executemany('''
+    INSERT INTO drug_classes (class_name, drug_name)
+    VALUES (?, ?)
+    ''', drug_classes)
+    
+    conn.commit()
+    return conn
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 数据导出
+把筛选条件翻译成 SQL，从 SQLite 游标按批 fetchmany 直接写出 CSV 或分行组的 Parquet，
+内存占用与结果规模无关
+
+用法:
+    python export.py medicines 非处方药.csv --category 非处方药 --indication 头痛
+    python export.py reviews reviews.parquet --medicine-id 1 --min-credibility 0.6 --tag 可信
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import weakref
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 导出为可选功能
+    pa = None
+    pq = None
+
+PARQUET_AVAILABLE = pa is not None
+
+from database import MEDICINE_COLUMNS, REVIEW_COLUMNS, init_database
+
+# 页面导出的临时文件目录及保留时间；会话异常结束未能清理的文件超时后删除
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'shiyaoshi-exports')
+EXPORT_MAX_AGE = 3600
+
+# Parquet 列类型，未列出的列按字符串处理；显式给出避免某批全为空值时类型推断不一致
+PARQUET_TYPES = {
+    'id': 'int64',
+    'medicine_id': 'int64',
+    'rating': 'int64',
+    'helpful_count': 'int64',
+    'verified_purchase': 'int64',
+    'credibility_score': 'float64'
+}
+
+
+# 顿号分隔的多值字段按整项匹配，而不是子串匹配
+# 用 instr 而不是 LIKE：取值中的 % 和 _ 不作通配符，且区分大小写，与 Catalog.filter 一致
+def _multi_value_match(column, values, params):
+    params.extend(values)
+    return '(' + ' OR '.join(
+        f"instr('、' || {column} || '、', '、' || ? || '、') > 0" for _ in values
+    ) + ')'
+
+
+def _in_list(column, values, params):
+    params.extend(values)
+    return f"{column} IN ({','.join(['?'] * len(values))})"
+
+
+# 多维筛选页面的筛选条件 -> (SQL, 参数)
+# exclude_ids: 不导出的药品编号（如患者禁用的药品），以一个 JSON 数组参数传入，不受参数个数限制
+def medicine_filter_query(indications=(), groups=(), ingredients=(), prices=(), categories=(), exclude_ids=()):
+    conditions = []
+    params = []
+    if indications:
+        conditions.append(_multi_value_match('indications', indications, params))
+    if groups:
+        conditions.append(_multi_value_match('suitable_for', groups, params))
+    if ingredients:
+        conditions.append(_multi_value_match('ingredients', ingredients, params))
+    if prices:
+        conditions.append(_in_list('price_range', prices, params))
+    if categories:
+        conditions.append(_in_list('category', categories, params))
+    if exclude_ids:
+        conditions.append("id NOT IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(sorted(exclude_ids)))
+
+    sql = f"SELECT {', '.join(MEDICINE_COLUMNS)} FROM medicines"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql + " ORDER BY id", params
+
+
+# 评论分析页面的筛选条件 -> (SQL, 参数)
+def review_filter_query(medicine_id=None, min_credibility=0.0, tags=()):
+    conditions = ["credibility_score >= ?"]
+    params = [min_credibility]
+    if medicine_id is not None:
+        conditions.append("medicine_id = ?")
+        params.append(medicine_id)
+    if tags:
+        conditions.append(_in_list('tags', tags, params))
+
+    # 日期以天数存储，导出时还原为 YYYY-MM-DD
+    select_list = ', '.join("date(date * 86400, 'unixepoch') AS date" if column == 'date' else column
+                            for column in REVIEW_COLUMNS)
+    sql = f"SELECT {select_list} FROM reviews WHERE " + " AND ".join(conditions)
+    return sql + " ORDER BY id", params
+
+
+def _iter_batches(conn, sql, params, batch_size):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+# 导出 CSV，output 可以是路径或已打开的文本文件
+def export_csv(conn, sql, params, columns, output, batch_size=5000):
+    f = open(output, 'w', encoding='utf-8-sig', newline='') if isinstance(output, str) else output
+    try:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        count = 0
+        for rows in _iter_batches(conn, sql, params, batch_size):
+            writer.writerows(rows)
+            count += len(rows)
+        return count
+    finally:
+        if isinstance(output, str):
+            f.close()
+
+
+# 导出 Parquet，每个 fetchmany 批次写成一个行组
+def export_parquet(conn, sql, params, columns, output, batch_size=50000):
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("导出 Parquet 需要安装 pyarrow：pip install pyarrow")
+
+    schema = pa.schema([(column, PARQUET_TYPES.get(column, 'string')) for column in columns])
+    count = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        for rows in _iter_batches(conn, sql, params, batch_size):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_query(conn, sql, params, columns, output, batch_size=None):
+    if str(output).endswith('.parquet'):
+        return export_parquet(conn, sql, params, columns, output, batch_size or 50000)
+    return export_csv(conn, sql, params, columns, output, batch_size or 5000)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# 页面导出的临时文件：对象被回收时（被新的导出替换或会话结束）删除文件
+class ExportFile:
+    def __init__(self, suffix, signature):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=suffix, dir=EXPORT_DIR)
+        os.close(fd)
+        self.signature = signature
+        self.row_count = 0
+        self._finalizer = weakref.finalize(self, _remove_file, self.path)
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def remove(self):
+        self._finalizer()
+
+
+# 删除超过保留时间的导出文件
+def sweep_exports(max_age=EXPORT_MAX_AGE):
+    if not os.path.isdir(EXPORT_DIR):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按筛选条件流式导出药品或评论数据')
+    subparsers = parser.add_subparsers(dest='table', required=True)
+
+    medicines_parser = subparsers.add_parser('medicines', help='导出药品')
+    medicines_parser.add_argument('--indication', action='append', default=[], help='适用症状')
+    medicines_parser.add_argument('--group', action='append', default=[], help='适用人群')
+    medicines_parser.add_argument('--ingredient', action='append', default=[], help='成分')
+    medicines_parser.add_argument('--price', action='append', default=[], help='价格范围')
+    medicines_parser.add_argument('--category', action='append', default=[], help='药品类别')
+
+    reviews_parser = subparsers.add_parser('reviews', help='导出评论')
+    reviews_parser.add_argument('--medicine-id', type=int, default=None, help='药品编号')
+    reviews_parser.add_argument('--min-credibility', type=float, default=0.0, help='最小可信度')
+    reviews_parser.add_argument('--tag', action='append', default=[], help='评论标签')
+
+    for subparser in (medicines_parser, reviews_parser):
+        subparser.add_argument('output', help='输出文件（.csv 或 .parquet）')
+        subparser.add_argument('--db', default=':memory:', help='SQLite 数据库路径，默认使用内置示例数据')
+        subparser.add_argument('--batch-size', type=int, default=None, help='每次 fetchmany 的行数')
+
+    args = parser.parse_args(argv)
+    conn = init_database(args.db)
+
+    if args.table == 'medicines':
+        sql, params = medicine_filter_query(args.indication, args.group, args.ingredient,
+                                            args.price, args.category)
+        columns = MEDICINE_COLUMNS
+    else:
+        sql, params = review_filter_query(args.medicine_id, args.min_credibility, args.tag)
+        columns = REVIEW_COLUMNS
+
+    try:
+        count = export_query(conn, sql, params, columns, args.output, args.batch_size)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"已导出 {count} 行到 {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
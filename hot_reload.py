@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 数据热更新
+后台线程轮询 data_versions 表，发现数据变化后在后台重建受影响的索引，
+构建完成后整体替换当前数据代；页面请求只读取已建好的索引，不在请求路径上重建
+"""
+
+import threading
+import time
+
+from database import connect, get_data_versions
+
+
+# 一代数据：各表版本号 + 对应的索引，创建后不再修改
+class Generation:
+    def __init__(self, versions, indexes, built_at):
+        self.versions = versions
+        self.indexes = indexes
+        self.built_at = built_at
+
+    @property
+    def version_key(self):
+        return tuple(sorted(self.versions.items()))
+
+
+class CatalogStore:
+    # builders: {索引名: (依赖的表集合, 构建函数 build(conn))}
+    # seed: 可选的预构建索引（如快照），仅当索引依赖的表在当前数据版本与 seed_versions 一致时使用
+    def __init__(self, db_path, builders, poll_interval=2.0, seed=None, seed_versions=None):
+        self.db_path = db_path
+        self.builders = builders
+        self.poll_interval = poll_interval
+        self.listeners = []
+        self.reload_count = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # 页面请求立即检查时只唤醒后台线程，不在请求线程上重建索引
+        self._wake = threading.Event()
+        self._thread = None
+        # 持有一个连接，保证进程内共享的内存数据库不被释放
+        self._conn = connect(db_path)
+        versions = get_data_versions(self._conn)
+        self._generation = self._build_generation(versions, None, self._valid_seed(seed, seed_versions, versions))
+
+    def connect(self):
+        return connect(self.db_path)
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, name):
+        return self._generation.indexes[name]
+
+    # 注册数据变化回调 callback(changed_tables)，用于清理依赖这些表的缓存
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+
+    # 预构建索引依赖的表从生成到现在有任何写入（或未给出版本）都丢弃，改为从数据库构建
+    def _valid_seed(self, seed, seed_versions, versions):
+        if not seed or seed_versions is None:
+            return {}
+        return {name: index for name, index in seed.items()
+                if name in self.builders
+                and all(seed_versions.get(table) == versions.get(table) for table in self.builders[name][0])}
+
+    def _build_generation(self, versions, previous, seed):
+        changed = None
+        if previous is not None:
+            changed = {table for table, version in versions.items()
+                       if previous.versions.get(table) != version}
+
+        indexes = {}
+        conn = self.connect()
+        try:
+            for name, (depends_on, build) in self.builders.items():
+                if previous is not None and name in previous.indexes and not (changed & set(depends_on)):
+                    indexes[name] = previous.indexes[name]
+                elif name in seed:
+                    indexes[name] = seed[name]
+                else:
+                    indexes[name] = build(conn)
+        finally:
+            conn.close()
+        return Generation(versions, indexes, time.time())
+
+    # 检查一次数据版本，有变化则重建受影响的索引并切换到新一代，返回变化的表
+    def refresh(self):
+        with self._lock:
+            versions = get_data_versions(self._conn)
+            current = self._generation
+            changed = {table for table, version in versions.items()
+                       if current.versions.get(table) != version}
+            if not changed:
+                return set()
+
+            new_generation = self._build_generation(versions, current, {})
+            self._generation = new_generation
+            self.reload_count += 1
+
+        for callback in self.listeners:
+            callback(changed)
+        return changed
+
+    # 通知后台线程立即检查一次数据版本，不等待下一个轮询周期
+    def request_refresh(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:  # 后台线程出错不影响当前数据代继续服务
+                self.last_error = str(e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='catalog-reload', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
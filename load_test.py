@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 并发会话压测
+用 streamlit.testing 在同一进程内模拟多个会话，按真实页面流程操作（搜索药品、切换页面、
+调整可信度滑块、输入用药清单筛查），统计每次重新运行的延迟分位数、吞吐量和进程内存。
+Streamlit 服务端同样在单进程内用线程运行各会话脚本，资源缓存全部会话共用，
+因此这里的并发竞争与线上服务端一致
+
+不需要启动 streamlit 服务端，只需安装 streamlit（见 requirements.txt）后直接运行本脚本；
+未指定 --db 时使用程序默认的数据库（程序目录下的 medicines.db），压测建议指定单独的数据库文件。
+冒烟测试 tests/test_load_test.py 以 2 个会话各跑一遍流程，检查压测脚本本身可用：
+    python -m pytest tests/test_load_test.py
+
+用法:
+    python load_test.py --sessions 1,10,50,200 --duration 30
+    python load_test.py --sessions 20 --iterations 5 --db medicines.db --json result.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+
+try:
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+    from streamlit.testing.v1.util import patch_config_options
+except ImportError:  # 仅压测时需要
+    AppTest = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+SEARCH_TERMS = ['布洛芬', '感冒', '头痛', '奥美拉唑', '维生素C', '阿莫西林', '芬必得']
+SYMPTOM_QUERIES = ['孩子发烧头痛', '胃痛反酸', '咳嗽', '腹泻', '关节痛']
+REGIMENS = [
+    '布洛芬\n阿司匹林',
+    '华法林\n布洛芬\n奥美拉唑',
+    '氯吡格雷\n奥美拉唑',
+    '维生素D\n氢氯噻嗪\n葡萄糖酸钙',
+    '阿莫西林'
+]
+
+PAGE_SEARCH = "📸 拍照识药"
+PAGE_REVIEWS = "💬 评论可信度分析"
+PAGE_FILTER = "🔎 多维智能筛选"
+PAGE_SAFETY = "🛡️ 个性化安全查询"
+
+
+# AppTest 对 Runtime._instance 的赋值：第一个会话的模拟运行时保留到本轮结束，之后的替换和清空都忽略
+class _SharedRuntimeMeta(type):
+    def __setattr__(cls, name, value):
+        if name != '_instance':
+            super().__setattr__(name, value)
+        elif value is not None and Runtime._instance is None:
+            Runtime._instance = value
+
+
+# streamlit.testing 是为单会话测试设计的，每次运行都会改动几处进程级状态，多线程并发运行时互相干扰：
+# 1. 每次运行都新建脚本缓存、重新编译 app.py，而服务端所有会话共用一份编译结果；
+#    多个线程同时编译还会触发 Python 3.11 ast 模块的线程安全问题（编译报错，页面空白）
+# 2. 运行期间临时打开 global.appTest 配置，结束时恢复；先结束的会话会替其他会话关掉它，
+#    下拉框等控件的格式化函数不再登记，后续操作报错
+# 3. 运行开始时设置全局 Runtime 实例，结束时清空；正在运行的其他会话取不到运行时，脚本线程崩溃
+# 压测期间所有模拟会话共用一个脚本缓存和一个运行时、全程保持 global.appTest 打开，与服务端一致
+@contextmanager
+def concurrent_app_tests():
+    script_cache = ScriptCache()
+    shared_runtime = _SharedRuntimeMeta('SharedRuntime', (Runtime,), {})
+    try:
+        with patch.object(local_script_runner, 'ScriptCache', lambda: script_cache), \
+                patch.object(app_test, 'Runtime', shared_runtime), \
+                patch_config_options({'global.appTest': True}):
+            yield
+    finally:
+        Runtime._instance = None
+
+
+# 进程当前常驻内存（MB），非 Linux 系统退回到峰值
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+# 最近秩法求分位数，values 已排序
+def percentile(values, p):
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, interval=0.5):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+class SimulatedSession:
+    def __init__(self, rng, timeout):
+        self.rng = rng
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.timings = []
+        self.errors = 0
+
+    # 执行一次交互并计时，step 为步骤名
+    def _step(self, step, action):
+        start = time.perf_counter()
+        try:
+            action()
+            if self.at.exception:
+                self.errors += 1
+        except Exception:
+            self.errors += 1
+        self.timings.append((step, time.perf_counter() - start))
+
+    def _goto(self, page):
+        self._step('switch_page', lambda: self.at.sidebar.radio[0].set_value(page).run())
+
+    def open(self):
+        self._step('open', lambda: self.at.run())
+
+    def search(self):
+        self._goto(PAGE_SEARCH)
+        if not self.at.main.checkbox[0].value:
+            self._step('manual_input', lambda: self.at.main.checkbox[0].check().run())
+        term = self.rng.choice(SEARCH_TERMS)
+        self._step('search', lambda: self.at.main.text_input[0].set_value(term).run())
+
+    def reviews(self):
+        self._goto(PAGE_REVIEWS)
+        selectbox = self.at.main.selectbox[0]
+        option = self.rng.choice(list(selectbox.options))
+        self._step('select_medicine', lambda: selectbox.set_value(option).run())
+        credibility = round(self.rng.uniform(0.3, 0.9) / 0.05) * 0.05
+        self._step('credibility_slider', lambda: self.at.main.slider[0].set_value(credibility).run())
+
+    def filter(self):
+        self._goto(PAGE_FILTER)
+        query = self.rng.choice(SYMPTOM_QUERIES)
+        self._step('symptom_search', lambda: self.at.main.text_input[0].set_value(query).run())
+
+    def safety(self):
+        self._goto(PAGE_SAFETY)
+        regimen = self.rng.choice(REGIMENS)
+        self._step('screen_regimen', lambda: self.at.main.text_area[0].set_value(regimen).run())
+
+    def run_flow(self):
+        flows = [self.search, self.reviews, self.filter, self.safety]
+        self.rng.shuffle(flows)
+        for flow in flows:
+            try:
+                flow()
+            except (IndexError, KeyError, ValueError):
+                # 页面未渲染出预期控件（例如上一步出错），记为错误后继续
+                self.errors += 1
+
+
+def _session_worker(session, duration, iterations, start_barrier):
+    start_barrier.wait()
+    deadline = time.time() + duration if duration is not None else None
+    done = 0
+    while (iterations is None or done < iterations) and (deadline is None or time.time() < deadline):
+        session.run_flow()
+        done += 1
+
+
+# 以 session_count 个并发会话运行一轮，返回统计结果
+def run_round(session_count, duration=None, iterations=None, timeout=30, seed=0):
+    with concurrent_app_tests():
+        return _run_round(session_count, duration, iterations, timeout, seed)
+
+
+def _run_round(session_count, duration, iterations, timeout, seed):
+    rss_before = current_rss_mb()
+    sessions = []
+    for i in range(session_count):
+        session = SimulatedSession(random.Random(seed + i), timeout)
+        session.open()
+        sessions.append(session)
+
+    sampler = RssSampler()
+    sampler.start()
+    # 所有会话同时开始，避免先启动的会话独占资源
+    start_barrier = threading.Barrier(session_count + 1)
+    threads = [threading.Thread(target=_session_worker, args=(s, duration, iterations, start_barrier), daemon=True)
+               for s in sessions]
+    for thread in threads:
+        thread.start()
+
+    start_barrier.wait()
+    start = time.time()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    sampler.stop()
+
+    # 打开页面的首次运行不计入稳态延迟
+    timings = [t for s in sessions for step, t in s.timings if step != 'open']
+    latencies = sorted(timings)
+    steps = {}
+    for s in sessions:
+        for step, t in s.timings:
+            if step != 'open':
+                steps.setdefault(step, []).append(t)
+
+    return {
+        'sessions': session_count,
+        'reruns': len(latencies),
+        'errors': sum(s.errors for s in sessions),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'rss_before_mb': rss_before,
+        'rss_peak_mb': sampler.peak,
+        'steps': {step: {'count': len(values), 'p95_ms': percentile(sorted(values), 95) * 1000}
+                  for step, values in sorted(steps.items())}
+    }
+
+
+def print_report(results, verbose=False):
+    print(f"{'会话数':>6} {'重跑次数':>8} {'错误':>5} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} "
+          f"{'最大(ms)':>9} {'吞吐(次/秒)':>11} {'峰值RSS(MB)':>12}")
+    for r in results:
+        print(f"{r['sessions']:>6} {r['reruns']:>8} {r['errors']:>5} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} {r['throughput_rps']:>11.1f} {r['rss_peak_mb']:>12.1f}")
+        if verbose:
+            for step, stat in r['steps'].items():
+                print(f"{'':>6} {step:<20} {stat['count']:>6} 次  p95 {stat['p95_ms']:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='模拟多个并发会话对识药匙进行压测')
+    parser.add_argument('--sessions', default='1,10,50', help='逗号分隔的并发会话数，逐轮递增')
+    parser.add_argument('--duration', type=float, default=None, help='每轮持续秒数')
+    parser.add_argument('--iterations', type=int, default=None, help='每个会话执行完整流程的次数')
+    parser.add_argument('--timeout', type=float, default=30, help='单次重新运行的超时秒数')
+    parser.add_argument('--db', default=None, help='SQLite 数据库路径（设置 MEDICINE_DB_PATH）')
+    parser.add_argument('--snapshot', default=None, help='预构建快照路径（设置 MEDICINE_SNAPSHOT）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--json', default=None, help='把结果另存为 JSON 文件')
+    parser.add_argument('--verbose', action='store_true', help='输出各步骤的 p95 延迟')
+    args = parser.parse_args(argv)
+
+    if AppTest is None:
+        print("压测需要安装 streamlit：pip install streamlit", file=sys.stderr)
+        sys.exit(1)
+    if args.duration is None and args.iterations is None:
+        args.iterations = 3
+    if args.db:
+        os.environ['MEDICINE_DB_PATH'] = args.db
+    if args.snapshot:
+        os.environ['MEDICINE_SNAPSHOT'] = args.snapshot
+
+    results = []
+    for session_count in [int(n) for n in args.sessions.split(',') if n.strip()]:
+        print(f"正在运行 {session_count} 个并发会话...", file=sys.stderr)
+        results.append(run_round(session_count, args.duration, args.iterations, args.timeout, args.seed))
+
+    print_report(results, args.verbose)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
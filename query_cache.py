@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 跨会话查询结果缓存
+同一进程内所有会话共用，按规范化后的 SQL 与参数为键缓存查询结果，
+LRU 淘汰，限制条目数与内存占用，条目过期自动失效；
+键中包含所依赖表的数据版本，数据变化后旧结果不会再被命中，并由热更新回调及时清理
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+# 规范化 SQL：合并空白，格式不同但语义相同的查询共用一个键
+def normalize_sql(sql):
+    return ' '.join(sql.split())
+
+
+def _normalize_param(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_normalize_param(v) for v in value)
+    return value
+
+
+# 估算结果占用的内存（字节），只展开列表、元组和字典
+def estimate_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return size
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires_at', 'tables')
+
+    def __init__(self, value, size, expires_at, tables):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tables = tables
+
+
+class QueryCache:
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # tables: 结果依赖的表；versions: 当前数据版本 {表名: 版本号}
+    def make_key(self, sql, params=(), tables=(), versions=None):
+        tables = tuple(sorted(tables))
+        version_part = tuple((versions or {}).get(table) for table in tables)
+        return normalize_sql(sql), _normalize_param(tuple(params)), tables, version_part
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value, True
+
+    def put(self, key, value, tables=()):
+        size = estimate_size(value)
+        # 单个结果超过内存上限时不缓存
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, time.time() + self.ttl, frozenset(tables))
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    # 命中则直接返回，否则调用 compute() 计算并写入缓存
+    # 并发未命中时可能重复计算，但不会阻塞其他键的读取
+    def get_or_compute(self, key, compute, tables=()):
+        value, found = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value, tables)
+        return value
+
+    def fetchall(self, conn, sql, params=(), tables=(), versions=None):
+        key = self.make_key(sql, params, tables, versions)
+
+        def compute():
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+        return self.get_or_compute(key, compute, tables)
+
+    # 清理依赖这些表的条目；tables 为 None 时清空，可直接注册为 CatalogStore 的回调
+    def invalidate(self, tables=None):
+        with self._lock:
+            if tables is None:
+                stale = list(self._entries)
+            else:
+                tables = set(tables)
+                stale = [key for key, entry in self._entries.items() if entry.tables & tables]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 相似药品推荐
+基于适应症、成分、适用人群的字符 n-gram TF-IDF 向量计算药品相似度，
+离线批量算出每个药品的 top-k 近邻写入 medicine_similarity 表，页面只做索引查询
+"""
+
+import hashlib
+import math
+import re
+
+from screening import split_items
+
+# 参与相似度计算的字段及权重
+SIMILARITY_FIELDS = {
+    'indications': 1.0,
+    'ingredients': 1.0,
+    'suitable_for': 0.5,
+    'category': 0.3
+}
+
+# 取值为固定标签的字段只用整项作特征，不拆字符二元组（“处方药”与“非处方药”不应因“处方”相似）
+WHOLE_ITEM_FIELDS = {'category'}
+
+# 相似度低于该值的药品不作为推荐；只共享类别等低权重字段时相似度约在 0.005 左右，仍应推荐
+MIN_SIMILARITY = 0.001
+
+# 向量计算方式的版本，写入内容摘要；计算方式改变后已有的相似药品表会整体重算
+VECTOR_VERSION = 2
+
+_PUNCTUATION = re.compile(r'[\s，。、；：,.;:（）()“”"\'！!？?-]+')
+
+
+def _ensure_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS medicine_similarity (
+        medicine_id INTEGER,
+        similar_id INTEGER,
+        rank INTEGER,
+        score REAL,
+        PRIMARY KEY (medicine_id, rank)
+    )
+    ''')
+    # 记录参与计算的文本摘要，用于判断哪些药品需要重算
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS medicine_similarity_state (
+        medicine_id INTEGER PRIMARY KEY,
+        content_hash TEXT
+    )
+    ''')
+
+
+# 把一个字段切成特征：整项（按顿号拆分）+ 字符二元组
+def _field_terms(field, text):
+    terms = []
+    for item in split_items(text):
+        terms.append(f"{field}:{item}")
+        if field in WHOLE_ITEM_FIELDS:
+            continue
+        chars = _PUNCTUATION.sub('', item)
+        terms.extend(f"{field}:{chars[i:i + 2]}" for i in range(len(chars) - 1))
+    return terms
+
+
+# 各特征的出现次数 {特征: 次数}，字段权重在 TF 变换之后再乘
+def _medicine_terms(row):
+    terms = {}
+    for field in SIMILARITY_FIELDS:
+        for term in _field_terms(field, row[field]):
+            terms[term] = terms.get(term, 0) + 1
+    return terms
+
+
+def _content_hash(row):
+    settings = f"{VECTOR_VERSION}|{sorted(SIMILARITY_FIELDS.items())}"
+    text = '|'.join([settings] + [row[field] or '' for field in SIMILARITY_FIELDS])
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+# 计算 L2 归一化的 TF-IDF 稀疏向量 {特征: 权重}
+# 权重 = 字段权重 × (1 + ln 次数) × IDF；次数为整数，TF 项不会小于 1
+def _tfidf_vectors(term_counts):
+    doc_freq = {}
+    for terms in term_counts.values():
+        for term in terms:
+            doc_freq[term] = doc_freq.get(term, 0) + 1
+
+    n_docs = len(term_counts)
+    vectors = {}
+    for medicine_id, terms in term_counts.items():
+        vector = {
+            term: (SIMILARITY_FIELDS[term.split(':', 1)[0]] * (1 + math.log(count))
+                   * math.log((1 + n_docs) / (1 + doc_freq[term])))
+            for term, count in terms.items()
+        }
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        vectors[medicine_id] = {term: w / norm for term, w in vector.items() if w > 0}
+    return vectors
+
+
+# 计算 top-k 近邻：查询向量只与共享特征的倒排表相乘，不遍历全部药品对
+def _top_k_neighbours(vectors, medicine_ids, top_k):
+    postings = {}
+    for medicine_id, vector in vectors.items():
+        for term, weight in vector.items():
+            postings.setdefault(term, []).append((medicine_id, weight))
+
+    neighbours = {}
+    for medicine_id in medicine_ids:
+        scores = {}
+        for term, weight in vectors[medicine_id].items():
+            for other_id, other_weight in postings[term]:
+                if other_id != medicine_id:
+                    scores[other_id] = scores.get(other_id, 0.0) + weight * other_weight
+        ranked = sorted(((other_id, score) for other_id, score in scores.items() if score >= MIN_SIMILARITY),
+                        key=lambda item: (-item[1], item[0]))[:top_k]
+        neighbours[medicine_id] = ranked
+    return neighbours
+
+
+# 构建（或增量更新）相似药品表
+# 只重算内容变化的药品，以及与变化药品共享特征或曾把它们列为近邻的药品；full=True 时全部重算
+def build_similarity_table(conn, top_k=3, full=False):
+    _ensure_tables(conn)
+    cursor = conn.cursor()
+
+    cursor.execute(f"SELECT id, {', '.join(SIMILARITY_FIELDS)} FROM medicines")
+    columns = ['id'] + list(SIMILARITY_FIELDS)
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    cursor.execute("SELECT medicine_id, content_hash FROM medicine_similarity_state")
+    old_hashes = dict(cursor.fetchall())
+    new_hashes = {row['id']: _content_hash(row) for row in rows}
+
+    changed = {mid for mid, digest in new_hashes.items() if old_hashes.get(mid) != digest}
+    removed = set(old_hashes) - set(new_hashes)
+    if not full and not changed and not removed:
+        return 0
+
+    term_counts = {row['id']: _medicine_terms(row) for row in rows}
+    vectors = _tfidf_vectors(term_counts)
+
+    if full:
+        affected = set(new_hashes)
+    else:
+        changed_terms = set()
+        for mid in changed:
+            changed_terms.update(vectors[mid])
+        affected = set(changed)
+        affected.update(mid for mid, vector in vectors.items() if changed_terms & vector.keys())
+        touched = list(changed | removed)
+        for start in range(0, len(touched), 500):
+            batch = touched[start:start + 500]
+            placeholders = ','.join(['?'] * len(batch))
+            cursor.execute(f"SELECT medicine_id FROM medicine_similarity WHERE similar_id IN ({placeholders})",
+                           batch)
+            affected.update(row[0] for row in cursor.fetchall())
+        affected &= set(new_hashes)
+
+    neighbours = _top_k_neighbours(vectors, sorted(affected), top_k)
+
+    stale = list(affected | removed)
+    for start in range(0, len(stale), 500):
+        batch = stale[start:start + 500]
+        placeholders = ','.join(['?'] * len(batch))
+        cursor.execute(f"DELETE FROM medicine_similarity WHERE medicine_id IN ({placeholders})", batch)
+        cursor.execute(f"DELETE FROM medicine_similarity_state WHERE medicine_id IN ({placeholders})", batch)
+
+    cursor.executemany('''
+    INSERT INTO medicine_similarity (medicine_id, similar_id, rank, score)
+    VALUES (?, ?, ?, ?)
+    ''', [(mid, other_id, rank, score)
+          for mid, ranked in neighbours.items()
+          for rank, (other_id, score) in enumerate(ranked, 1)])
+    cursor.executemany('''
+    INSERT INTO medicine_similarity_state (medicine_id, content_hash)
+    VALUES (?, ?)
+    ''', [(mid, new_hashes[mid]) for mid in affected])
+
+    conn.commit()
+    return len(affected)
+
+
+# 查询相似药品：单次主键范围查找
+def get_similar_medicines(conn, medicine_id, limit=3):
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT m.generic_name, m.brand_name, m.indications, m.price_range, s.score, m.id
+    FROM medicine_similarity s
+    JOIN medicines m ON m.id = s.similar_id
+    WHERE s.medicine_id = ?
+    ORDER BY s.rank
+    LIMIT ?
+    """, (medicine_id, limit))
+    return cursor.fetchall()
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论后台写入
+店铺端把新评论写成 JSONL 文件放入队列目录，后台写入进程按文件领取，
+攒够一批或到达提交间隔后在一个短事务中写入评论、汇总表和已处理文件记录，
+提交后增量更新用户刷评信号、副作用提及和评论分词缓存；页面读连接不会被长事务阻塞
+
+用法:
+    python review_ingest.py spool/ --db medicines.db
+    python review_ingest.py spool/ --db medicines.db --once
+队列文件每行一条评论: medicine_id（须为药品表中已有的编号）, user_id, rating, content, date(YYYY-MM-DD，可选),
+helpful_count(可选), verified_purchase(可选)
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date
+
+from database import EPOCH, connect, init_database, to_day_number
+from review_trends import update_review_rollups
+from reviewer_signals import update_reviewer_signals
+from segmentation import segment_reviews
+from side_effect_mining import mine_side_effects
+
+SPOOL_SUFFIX = '.jsonl'
+CLAIMED_SUFFIX = '.processing'
+REJECTED_FILE = 'rejected.txt'
+
+# 与示例数据的人工标注一致的评论特征
+IRRELEVANT_WORDS = ['物流', '快递', '包装', '客服', '发货', '送货']
+EXAGGERATION_WORDS = ['神药', '神奇', '马上见效', '立刻见效', '根治', '百分百', '药到病除']
+MIN_CONTENT_LENGTH = 4
+
+
+# 评论可信度评分，返回 (可信度, 标签)
+def score_review(content, verified_purchase=0, helpful_count=0):
+    content = (content or '').strip()
+    if len(content) < MIN_CONTENT_LENGTH:
+        return 0.2, '疑似灌水'
+    if any(word in content for word in EXAGGERATION_WORDS):
+        return 0.4, '夸大宣传'
+    if any(word in content for word in IRRELEVANT_WORDS) and len(content) < 30:
+        return 0.3, '无关内容'
+
+    score = 0.6
+    if verified_purchase:
+        score += 0.15
+    score += min(0.1, (helpful_count or 0) / 100)
+    score += min(0.1, len(content) / 200)
+    return round(min(score, 0.95), 2), '可信'
+
+
+# 把一批评论原子地写入队列目录（先写临时文件再改名，写入进程不会读到半个文件）
+def enqueue_reviews(spool_dir, reviews):
+    os.makedirs(spool_dir, exist_ok=True)
+    name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    tmp_path = os.path.join(spool_dir, name + '.tmp')
+    enqueued_at = time.time()
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for review in reviews:
+            record = dict(review)
+            record.setdefault('enqueued_at', enqueued_at)
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    path = os.path.join(spool_dir, name + SPOOL_SUFFIX)
+    os.replace(tmp_path, path)
+    return path
+
+
+# 校验并转换一条评论，返回待插入的行；不合法时抛出 ValueError
+def prepare_review(record):
+    medicine_id = int(record['medicine_id'])
+    rating = int(record['rating'])
+    if not 1 <= rating <= 5:
+        raise ValueError(f"评分超出范围: {rating}")
+    content = str(record.get('content') or '').strip()
+    helpful_count = int(record.get('helpful_count') or 0)
+    verified = 1 if record.get('verified_purchase') in (1, True, '1', 'true', '是') else 0
+    day = to_day_number(record['date']) if record.get('date') else (date.today() - EPOCH).days
+    credibility, tag = score_review(content, verified, helpful_count)
+    return (medicine_id, str(record.get('user_id') or ''), rating, content, day,
+            helpful_count, verified, credibility, tag)
+
+
+def _ensure_tables(conn):
+    # 已写入的队列文件，与评论在同一事务中记录，崩溃重启后不会重复写入
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS review_ingest_files (
+        file_name TEXT PRIMARY KEY,
+        review_count INTEGER NOT NULL,
+        ingested_at REAL NOT NULL
+    )
+    ''')
+    conn.commit()
+
+
+class ReviewIngestor:
+    def __init__(self, db_path, spool_dir, batch_size=1000, commit_interval=1.0):
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.conn = connect(db_path)
+        _ensure_tables(self.conn)
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self.ingested = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_error = None
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        # 最近提交的 (时间, 条数)，用于计算滑动吞吐量
+        self._recent = deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _claim_files(self):
+        claimed = []
+        # 上次异常退出时领取但未提交的文件
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, '*' + CLAIMED_SUFFIX))):
+            claimed.append(path)
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, '*' + SPOOL_SUFFIX))):
+            target = path[:-len(SPOOL_SUFFIX)] + CLAIMED_SUFFIX
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:  # 被其他写入进程领走
+                continue
+            # 重复投递的同名文件覆盖上次未处理完的同名文件，只处理一次
+            if target not in claimed:
+                claimed.append(target)
+        return claimed
+
+    def _already_ingested(self, file_name):
+        cursor = self.conn.execute("SELECT 1 FROM review_ingest_files WHERE file_name = ?", (file_name,))
+        return cursor.fetchone() is not None
+
+    # 文件中存在于药品表的药品编号
+    def _known_medicines(self, medicine_ids):
+        cursor = self.conn.execute("SELECT id FROM medicines WHERE id IN (SELECT value FROM json_each(?))",
+                                   (json.dumps(sorted(medicine_ids)),))
+        return {row[0] for row in cursor.fetchall()}
+
+    # 一行评论的全部字段都校验通过后才计入，任何一项出错只记入拒绝文件
+    def _read_file(self, path):
+        parsed = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    row = prepare_review(record)
+                    enqueued_at = float(record.get('enqueued_at') or os.path.getmtime(path))
+                except (ValueError, KeyError, TypeError) as e:
+                    self._reject(line, e)
+                    continue
+                parsed.append((line, row, enqueued_at))
+
+        # 药品不存在的评论会进入趋势汇总和副作用统计却无处展示，直接拒绝
+        known = self._known_medicines({row[0] for _, row, _ in parsed})
+        rows = []
+        oldest = None
+        for line, row, enqueued_at in parsed:
+            if row[0] not in known:
+                self._reject(line, ValueError(f"药品不存在: {row[0]}"))
+                continue
+            rows.append(row)
+            oldest = enqueued_at if oldest is None else min(oldest, enqueued_at)
+        return rows, oldest
+
+    def _reject(self, line, error):
+        self.rejected += 1
+        with open(os.path.join(self.spool_dir, REJECTED_FILE), 'a', encoding='utf-8') as f:
+            f.write(f"{error}\t{line.rstrip()}\n")
+
+    # 在一个事务中写入一批文件的评论
+    def _commit(self, files, rows, oldest):
+        cursor = self.conn.cursor()
+        cursor.executemany('''
+        INSERT INTO reviews (medicine_id, user_id, rating, content, date, helpful_count, verified_purchase, credibility_score, tags)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        # 汇总表使用写入时的可信度评分
+        update_review_rollups(self.conn, [(row[0], row[4], row[2], row[7], row[8]) for row in rows], commit=False)
+        now = time.time()
+        cursor.executemany("INSERT INTO review_ingest_files (file_name, review_count, ingested_at) VALUES (?, ?, ?)",
+                           [(os.path.basename(path), count, now) for path, count in files])
+        self.conn.commit()
+
+        for path, _ in files:
+            os.remove(path)
+
+        self.ingested += len(rows)
+        self.batches += 1
+        if oldest is not None:
+            self.last_lag = now - oldest
+            self.max_lag = max(self.max_lag, self.last_lag)
+        self._recent.append((now, len(rows)))
+
+    # 处理队列中当前的全部文件，返回写入的评论数
+    def process_pending(self):
+        files, rows, oldest = [], [], None
+        batch_started = time.time()
+        written = 0
+
+        for path in self._claim_files():
+            file_name = os.path.basename(path)
+            if self._already_ingested(file_name):
+                os.remove(path)
+                continue
+            file_rows, file_oldest = self._read_file(path)
+            files.append((path, len(file_rows)))
+            rows.extend(file_rows)
+            if file_oldest is not None:
+                oldest = file_oldest if oldest is None else min(oldest, file_oldest)
+
+            if len(rows) >= self.batch_size or time.time() - batch_started >= self.commit_interval:
+                self._commit(files, rows, oldest)
+                written += len(rows)
+                files, rows, oldest = [], [], None
+                batch_started = time.time()
+
+        if files:
+            self._commit(files, rows, oldest)
+            written += len(rows)
+
+        if written:
+            # 新评论提交后增量更新用户刷评信号、副作用提及和分词缓存
+            update_reviewer_signals(self.conn)
+            mine_side_effects(self.conn)
+            # 写入线程内直接分词，不另起进程池；词表变化后待重新分词的旧文本每批最多处理 batch_size 段，
+            # 不阻塞写入。历史评论的批量分词用 segmentation.py 命令行
+            segment_reviews(self.conn, workers=1, max_stale=self.batch_size)
+        return written
+
+    def queue_depth(self):
+        return len(glob.glob(os.path.join(self.spool_dir, '*' + SPOOL_SUFFIX)))
+
+    # 最近 window 秒的写入吞吐量（条/秒）
+    def throughput(self, window=60.0):
+        cutoff = time.time() - window
+        while self._recent and self._recent[0][0] < cutoff:
+            self._recent.popleft()
+        return sum(count for _, count in self._recent) / window
+
+    def stats(self):
+        return {
+            'ingested': self.ingested,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'queue_depth': self.queue_depth(),
+            'last_lag_s': self.last_lag,
+            'max_lag_s': self.max_lag,
+            'throughput_per_s': self.throughput(),
+            'last_error': self.last_error
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.process_pending()
+                self.last_error = None
+            except Exception as e:  # 出错的文件保留在队列中，下一轮重试
+                self.last_error = str(e)
+                self.conn.rollback()
+            self._stop.wait(self.commit_interval)
+
+    # 在后台线程中运行（与页面同进程时使用）
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='review-ingest', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='从队列目录持续写入新评论')
+    parser.add_argument('spool', help='队列目录')
+    parser.add_argument('--db', required=True, help='SQLite 数据库路径')
+    parser.add_argument('--batch-size', type=int, default=1000, help='每个事务最多写入的评论数')
+    parser.add_argument('--interval', type=float, default=1.0, help='提交间隔（秒）')
+    parser.add_argument('--report-every', type=float, default=10.0, help='输出统计的间隔（秒）')
+    parser.add_argument('--once', action='store_true', help='处理完当前队列后退出')
+    args = parser.parse_args(argv)
+
+    init_database(args.db).close()
+    ingestor = ReviewIngestor(args.db, args.spool, args.batch_size, args.interval)
+
+    if args.once:
+        written = ingestor.process_pending()
+        print(f"已写入 {written} 条评论，拒绝 {ingestor.rejected} 条", file=sys.stderr)
+        return
+
+    last_report = time.time()
+    try:
+        while True:
+            ingestor.process_pending()
+            if time.time() - last_report >= args.report_every:
+                stats = ingestor.stats()
+                print(f"已写入 {stats['ingested']} 条 | 队列 {stats['queue_depth']} 个文件 | "
+                      f"延迟 {stats['last_lag_s']:.1f} 秒（最大 {stats['max_lag_s']:.1f}）| "
+                      f"吞吐 {stats['throughput_per_s']:.1f} 条/秒 | 拒绝 {stats['rejected']} 条", file=sys.stderr)
+                last_report = time.time()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
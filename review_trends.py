@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论趋势统计
+按药品预先分桶（天、月）累计评论数、评分和、可信度和、可疑标签数，
+新评论写入时增量更新；趋势图只读汇总表，与评论总量无关
+"""
+
+from datetime import timedelta
+
+from database import EPOCH, format_day
+
+# 视为可疑的评论标签
+SUSPICIOUS_TAGS = {'疑似灌水', '无关内容', '夸大宣传'}
+
+# 全部药品合计使用的 medicine_id（药品编号从 1 开始）
+ALL_MEDICINES = 0
+
+
+def _ensure_tables(conn):
+    cursor = conn.cursor()
+    # period: 天桶为天数，月桶为 yyyymm
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS review_rollups (
+        medicine_id INTEGER,
+        bucket TEXT,
+        period INTEGER,
+        review_count INTEGER NOT NULL DEFAULT 0,
+        rating_sum REAL NOT NULL DEFAULT 0,
+        credibility_sum REAL NOT NULL DEFAULT 0,
+        suspicious_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (medicine_id, bucket, period)
+    )
+    ''')
+
+
+def month_of_day(day):
+    d = EPOCH + timedelta(days=int(day))
+    return d.year * 100 + d.month
+
+
+def format_period(bucket, period):
+    if bucket == 'day':
+        return format_day(period)
+    return f"{period // 100}-{period % 100:02d}"
+
+
+# 增量更新汇总表
+# reviews: [(medicine_id, day, rating, credibility_score, tags), ...]
+def update_review_rollups(conn, reviews, commit=True):
+    _ensure_tables(conn)
+
+    # 先在内存中按桶合并，再一次性 upsert，批量写入时每个桶只写一次
+    deltas = {}
+    for medicine_id, day, rating, credibility, tags in reviews:
+        if day is None:
+            continue
+        suspicious = 1 if tags in SUSPICIOUS_TAGS else 0
+        for bucket, period in (('day', int(day)), ('month', month_of_day(day))):
+            for target in (medicine_id, ALL_MEDICINES):
+                key = (target, bucket, period)
+                delta = deltas.get(key)
+                if delta is None:
+                    delta = deltas[key] = [0, 0.0, 0.0, 0]
+                delta[0] += 1
+                delta[1] += rating or 0
+                delta[2] += credibility or 0
+                delta[3] += suspicious
+
+    conn.executemany('''
+    INSERT INTO review_rollups (medicine_id, bucket, period, review_count, rating_sum, credibility_sum, suspicious_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (medicine_id, bucket, period) DO UPDATE SET
+        review_count = review_count + excluded.review_count,
+        rating_sum = rating_sum + excluded.rating_sum,
+        credibility_sum = credibility_sum + excluded.credibility_sum,
+        suspicious_count = suspicious_count + excluded.suspicious_count
+    ''', [key + tuple(delta) for key, delta in deltas.items()])
+    if commit:
+        conn.commit()
+    return len(deltas)
+
+
+# 评论可信度被调整后（如刷评降权），把变化量同步到对应的汇总行，平均可信度保持准确
+# changes: [(medicine_id, day, 可信度变化量), ...]
+def adjust_rollup_credibility(conn, changes):
+    _ensure_tables(conn)
+    deltas = {}
+    for medicine_id, day, delta in changes:
+        if day is None or not delta:
+            continue
+        for bucket, period in (('day', int(day)), ('month', month_of_day(day))):
+            for target in (medicine_id, ALL_MEDICINES):
+                key = (target, bucket, period)
+                deltas[key] = deltas.get(key, 0.0) + delta
+
+    conn.executemany('''
+    UPDATE review_rollups SET credibility_sum = credibility_sum + ?
+    WHERE medicine_id = ? AND bucket = ? AND period = ?
+    ''', [(delta,) + key for key, delta in deltas.items()])
+    return len(deltas)
+
+
+# 从评论表全量重建汇总表
+def rebuild_review_rollups(conn, batch_size=50000):
+    _ensure_tables(conn)
+    conn.execute("DELETE FROM review_rollups")
+    cursor = conn.cursor()
+    cursor.execute("SELECT medicine_id, date, rating, credibility_score, tags FROM reviews")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        update_review_rollups(conn, rows, commit=False)
+    conn.commit()
+
+
+# 汇总表为空而评论表有数据时（首次启动）全量构建一次
+def ensure_review_rollups(conn):
+    _ensure_tables(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM review_rollups)")
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM reviews)")
+    if cursor.fetchone()[0]:
+        rebuild_review_rollups(conn)
+
+
+# 读取趋势数据（主键范围查询）；medicine_id 为 None 时读取全部药品合计
+# 返回 [(时间标签, 评论数, 平均评分, 平均可信度, 可疑占比), ...]
+def get_review_trend(conn, medicine_id=None, bucket='month', limit=24):
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT period, review_count, rating_sum, credibility_sum, suspicious_count
+    FROM review_rollups
+    WHERE medicine_id = ? AND bucket = ?
+    ORDER BY period DESC
+    LIMIT ?
+    """, (ALL_MEDICINES if medicine_id is None else medicine_id, bucket, limit))
+
+    trend = []
+    for period, count, rating_sum, credibility_sum, suspicious_count in reversed(cursor.fetchall()):
+        trend.append((format_period(bucket, period), count, rating_sum / count,
+                      credibility_sum / count, suspicious_count / count))
+    return trend
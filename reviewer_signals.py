@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论用户行为分析
+按评论写入顺序单遍流式扫描，为每个用户维护滚动统计（评论频率、评分方差、未验证购买占比、
+每天涉及药品数），识别集中刷评用户，并把该信号折算进其评论的可信度
+只处理上次扫描之后的新评论，可对千万级评论增量运行
+"""
+
+import json
+
+from review_trends import adjust_rollup_credibility
+from side_effect_mining import adjust_mention_weights
+
+# 滑动窗口天数
+WINDOW_DAYS = 7
+# 单日评论数、窗口内评论数、单日涉及药品数达到这些值视为集中刷评
+BURST_DAILY_REVIEWS = 5
+BURST_WINDOW_REVIEWS = 15
+BURST_DAILY_MEDICINES = 4
+# 评分几乎不变且多为未验证购买，是典型的刷评特征
+FARM_MIN_REVIEWS = 5
+FARM_MAX_RATING_VARIANCE = 0.1
+FARM_MIN_UNVERIFIED_SHARE = 0.5
+# 刷评分数为 1 时可信度最多打五折
+MAX_CREDIBILITY_PENALTY = 0.5
+
+# 刷评分数达到该值才标记；各项信号为“观测值 / 阈值”，封顶为 1
+BURST_THRESHOLD = 0.8
+
+
+def _ensure_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reviewer_stats (
+        user_id TEXT PRIMARY KEY,
+        review_count INTEGER NOT NULL DEFAULT 0,
+        rating_sum REAL NOT NULL DEFAULT 0,
+        rating_sq_sum REAL NOT NULL DEFAULT 0,
+        unverified_count INTEGER NOT NULL DEFAULT 0,
+        max_daily_reviews INTEGER NOT NULL DEFAULT 0,
+        max_window_reviews INTEGER NOT NULL DEFAULT 0,
+        max_daily_medicines INTEGER NOT NULL DEFAULT 0,
+        recent_days TEXT NOT NULL DEFAULT '{}',
+        burst_score REAL NOT NULL DEFAULT 0,
+        applied_factor REAL NOT NULL DEFAULT 1
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviewer_stats_burst ON reviewer_stats (burst_score)")
+    # 扫描进度：已处理到的最大评论编号
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reviewer_scan_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_review_id INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO reviewer_scan_state (id, last_review_id) VALUES (1, 0)")
+
+
+_STAT_FIELDS = ['review_count', 'rating_sum', 'rating_sq_sum', 'unverified_count', 'max_daily_reviews',
+                'max_window_reviews', 'max_daily_medicines', 'recent_days', 'burst_score', 'applied_factor']
+
+
+def _new_state():
+    return {
+        'review_count': 0, 'rating_sum': 0.0, 'rating_sq_sum': 0.0, 'unverified_count': 0,
+        'max_daily_reviews': 0, 'max_window_reviews': 0, 'max_daily_medicines': 0,
+        # {天数: [评论数, [药品编号...]]}，只保留窗口内的天
+        'recent_days': {}, 'burst_score': 0.0, 'applied_factor': 1.0
+    }
+
+
+def _load_states(conn, user_ids):
+    states = {}
+    user_ids = list(user_ids)
+    cursor = conn.cursor()
+    for start in range(0, len(user_ids), 500):
+        batch = user_ids[start:start + 500]
+        placeholders = ','.join(['?'] * len(batch))
+        cursor.execute(f"SELECT user_id, {', '.join(_STAT_FIELDS)} FROM reviewer_stats WHERE user_id IN ({placeholders})",
+                       batch)
+        for row in cursor.fetchall():
+            state = dict(zip(_STAT_FIELDS, row[1:]))
+            state['recent_days'] = {int(day): value for day, value in json.loads(state['recent_days']).items()}
+            states[row[0]] = state
+    return states
+
+
+def _observe(state, day, medicine_id, rating, verified):
+    state['review_count'] += 1
+    state['rating_sum'] += rating or 0
+    state['rating_sq_sum'] += (rating or 0) ** 2
+    if not verified:
+        state['unverified_count'] += 1
+
+    if day is None:
+        return
+    recent = state['recent_days']
+    entry = recent.setdefault(day, [0, []])
+    entry[0] += 1
+    if medicine_id not in entry[1]:
+        entry[1].append(medicine_id)
+
+    # 滑出窗口的天丢弃，状态大小与用户总评论数无关
+    latest = max(recent)
+    for old_day in [d for d in recent if d <= latest - WINDOW_DAYS]:
+        del recent[old_day]
+
+    state['max_daily_reviews'] = max(state['max_daily_reviews'], entry[0])
+    state['max_daily_medicines'] = max(state['max_daily_medicines'], len(entry[1]))
+    window_reviews = sum(count for d, (count, _) in recent.items() if d > day - WINDOW_DAYS and d <= day)
+    state['max_window_reviews'] = max(state['max_window_reviews'], window_reviews)
+
+
+# 0~1 的刷评分数
+def burst_score(state):
+    signals = [
+        min(1.0, state['max_daily_reviews'] / BURST_DAILY_REVIEWS) if state['max_daily_reviews'] > 1 else 0.0,
+        min(1.0, state['max_window_reviews'] / BURST_WINDOW_REVIEWS) if state['max_window_reviews'] > 1 else 0.0,
+        min(1.0, state['max_daily_medicines'] / BURST_DAILY_MEDICINES) if state['max_daily_medicines'] > 1 else 0.0
+    ]
+    score = max(signals)
+
+    count = state['review_count']
+    if count >= FARM_MIN_REVIEWS:
+        mean = state['rating_sum'] / count
+        variance = max(0.0, state['rating_sq_sum'] / count - mean * mean)
+        unverified_share = state['unverified_count'] / count
+        if variance <= FARM_MAX_RATING_VARIANCE and unverified_share >= FARM_MIN_UNVERIFIED_SHARE:
+            score = max(score, 0.6 + 0.4 * unverified_share)
+
+    # 只有达到阈值才算异常，避免正常用户的可信度被轻微扣减
+    return score if score >= BURST_THRESHOLD else 0.0
+
+
+def credibility_factor(score):
+    return 1.0 - MAX_CREDIBILITY_PENALTY * score
+
+
+# 把某用户一段编号范围内评论的可信度乘以 multiplier，变化量记入 changes 供汇总表同步
+# changes: [(评论编号, 药品编号, 日期, 可信度变化量), ...]
+def _rescale_credibility(cursor, changes, user_id, multiplier, first_id, last_id):
+    cursor.execute('''
+    SELECT id, medicine_id, date, credibility_score FROM reviews
+    WHERE user_id = ? AND id BETWEEN ? AND ?
+    ''', (user_id, first_id, last_id))
+    changes.extend((review_id, medicine_id, day, (credibility or 0) * (multiplier - 1))
+                   for review_id, medicine_id, day, credibility in cursor.fetchall())
+    cursor.execute('''
+    UPDATE reviews SET credibility_score = credibility_score * ?
+    WHERE user_id = ? AND id BETWEEN ? AND ?
+    ''', (multiplier, user_id, first_id, last_id))
+
+
+# 增量扫描新评论，更新用户统计，并把刷评信号折算进评论可信度
+# 返回 (处理的评论数, 当前被标记的用户数)
+def update_reviewer_signals(conn, batch_size=50000):
+    _ensure_tables(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_review_id FROM reviewer_scan_state WHERE id = 1")
+    last_review_id = cursor.fetchone()[0]
+
+    processed = 0
+    while True:
+        cursor.execute("""
+        SELECT id, user_id, medicine_id, date, rating, verified_purchase
+        FROM reviews
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+        """, (last_review_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        states = _load_states(conn, {row[1] for row in rows})
+        for review_id, user_id, medicine_id, day, rating, verified in rows:
+            state = states.get(user_id)
+            if state is None:
+                state = states[user_id] = _new_state()
+            _observe(state, day, medicine_id, rating, verified)
+
+        batch_first_id = rows[0][0]
+        batch_last_id = rows[-1][0]
+        changes = []
+        for user_id, state in states.items():
+            state['burst_score'] = burst_score(state)
+            factor = credibility_factor(state['burst_score'])
+            # 本批之前的旧评论按因子变化量调整，本批新评论直接乘当前因子
+            if factor != state['applied_factor']:
+                _rescale_credibility(cursor, changes, user_id, factor / state['applied_factor'],
+                                     0, batch_first_id - 1)
+            if factor != 1.0:
+                _rescale_credibility(cursor, changes, user_id, factor, batch_first_id, batch_last_id)
+            state['applied_factor'] = factor
+        # 趋势汇总表中的可信度和、副作用加权次数同步调整，与评论表在同一事务中提交
+        adjust_rollup_credibility(conn, [change[1:] for change in changes])
+        adjust_mention_weights(conn, [(change[0], change[3]) for change in changes])
+
+        cursor.executemany(f'''
+        INSERT OR REPLACE INTO reviewer_stats (user_id, {', '.join(_STAT_FIELDS)})
+        VALUES (?, {', '.join(['?'] * len(_STAT_FIELDS))})
+        ''', [
+            (user_id,) + tuple(json.dumps(state[field]) if field == 'recent_days' else state[field]
+                               for field in _STAT_FIELDS)
+            for user_id, state in states.items()
+        ])
+
+        last_review_id = batch_last_id
+        cursor.execute("UPDATE reviewer_scan_state SET last_review_id = ? WHERE id = 1", (last_review_id,))
+        conn.commit()
+        processed += len(rows)
+
+    cursor.execute("SELECT COUNT(*) FROM reviewer_stats WHERE burst_score > 0")
+    return processed, cursor.fetchone()[0]
+
+
+# 查询给定用户中被标记为集中刷评的用户 {user_id: 刷评分数}
+def get_flagged_reviewers(conn, user_ids):
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    placeholders = ','.join(['?'] * len(user_ids))
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    SELECT user_id, burst_score FROM reviewer_stats
+    WHERE burst_score > 0 AND user_id IN ({placeholders})
+    """, user_ids)
+    return dict(cursor.fetchall())
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 用药安全筛查
+药物相互作用与过敏成分检查，供安全查询页面和批量筛查脚本共用
+"""
+
+
+# 按顿号拆分多值字段（适应症、成分、适用人群等）
+def split_items(text):
+    if not text:
+        return []
+    return [item.strip() for item in text.split('、') if item.strip()]
+
+
+# 代表“任意其他药物”的通配规则名
+WILDCARD_NAMES = {'其他药物', '任意药物', '任意口服药物'}
+
+SEVERITY_RANK = {'重度': 3, '中度': 2, '轻度': 1}
+
+DUPLICATE_INGREDIENT = '重复成分'
+DUPLICATE_CLASS = '同类药物重复'
+
+
+# 药品名规范化：去掉空白并统一大小写，用作别名表的键
+def normalize_name(name):
+    return ''.join((name or '').split()).lower()
+
+
+# 展开规则一侧的名称：类别名展开为成员药品，否则视为具体药品
+# 返回 (名称集合, 具体程度)，具体程度用于同一药对命中多条规则时取最具体的一条
+def expand_rule_side(name, drug_classes):
+    if name in drug_classes:
+        return drug_classes[name], 1
+    return {name}, 2
+
+
+# 同一药对命中多条规则时，优先具体规则，其次严重程度高的规则
+def _rule_priority(rule):
+    return (rule['specificity'], SEVERITY_RANK.get(rule['severity'], 0))
+
+
+def _put_rule(table, key, rule):
+    current = table.get(key)
+    if current is None or _rule_priority(rule) > _rule_priority(current):
+        table[key] = rule
+
+
+# 为成分名分配整数编号
+def _ingredient_id(ingredient_ids, name):
+    if name not in ingredient_ids:
+        ingredient_ids[name] = len(ingredient_ids)
+    return ingredient_ids[name]
+
+
+# 从数据库一次性载入筛查所需数据，之后每次检查只做字典查找
+# 相互作用在成分层面建立稀疏矩阵 {成分编号: {成分编号: 规则}}，
+# 类别规则在载入时展开；通配规则按成分单独索引
+def build_screening_index(conn):
+    cursor = conn.cursor()
+
+    drug_classes = {}
+    cursor.execute("SELECT class_name, drug_name FROM drug_classes")
+    for class_name, drug_name in cursor.fetchall():
+        drug_classes.setdefault(class_name, set()).add(drug_name)
+
+    # 药品/成分名 -> 所属类别
+    drug_class_names = {}
+    for class_name, drug_names in drug_classes.items():
+        for drug_name in drug_names:
+            drug_class_names.setdefault(drug_name, set()).add(class_name)
+
+    # 药品 -> 成分编号集合；药品名本身也作为一个成分，兼容按商品名书写的规则
+    ingredient_ids = {}
+    medicine_ingredient_ids = {}
+    # 规范化的通用名、品牌名 -> 通用名；通用名优先，避免与其他药品的品牌名冲突
+    aliases = {}
+    cursor.execute("SELECT generic_name, brand_name, ingredients FROM medicines")
+    medicine_ingredients = {}
+    for name, brand_name, ingredients in cursor.fetchall():
+        aliases[normalize_name(name)] = name
+        if brand_name:
+            aliases.setdefault(normalize_name(brand_name), name)
+        medicine_ingredients[name] = ingredients or ''
+        ids = {_ingredient_id(ingredient_ids, name)}
+        ids.update(_ingredient_id(ingredient_ids, item) for item in split_items(ingredients))
+        medicine_ingredient_ids[name] = frozenset(ids)
+
+    cursor.execute("""
+    SELECT drug1, drug2, interaction_type, severity, description, recommendation
+    FROM drug_interactions
+    """)
+    interaction_matrix = {}
+    wildcard_rules = {}
+    drug_rules = {}
+    for drug1, drug2, interaction_type, severity, description, recommendation in cursor.fetchall():
+        rule = {
+            'rule': f"{drug1} + {drug2}",
+            'type': interaction_type,
+            'severity': severity,
+            'description': description,
+            'recommendation': recommendation
+        }
+
+        if drug1 in WILDCARD_NAMES or drug2 in WILDCARD_NAMES:
+            named_side = drug2 if drug1 in WILDCARD_NAMES else drug1
+            if named_side in WILDCARD_NAMES:
+                continue
+            names, specificity = expand_rule_side(named_side, drug_classes)
+            rule = dict(rule, specificity=specificity - 2)
+            for name in names:
+                _put_rule(wildcard_rules, _ingredient_id(ingredient_ids, name), rule)
+                drug_rules.setdefault(name, []).append((drug2 if drug1 == named_side else drug1, rule))
+            continue
+
+        names1, specificity1 = expand_rule_side(drug1, drug_classes)
+        names2, specificity2 = expand_rule_side(drug2, drug_classes)
+        rule = dict(rule, specificity=specificity1 + specificity2)
+        for a in names1:
+            id_a = _ingredient_id(ingredient_ids, a)
+            for b in names2:
+                if a != b:
+                    id_b = _ingredient_id(ingredient_ids, b)
+                    _put_rule(interaction_matrix.setdefault(id_a, {}), id_b, rule)
+                    _put_rule(interaction_matrix.setdefault(id_b, {}), id_a, rule)
+            drug_rules.setdefault(a, []).append((drug2, rule))
+        for b in names2:
+            if drug1 != drug2 or b not in names1:
+                drug_rules.setdefault(b, []).append((drug1, rule))
+
+    return {
+        'interactions': interaction_matrix,
+        'wildcard_rules': wildcard_rules,
+        'drug_rules': drug_rules,
+        'drug_classes': drug_classes,
+        'drug_class_names': {name: frozenset(classes) for name, classes in drug_class_names.items()},
+        'aliases': aliases,
+        'ingredient_ids': ingredient_ids,
+        'ingredient_names': {ingredient_id: name for name, ingredient_id in ingredient_ids.items()},
+        'medicine_ingredient_ids': medicine_ingredient_ids,
+        'medicine_ingredients': medicine_ingredients
+    }
+
+
+# 把输入的通用名或品牌名解析为库中的通用名；库外药品原样返回
+def resolve_medicine(drug, index):
+    return index['aliases'].get(normalize_name(drug), drug.strip())
+
+
+# 药品名 -> 成分编号集合；库外药品按名称本身作为唯一成分
+def ingredient_ids_for(drug, index):
+    drug = resolve_medicine(drug, index)
+    ids = index['medicine_ingredient_ids'].get(drug)
+    if ids is not None:
+        return ids
+    ingredient_id = index['ingredient_ids'].get(drug)
+    return frozenset() if ingredient_id is None else frozenset([ingredient_id])
+
+
+def _make_finding(rule, meds, i, j, id_a, id_b, index):
+    names = index['ingredient_names']
+    finding = dict(rule, drug1=meds[i], drug2=meds[j])
+    finding['ingredient1'] = names.get(id_a, meds[i])
+    finding['ingredient2'] = names.get(id_b, meds[j])
+    return finding
+
+
+# 检查用药清单中两两之间的相互作用
+# 用药清单的成分集合与稀疏相互作用矩阵相乘：只遍历清单内成分所在的行
+def check_interactions(current_meds, index):
+    meds = list(dict.fromkeys(current_meds))
+    matrix = index['interactions']
+    wildcard_rules = index['wildcard_rules']
+
+    # 成分编号 -> 含有该成分的药品位置
+    owners = {}
+    for pos, med in enumerate(meds):
+        for ingredient_id in ingredient_ids_for(med, index):
+            owners.setdefault(ingredient_id, []).append(pos)
+
+    best = {}
+    for id_a, positions_a in owners.items():
+        row = matrix.get(id_a)
+        if row:
+            for id_b in (row.keys() & owners.keys()) if len(row) > len(owners) else row:
+                positions_b = owners.get(id_b)
+                if not positions_b:
+                    continue
+                for i in positions_a:
+                    for j in positions_b:
+                        if i < j:
+                            _put_finding(best, (i, j), row[id_b], meds, i, j, id_a, id_b, index)
+
+        wildcard = wildcard_rules.get(id_a)
+        if wildcard:
+            for i in positions_a:
+                for j in range(len(meds)):
+                    if i < j:
+                        _put_finding(best, (i, j), wildcard, meds, i, j, id_a, None, index)
+                    elif j < i:
+                        _put_finding(best, (j, i), wildcard, meds, j, i, None, id_a, index)
+
+    return [best[pair] for pair in sorted(best)]
+
+
+def _put_finding(best, pair, rule, meds, i, j, id_a, id_b, index):
+    current = best.get(pair)
+    if current is None or _rule_priority(rule) > _rule_priority(current):
+        best[pair] = _make_finding(rule, meds, i, j, id_a, id_b, index)
+
+
+# 查询两种药品之间的相互作用，未命中返回 None
+def lookup_interaction(drug1, drug2, index):
+    if drug1 == drug2:
+        return None
+    interactions = check_interactions([drug1, drug2], index)
+    return interactions[0] if interactions else None
+
+
+# 列出与某药品（及其各成分）相关的全部规则，返回 [(另一方名称, 规则), ...]
+def interactions_for_drug(drug, index):
+    names = index['ingredient_names']
+    related = []
+    seen = set()
+    for ingredient_id in ingredient_ids_for(drug, index):
+        for other, rule in index['drug_rules'].get(names[ingredient_id], []):
+            if id(rule) not in seen:
+                seen.add(id(rule))
+                related.append((other, rule))
+    return related
+
+
+# 检查用药清单中的重复用药：不同名称含相同有效成分，或属于同一药物类别
+# 每个药品的成分和类别作为键做一次哈希分组，耗时与清单长度成正比
+def check_duplications(current_meds, index):
+    meds = list(dict.fromkeys(med.strip() for med in current_meds if med.strip()))
+    medicine_ingredients = index['medicine_ingredients']
+    drug_class_names = index['drug_class_names']
+
+    by_ingredient = {}
+    by_class = {}
+    for pos, med in enumerate(meds):
+        resolved = resolve_medicine(med, index)
+        # 库外药品按名称本身作为唯一成分
+        ingredients = list(dict.fromkeys(split_items(medicine_ingredients.get(resolved)))) or [resolved]
+        classes = set()
+        for name in ingredients + [resolved]:
+            classes.update(drug_class_names.get(name, ()))
+        for ingredient in ingredients:
+            by_ingredient.setdefault(ingredient, []).append(pos)
+        for class_name in sorted(classes):
+            by_class.setdefault(class_name, []).append(pos)
+
+    duplications = []
+    reported = set()
+    for kind, groups in ((DUPLICATE_INGREDIENT, by_ingredient), (DUPLICATE_CLASS, by_class)):
+        # 涉及相同药品的多个成分（或类别）合并为一条
+        merged = {}
+        for shared, positions in groups.items():
+            if len(positions) > 1:
+                merged.setdefault(tuple(positions), []).append(shared)
+        for positions, shared in merged.items():
+            # 同类药物若已按相同成分报告过则不再重复提示
+            if positions in reported:
+                continue
+            reported.add(positions)
+            drugs = [meds[pos] for pos in positions]
+            if kind == DUPLICATE_INGREDIENT:
+                description = f"{'、'.join(drugs)} 均含有 {'、'.join(shared)}，同时服用相当于重复用药，可能导致过量"
+                recommendation = '只保留其中一种，或咨询医生/药师调整剂量'
+                severity = '重度'
+            else:
+                description = f"{'、'.join(drugs)} 同属{'、'.join(shared)}，作用机制相同，叠加使用会增加不良反应风险"
+                recommendation = '一般不建议同时使用同类药物，请咨询医生'
+                severity = '中度'
+            duplications.append({
+                'type': kind,
+                'shared': shared,
+                'drugs': drugs,
+                'severity': severity,
+                'description': description,
+                'recommendation': recommendation
+            })
+    return duplications
+
+
+# 检查药品成分是否含有过敏物质
+# medicine_names 为空时检查整个药品库，否则只检查给定药品
+def find_allergy_warnings(allergies, index, medicine_names=None):
+    medicine_ingredients = index['medicine_ingredients']
+    if medicine_names is None:
+        medicine_names = medicine_ingredients.keys()
+
+    allergy_warnings = []
+    if not allergies:
+        return allergy_warnings
+
+    for med_name in medicine_names:
+        ingredients_str = medicine_ingredients.get(resolve_medicine(med_name, index))
+        if not ingredients_str:
+            continue
+        for allergy in allergies:
+            if allergy in ingredients_str:
+                allergy_warnings.append({
+                    'medicine': med_name,
+                    'allergen': allergy
+                })
+    return allergy_warnings
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论分词缓存
+评论内容只分词一次：按内容哈希去重后交给多个工作进程并行分词，
+结果以整数词编号数组（array('I') 字节串）按内容哈希存入数据库，重复的评论文本只分一次；
+评论分析页面的高频词等后续分析直接读取缓存的词编号
+评论写入进程每批提交后增量分词。缓存记录分词时使用的领域词表：药品表变化导致词表增删词时，
+只把包含这些词的文本标记为待重新分词，旧结果在重新分词前继续可用；
+待重新分词的文本由之后每次增量分词分批处理（写入进程每批限量），不会一次重分全部评论
+
+安装 jieba 时使用 jieba 分词，否则退回到基于药品词表的正向最大匹配
+
+用法:
+    python segmentation.py --db medicines.db --workers 4
+    python segmentation.py --db medicines.db --rebuild
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from array import array
+from collections import Counter, deque
+from multiprocessing import Pool
+
+try:
+    import jieba
+except ImportError:  # 分词库为可选依赖
+    jieba = None
+
+from database import get_data_versions, init_database
+from screening import split_items
+from symptom_search import SYMPTOM_SYNONYMS
+
+TOKENIZER = 'jieba' if jieba is not None else 'fallback'
+
+# 词表之外常见的评论用语，保证退回分词时它们不被拆成单字
+BASE_WORDS = ['效果', '不错', '很好', '一般', '缓解', '副作用', '不舒服', '推荐', '医生', '孩子',
+              '没有', '明显', '感冒', '发烧', '退烧', '头痛', '胃痛', '腹泻', '过敏', '物流', '包装', '客服',
+              '建议', '使用', '见效', '神奇', '神药', '简直']
+
+_SPLIT = re.compile(r'[^\w]+')
+_CJK_RUN = re.compile(r'[一-鿿]+|[a-zA-Z]+|\d+(?:\.\d+)?')
+
+# 每个工作进程持有一份分词器状态
+_worker_vocab = None
+_worker_max_len = 1
+
+
+def content_hash(content):
+    return hashlib.blake2b((content or '').encode('utf-8'), digest_size=8).digest()
+
+
+def _static_words():
+    return set(BASE_WORDS) | set(SYMPTOM_SYNONYMS) | set(SYMPTOM_SYNONYMS.values())
+
+
+# 从药品表和同义词表收集领域词汇，退回分词和 jieba 自定义词典共用
+def build_vocabulary(conn):
+    words = _static_words()
+    cursor = conn.cursor()
+    cursor.execute("SELECT generic_name, brand_name, indications, side_effects, ingredients FROM medicines")
+    for row in cursor.fetchall():
+        for value in row:
+            for item in split_items(value):
+                words.update(word for word in _SPLIT.split(item) if len(word) > 1)
+    return sorted(words)
+
+
+# 词表决定分词结果，其哈希与分词器一起记录在缓存状态中
+def vocabulary_hash(vocabulary):
+    return hashlib.blake2b('\n'.join(vocabulary).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _init_worker(vocabulary):
+    global _worker_vocab, _worker_max_len
+    _worker_vocab = set(vocabulary)
+    _worker_max_len = max((len(word) for word in vocabulary), default=1)
+    if jieba is not None:
+        for word in vocabulary:
+            jieba.add_word(word)
+
+
+# 正向最大匹配：词表中最长的词优先，未登录的汉字单独成词
+def _max_match(run):
+    tokens = []
+    i = 0
+    while i < len(run):
+        for length in range(min(_worker_max_len, len(run) - i), 0, -1):
+            word = run[i:i + length]
+            if length == 1 or word in _worker_vocab:
+                tokens.append(word)
+                i += length
+                break
+    return tokens
+
+
+def segment_text(text):
+    if jieba is not None:
+        return [token for token in jieba.lcut(text or '') if token.strip() and not _SPLIT.fullmatch(token)]
+    tokens = []
+    for run in _CJK_RUN.findall(text or ''):
+        if '一' <= run[0] <= '鿿':
+            tokens.extend(_max_match(run))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+# 分词一批 (内容哈希, 文本)，返回 [(内容哈希, 词列表), ...]
+def segment_chunk(items):
+    return [(key, segment_text(text)) for key, text in items]
+
+
+def _ensure_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS token_vocab (
+        id INTEGER PRIMARY KEY,
+        token TEXT NOT NULL UNIQUE
+    )
+    ''')
+    # tokens 为 array('I') 的字节串；stale 为 1 表示词表变化后待重新分词
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS segmented_texts (
+        content_hash BLOB PRIMARY KEY,
+        tokens BLOB NOT NULL,
+        stale INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS review_segments (
+        review_id INTEGER PRIMARY KEY,
+        content_hash BLOB NOT NULL
+    )
+    ''')
+    # 缓存当前对应的领域词表，词表变化时与新词表比较得出增删的词
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS segmentation_words (
+        word TEXT PRIMARY KEY
+    ) WITHOUT ROWID
+    ''')
+    # vocab_source: 静态词表哈希与药品表数据版本，未变化时不重新收集词表
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS segmentation_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        tokenizer TEXT NOT NULL,
+        vocab_hash TEXT,
+        vocab_source TEXT
+    )
+    ''')
+    # 早期版本的表缺少这些列，补列后按词表不符处理
+    for table, column, definition in (('segmentation_state', 'vocab_hash', 'TEXT'),
+                                      ('segmentation_state', 'vocab_source', 'TEXT'),
+                                      ('segmented_texts', 'stale', 'INTEGER NOT NULL DEFAULT 0')):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_segments_hash ON review_segments (content_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_segmented_texts_stale ON segmented_texts (content_hash) WHERE stale = 1")
+
+
+# 清空缓存（手动重建时）
+def clear_segments(conn):
+    _ensure_tables(conn)
+    for table in ('review_segments', 'segmented_texts', 'token_vocab', 'segmentation_words', 'segmentation_state'):
+        conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+
+
+# 把内容包含任一指定词的已缓存文本标记为待重新分词；只做子串查找，不分词
+# 词表增删某个词只影响包含该词的文本的分词结果
+def _mark_stale(conn, words, batch_size=20000):
+    if not words:
+        return 0
+    words = list(words)
+    stale = set()
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT s.content_hash, r.content
+    FROM review_segments s
+    JOIN reviews r ON r.id = s.review_id
+    """)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        stale.update(key for key, content in rows
+                     if key not in stale and content and any(word in content for word in words))
+    conn.executemany("UPDATE segmented_texts SET stale = 1 WHERE content_hash = ?", [(key,) for key in stale])
+    return len(stale)
+
+
+# 同步领域词表，返回当前词表。药品表和静态词表都未变化时直接读取记录的词表，不重新收集；
+# 词表有增删时只标记受影响的文本，分词器变化时标记全部文本，旧分词结果都保留到重新分词为止
+def _sync_vocabulary(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT tokenizer, vocab_hash, vocab_source FROM segmentation_state WHERE id = 1")
+    state = cursor.fetchone()
+    source = f"{vocabulary_hash(sorted(_static_words()))}:{get_data_versions(conn).get('medicines', 0)}"
+    if state is not None and state[0] == TOKENIZER and state[2] == source:
+        cursor.execute("SELECT word FROM segmentation_words ORDER BY word")
+        return [row[0] for row in cursor.fetchall()]
+
+    vocabulary = build_vocabulary(conn)
+    vocab_hash = vocabulary_hash(vocabulary)
+    cursor.execute("SELECT word FROM segmentation_words")
+    recorded = {row[0] for row in cursor.fetchall()}
+    current = set(vocabulary)
+    if state is not None and state[0] != TOKENIZER:
+        conn.execute("UPDATE segmented_texts SET stale = 1")
+    elif state is not None and state[1] != vocab_hash:
+        _mark_stale(conn, recorded ^ current)
+
+    conn.executemany("DELETE FROM segmentation_words WHERE word = ?", [(word,) for word in recorded - current])
+    conn.executemany("INSERT INTO segmentation_words (word) VALUES (?)", [(word,) for word in current - recorded])
+    conn.execute("INSERT OR REPLACE INTO segmentation_state (id, tokenizer, vocab_hash, vocab_source) VALUES (1, ?, ?, ?)",
+                 (TOKENIZER, vocab_hash, source))
+    conn.commit()
+    return vocabulary
+
+
+class _Vocab:
+    def __init__(self, conn):
+        self.conn = conn
+        cursor = conn.cursor()
+        cursor.execute("SELECT token, id FROM token_vocab")
+        self.ids = dict(cursor.fetchall())
+        self.new = []
+
+    def encode(self, tokens):
+        encoded = array('I')
+        for token in tokens:
+            token_id = self.ids.get(token)
+            if token_id is None:
+                token_id = self.ids[token] = len(self.ids) + 1
+                self.new.append((token_id, token))
+            encoded.append(token_id)
+        return encoded
+
+    def flush(self):
+        self.conn.executemany("INSERT INTO token_vocab (id, token) VALUES (?, ?)", self.new)
+        self.new = []
+
+
+def _missing_hashes(conn, hashes):
+    hashes = list(hashes)
+    known = set()
+    cursor = conn.cursor()
+    for start in range(0, len(hashes), 500):
+        batch = hashes[start:start + 500]
+        placeholders = ','.join(['?'] * len(batch))
+        cursor.execute(f"SELECT content_hash FROM segmented_texts WHERE content_hash IN ({placeholders})", batch)
+        known.update(row[0] for row in cursor.fetchall())
+    return [key for key in hashes if key not in known]
+
+
+def _iter_chunks(items, chunk_size):
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+# 分词 [(内容哈希, 文本), ...]；有进程池时分块并行，限制在途批次数量，与批量筛查相同
+def _segment_items(pool, workers, items, chunk_size):
+    if pool is None:
+        return segment_chunk(items)
+    segmented = []
+    pending = deque()
+    for chunk in _iter_chunks(items, chunk_size):
+        pending.append(pool.apply_async(segment_chunk, (chunk,)))
+        if len(pending) >= workers * 2:
+            segmented.extend(pending.popleft().get())
+    while pending:
+        segmented.extend(pending.popleft().get())
+    return segmented
+
+
+# 待重新分词的文本及其内容（取任一引用它的评论）
+def _stale_texts(conn, limit):
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT t.content_hash,
+           (SELECT r.content FROM review_segments s JOIN reviews r ON r.id = s.review_id
+            WHERE s.content_hash = t.content_hash LIMIT 1)
+    FROM segmented_texts t
+    WHERE t.stale = 1
+    LIMIT ?
+    """, (-1 if limit is None else limit,))
+    return [(key, content or '') for key, content in cursor.fetchall()]
+
+
+# 增量分词尚未处理的评论，并重新分词最多 max_stale 段待更新的文本（None 表示全部），
+# 返回 (处理的评论数, 分词的文本数)
+def segment_reviews(conn, workers=None, batch_size=20000, chunk_size=500, max_stale=None):
+    _ensure_tables(conn)
+    vocabulary = _sync_vocabulary(conn)
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    vocab = _Vocab(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(review_id), 0) FROM review_segments")
+    last_review_id = cursor.fetchone()[0]
+
+    pool = Pool(workers, initializer=_init_worker, initargs=(vocabulary,)) if workers > 1 else None
+    if pool is None:
+        _init_worker(vocabulary)
+
+    reviews_done = 0
+    texts_done = 0
+    try:
+        while True:
+            cursor.execute("SELECT id, content FROM reviews WHERE id > ? ORDER BY id LIMIT ?",
+                           (last_review_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            # 同一批内和已缓存的重复文本都不再分词
+            texts = {}
+            mapping = []
+            for review_id, content in rows:
+                key = content_hash(content)
+                texts.setdefault(key, content or '')
+                mapping.append((review_id, key))
+            todo = [(key, texts[key]) for key in _missing_hashes(conn, texts)]
+            segmented = _segment_items(pool, workers, todo, chunk_size)
+
+            conn.executemany("INSERT OR IGNORE INTO segmented_texts (content_hash, tokens) VALUES (?, ?)",
+                             [(key, vocab.encode(tokens).tobytes()) for key, tokens in segmented])
+            vocab.flush()
+            conn.executemany("INSERT OR REPLACE INTO review_segments (review_id, content_hash) VALUES (?, ?)",
+                             mapping)
+            conn.commit()
+
+            last_review_id = rows[-1][0]
+            reviews_done += len(rows)
+            texts_done += len(segmented)
+
+        remaining = max_stale
+        while remaining is None or remaining > 0:
+            stale = _stale_texts(conn, batch_size if remaining is None else min(batch_size, remaining))
+            if not stale:
+                break
+            segmented = _segment_items(pool, workers, stale, chunk_size)
+            conn.executemany("UPDATE segmented_texts SET tokens = ?, stale = 0 WHERE content_hash = ?",
+                             [(vocab.encode(tokens).tobytes(), key) for key, tokens in segmented])
+            vocab.flush()
+            conn.commit()
+            texts_done += len(segmented)
+            if remaining is not None:
+                remaining -= len(segmented)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return reviews_done, texts_done
+
+
+def load_vocabulary(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, token FROM token_vocab")
+    return dict(cursor.fetchall())
+
+
+# 流式读取已分词评论 (评论编号, 词编号数组)，供后续分析直接使用
+def iter_review_token_ids(conn, medicine_id=None, batch_size=5000):
+    sql = """
+    SELECT s.review_id, t.tokens
+    FROM review_segments s
+    JOIN segmented_texts t ON t.content_hash = s.content_hash
+    """
+    params = ()
+    if medicine_id is not None:
+        sql += " JOIN reviews r ON r.id = s.review_id WHERE r.medicine_id = ?"
+        params = (medicine_id,)
+    cursor = conn.cursor()
+    cursor.execute(sql + " ORDER BY s.review_id", params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for review_id, blob in rows:
+            tokens = array('I')
+            tokens.frombytes(blob)
+            yield review_id, tokens
+
+
+# 读取指定评论的分词结果 {评论编号: [词, ...]}
+def get_review_tokens(conn, review_ids):
+    review_ids = list(review_ids)
+    vocabulary = load_vocabulary(conn)
+    result = {}
+    cursor = conn.cursor()
+    for start in range(0, len(review_ids), 500):
+        batch = review_ids[start:start + 500]
+        placeholders = ','.join(['?'] * len(batch))
+        cursor.execute(f"""
+        SELECT s.review_id, t.tokens
+        FROM review_segments s
+        JOIN segmented_texts t ON t.content_hash = s.content_hash
+        WHERE s.review_id IN ({placeholders})
+        """, batch)
+        for review_id, blob in cursor.fetchall():
+            tokens = array('I')
+            tokens.frombytes(blob)
+            result[review_id] = [vocabulary[token_id] for token_id in tokens]
+    return result
+
+
+# 药品评论中的高频词（两个字及以上）及提及的评论数，直接统计缓存的词编号，返回 [(词, 评论数), ...]
+def top_review_terms(conn, medicine_id, limit=10):
+    counts = Counter()
+    for _, tokens in iter_review_token_ids(conn, medicine_id):
+        counts.update(set(tokens))
+
+    terms = []
+    cursor = conn.cursor()
+    ranked = counts.most_common()
+    step = max(limit * 5, 50)
+    # 单字词（语气词、量词等）不计入，按出现次数分批取词直到凑够
+    for start in range(0, len(ranked), step):
+        batch = ranked[start:start + step]
+        placeholders = ','.join(['?'] * len(batch))
+        cursor.execute(f"SELECT id, token FROM token_vocab WHERE id IN ({placeholders})", [token_id for token_id, _ in batch])
+        words = dict(cursor.fetchall())
+        terms.extend((words[token_id], count) for token_id, count in batch if len(words.get(token_id, '')) > 1)
+        if len(terms) >= limit:
+            break
+    return terms[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对评论内容分词并缓存词编号')
+    parser.add_argument('--db', default=':memory:', help='SQLite 数据库路径，默认使用内置示例数据')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认等于 CPU 核数')
+    parser.add_argument('--batch-size', type=int, default=20000, help='每批读取的评论数')
+    parser.add_argument('--rebuild', action='store_true', help='清空缓存后重新分词')
+    args = parser.parse_args(argv)
+
+    conn = init_database(args.db)
+    if args.rebuild:
+        clear_segments(conn)
+    start = time.time()
+    reviews_done, texts_done = segment_reviews(conn, args.workers, args.batch_size)
+    print(f"分词完成（{TOKENIZER}）: {reviews_done} 条评论，新分词 {texts_done} 段文本，"
+          f"用时 {time.time() - start:.1f} 秒", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论副作用挖掘
+从药品说明书的副作用字段和口语同义词构建副作用词表，编译成一个多模式正则，
+每条评论只扫描一遍；按药品累计提及次数和可信度加权次数写入汇总表，
+详情页和可视化页面直接读汇总表，不在请求时扫描评论
+
+用法:
+    python side_effect_mining.py --db medicines.db
+    python side_effect_mining.py --db medicines.db --rebuild
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+
+from database import init_database
+from screening import split_items
+
+# 口语说法 -> 说明书用语
+SIDE_EFFECT_SYNONYMS = {
+    '胃不舒服': '胃痛',
+    '胃难受': '胃痛',
+    '胃疼': '胃痛',
+    '肚子疼': '腹痛',
+    '肚子痛': '腹痛',
+    '拉肚子': '腹泻',
+    '拉稀': '腹泻',
+    '想吐': '恶心',
+    '反胃': '恶心',
+    '犯恶心': '恶心',
+    '头晕眼花': '头晕',
+    '头昏': '头晕',
+    '晕乎乎': '头晕',
+    '头疼': '头痛',
+    '起疹子': '皮疹',
+    '起红疹': '皮疹',
+    '出疹子': '皮疹',
+    '长疹子': '皮疹',
+    '大便干': '便秘',
+    '拉不出': '便秘',
+    '犯困': '嗜睡',
+    '想睡觉': '嗜睡'
+}
+
+# 提及前出现这些词视为否定（“没有头晕”“无恶心”）
+NEGATION_PREFIXES = ('没有', '没什么', '并无', '无', '没', '未', '不')
+# 提及后不远处出现这些词表示症状被缓解，是疗效而不是副作用（“腹泻很快止住了”）
+RELIEF_WORDS = ('缓解', '好了', '止住', '消失', '减轻', '退了', '没了')
+RELIEF_WINDOW = 6
+
+
+def _ensure_tables(conn):
+    cursor = conn.cursor()
+    # listed: 该副作用是否已写在说明书中
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS side_effect_mentions (
+        medicine_id INTEGER,
+        term TEXT,
+        mention_count INTEGER NOT NULL DEFAULT 0,
+        weighted_count REAL NOT NULL DEFAULT 0,
+        listed INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (medicine_id, term)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS side_effect_scan_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_review_id INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO side_effect_scan_state (id, last_review_id) VALUES (1, 0)")
+
+
+class SideEffectMatcher:
+    # rows: [(id, side_effects, indications), ...]
+    def __init__(self, rows):
+        self.listed = {}
+        self.indications = {}
+        surface = dict(SIDE_EFFECT_SYNONYMS)
+        for medicine_id, side_effects, indications in rows:
+            terms = set(split_items(side_effects))
+            self.listed[medicine_id] = terms
+            self.indications[medicine_id] = indications or ''
+            for term in terms:
+                surface.setdefault(term, term)
+        self.surface = surface
+        # 长词在前，保证“头晕眼花”不会先被“头晕”截断
+        patterns = sorted(surface, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(p) for p in patterns)) if patterns else None
+
+    # 一次扫描找出评论中提及的副作用（规范化后去重）
+    def find(self, medicine_id, text):
+        if not text or self.pattern is None:
+            return set()
+        treated = self.indications.get(medicine_id, '')
+        found = set()
+        for match in self.pattern.finditer(text):
+            start, end = match.span()
+            before = text[max(0, start - 3):start]
+            if any(before.endswith(prefix) for prefix in NEGATION_PREFIXES):
+                continue
+            if any(word in text[end:end + RELIEF_WINDOW] for word in RELIEF_WORDS):
+                continue
+            term = self.surface[match.group()]
+            # 适应症中的症状多半是用药原因，不计为副作用
+            if term in treated:
+                continue
+            found.add(term)
+        return found
+
+    def is_listed(self, medicine_id, term):
+        return term in self.listed.get(medicine_id, ())
+
+
+def build_matcher(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, side_effects, indications FROM medicines")
+    return SideEffectMatcher(cursor.fetchall())
+
+
+# 增量扫描新评论，返回 (扫描的评论数, 提及次数)
+def mine_side_effects(conn, rebuild=False, batch_size=50000):
+    _ensure_tables(conn)
+    if rebuild:
+        # 药品说明书或同义词表变化后，全量重建可按新词表重新统计
+        conn.execute("DELETE FROM side_effect_mentions")
+        conn.execute("UPDATE side_effect_scan_state SET last_review_id = 0 WHERE id = 1")
+    matcher = build_matcher(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_review_id FROM side_effect_scan_state WHERE id = 1")
+    last_review_id = cursor.fetchone()[0]
+
+    scanned = 0
+    mentions = 0
+    while True:
+        cursor.execute("""
+        SELECT id, medicine_id, content, credibility_score
+        FROM reviews
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+        """, (last_review_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        # 先在内存中合并，每个 (药品, 副作用) 只写一次
+        deltas = {}
+        for review_id, medicine_id, content, credibility in rows:
+            for term in matcher.find(medicine_id, content):
+                delta = deltas.get((medicine_id, term))
+                if delta is None:
+                    delta = deltas[(medicine_id, term)] = [0, 0.0]
+                delta[0] += 1
+                delta[1] += credibility or 0
+
+        conn.executemany('''
+        INSERT INTO side_effect_mentions (medicine_id, term, mention_count, weighted_count, listed)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (medicine_id, term) DO UPDATE SET
+            mention_count = mention_count + excluded.mention_count,
+            weighted_count = weighted_count + excluded.weighted_count,
+            listed = excluded.listed
+        ''', [(medicine_id, term, count, weighted, int(matcher.is_listed(medicine_id, term)))
+              for (medicine_id, term), (count, weighted) in deltas.items()])
+
+        last_review_id = rows[-1][0]
+        conn.execute("UPDATE side_effect_scan_state SET last_review_id = ? WHERE id = 1", (last_review_id,))
+        conn.commit()
+        scanned += len(rows)
+        mentions += sum(count for count, _ in deltas.values())
+    conn.commit()
+    return scanned, mentions
+
+
+# 评论可信度被调整后（如刷评降权），把变化量同步到已统计的副作用加权次数
+# changes: [(评论编号, 可信度变化量), ...]；尚未扫描的评论以后按新的可信度统计，这里跳过
+def adjust_mention_weights(conn, changes):
+    _ensure_tables(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_review_id FROM side_effect_scan_state WHERE id = 1")
+    last_review_id = cursor.fetchone()[0]
+    review_deltas = {review_id: delta for review_id, delta in changes if delta and review_id <= last_review_id}
+    if not review_deltas:
+        return 0
+
+    matcher = build_matcher(conn)
+    cursor.execute("SELECT id, medicine_id, content FROM reviews WHERE id IN (SELECT value FROM json_each(?))",
+                   (json.dumps(sorted(review_deltas)),))
+    deltas = {}
+    for review_id, medicine_id, content in cursor.fetchall():
+        for term in matcher.find(medicine_id, content):
+            deltas[(medicine_id, term)] = deltas.get((medicine_id, term), 0.0) + review_deltas[review_id]
+
+    conn.executemany('''
+    UPDATE side_effect_mentions SET weighted_count = weighted_count + ?
+    WHERE medicine_id = ? AND term = ?
+    ''', [(delta, medicine_id, term) for (medicine_id, term), delta in deltas.items()])
+    return len(deltas)
+
+
+# 某药品评论中提及最多的副作用 [(副作用, 提及次数, 加权次数, 是否写在说明书中), ...]
+def get_side_effect_mentions(conn, medicine_id, limit=5):
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT term, mention_count, weighted_count, listed
+    FROM side_effect_mentions
+    WHERE medicine_id = ?
+    ORDER BY weighted_count DESC
+    LIMIT ?
+    """, (medicine_id, limit))
+    return cursor.fetchall()
+
+
+# 全部药品合计 [(副作用, 提及次数, 加权次数), ...]
+def get_top_side_effects(conn, limit=15):
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT term, SUM(mention_count), SUM(weighted_count)
+    FROM side_effect_mentions
+    GROUP BY term
+    ORDER BY SUM(weighted_count) DESC
+    LIMIT ?
+    """, (limit,))
+    return cursor.fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='从评论中挖掘副作用提及并按药品汇总')
+    parser.add_argument('--db', default=':memory:', help='SQLite 数据库路径，默认使用内置示例数据')
+    parser.add_argument('--rebuild', action='store_true', help='清空汇总表后全量重新扫描')
+    args = parser.parse_args(argv)
+
+    conn = init_database(args.db)
+    start = time.time()
+    scanned, mentions = mine_side_effects(conn, args.rebuild)
+    print(f"扫描 {scanned} 条评论，发现 {mentions} 次副作用提及，用时 {time.time() - start:.1f} 秒",
+          file=sys.stderr)
+    for term, count, weighted in get_top_side_effects(conn):
+        print(f"{term}\t{count}\t{weighted:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 预构建快照
+把启动时构建较慢的预计算索引（筛选项、相互作用与过敏成分索引、症状搜索索引）写入一个带版本号的二进制文件，
+工作进程启动时直接载入，省去从数据库重建这几个索引的时间；药品目录等其余索引仍从数据库构建。
+文件以 mmap 打开，只读取目录；各索引在首次访问时解码到本进程内存，进程之间不共享。
+索引以带类型标记的 JSON 存储，不使用 pickle，载入快照不会执行文件中的代码。
+快照只对构建它的数据库有效：记录数据库标识和相关表的数据版本，任一不同即视为过期
+
+文件布局:
+    MAGIC(8) | 格式版本(uint16) | 目录长度(uint32) | 目录 JSON | 各数据段（按 8 字节对齐）
+目录 JSON 记录每个数据段的 offset/length/kind 以及快照元数据
+
+用法:
+    python snapshot.py build catalog.snapshot --db medicines.db
+    python snapshot.py info catalog.snapshot
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+from database import get_data_versions, get_database_id, init_database
+from screening import build_screening_index, split_items
+from symptom_search import SymptomIndex, build_symptom_index
+
+MAGIC = b'SYSNAP\x00\x01'
+FORMAT_VERSION = 4
+_HEADER = struct.Struct('<8sHI')
+_ALIGN = 8
+
+
+# 快照内容依赖的表
+SNAPSHOT_TABLES = ['medicines', 'drug_interactions', 'drug_classes']
+
+
+# 快照依赖的各表数据版本；版本号由写入时的触发器维护，读取不需要扫描数据
+def snapshot_versions(conn):
+    versions = get_data_versions(conn)
+    return {table: versions[table] for table in SNAPSHOT_TABLES}
+
+
+# 索引编码为 JSON：集合、元组、非字符串键的字典用标记对象表示；
+# 被多处引用的字典（如相互作用规则）只写一次，其余位置写引用，载入后仍是同一对象
+def _encode_index(obj):
+    seen = set()
+    shared = set()
+
+    def find_shared(value):
+        if isinstance(value, dict):
+            if id(value) in seen:
+                shared.add(id(value))
+                return
+            seen.add(id(value))
+            for item in value.values():
+                find_shared(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, (dict, list, tuple)):
+                    find_shared(item)
+
+    find_shared(obj)
+    refs = {}
+
+    def encode(value):
+        if isinstance(value, dict):
+            if id(value) in refs:
+                return {'__ref__': refs[id(value)]}
+            if all(isinstance(key, str) and not key.startswith('__') for key in value):
+                encoded = {key: encode(item) for key, item in value.items()}
+            else:
+                encoded = {'__map__': [[encode(key), encode(item)] for key, item in value.items()]}
+            if id(value) in shared:
+                refs[id(value)] = len(refs)
+                return {'__def__': refs[id(value)], 'value': encoded}
+            return encoded
+        if isinstance(value, list):
+            return [encode(item) for item in value]
+        if isinstance(value, tuple):
+            return {'__tuple__': [encode(item) for item in value]}
+        if isinstance(value, (set, frozenset)):
+            return {'__set__': list(value)}
+        return value
+
+    document = {'shared': len(shared), 'index': encode(obj)}
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _decode_index(data):
+    def hook(obj):
+        if '__tuple__' in obj:
+            return tuple(obj['__tuple__'])
+        if '__set__' in obj:
+            return frozenset(obj['__set__'])
+        if '__map__' in obj:
+            return {tuple(key) if isinstance(key, list) else key: value for key, value in obj['__map__']}
+        return obj
+
+    document = json.loads(data.decode('utf-8'), object_hook=hook)
+    if not document['shared']:
+        return document['index']
+
+    # 按写出时的先后顺序替换引用：定义总是先于引用出现
+    defined = {}
+
+    def resolve(value):
+        if isinstance(value, dict):
+            if '__def__' in value:
+                resolved = defined[value['__def__']] = resolve(value['value'])
+                return resolved
+            if '__ref__' in value:
+                return defined[value['__ref__']]
+            for key, item in value.items():
+                if isinstance(item, (dict, list, tuple)):
+                    value[key] = resolve(item)
+            return value
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                if isinstance(item, (dict, list, tuple)):
+                    value[i] = resolve(item)
+            return value
+        if isinstance(value, tuple) and any(isinstance(item, (dict, list, tuple)) for item in value):
+            return tuple(resolve(item) for item in value)
+        return value
+
+    return resolve(document['index'])
+
+
+# 多维筛选页面的筛选项
+def build_facets(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT indications, suitable_for, ingredients, price_range, category FROM medicines")
+    indications, groups, ingredients, prices, categories = set(), set(), set(), [], []
+    for row in cursor.fetchall():
+        indications.update(split_items(row[0]))
+        groups.update(split_items(row[1]))
+        ingredients.update(split_items(row[2]))
+        if row[3] not in prices:
+            prices.append(row[3])
+        if row[4] not in categories:
+            categories.append(row[4])
+    return {
+        'indications': sorted(indications),
+        'groups': sorted(groups),
+        'ingredients': sorted(ingredients),
+        'prices': prices,
+        'categories': categories
+    }
+
+
+def build_snapshot(conn, path):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM medicines")
+    medicine_count = cursor.fetchone()[0]
+
+    sections = []
+    sections.append(('facets', 'json', json.dumps(build_facets(conn), ensure_ascii=False).encode('utf-8')))
+    sections.append(('screening_index', 'index', _encode_index(build_screening_index(conn))))
+    sections.append(('symptom_index', 'index', _encode_index(build_symptom_index(conn).state())))
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'database_id': get_database_id(conn),
+        'versions': snapshot_versions(conn),
+        'medicine_count': medicine_count
+    }
+
+    # 先算目录长度再定偏移：目录里的偏移值位数会影响目录自身长度，迭代到稳定为止
+    toc = {'meta': meta, 'sections': {}}
+    header_size = 0
+    while True:
+        offset = header_size
+        for name, kind, data in sections:
+            offset += -offset % _ALIGN
+            toc['sections'][name] = {'offset': offset, 'length': len(data), 'kind': kind}
+            offset += len(data)
+        toc_bytes = json.dumps(toc, ensure_ascii=False).encode('utf-8')
+        new_header_size = _HEADER.size + len(toc_bytes)
+        if new_header_size == header_size:
+            break
+        header_size = new_header_size
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(toc_bytes)))
+        f.write(toc_bytes)
+        for name, kind, data in sections:
+            f.write(b'\0' * (toc['sections'][name]['offset'] - f.tell()))
+            f.write(data)
+    # 原子替换，正在读旧快照的进程不受影响
+    os.replace(tmp_path, path)
+    return meta
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, toc_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是识药匙快照文件")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"快照格式版本 {version} 与当前程序支持的版本 {FORMAT_VERSION} 不一致")
+
+        toc = json.loads(bytes(self._view[_HEADER.size:_HEADER.size + toc_length]).decode('utf-8'))
+        self.meta = toc['meta']
+        self._sections = toc['sections']
+        self._loaded = {}
+
+    def _raw(self, name):
+        section = self._sections[name]
+        return self._view[section['offset']:section['offset'] + section['length']]
+
+    # 索引只在第一次访问时解码
+    def _load(self, name):
+        if name not in self._loaded:
+            section = self._sections[name]
+            raw = bytes(self._raw(name))
+            if section['kind'] == 'json':
+                self._loaded[name] = json.loads(raw.decode('utf-8'))
+            elif section['kind'] == 'index':
+                self._loaded[name] = _decode_index(raw)
+            else:
+                raise ValueError(f"未知的快照数据段类型 {section['kind']}")
+        return self._loaded[name]
+
+    @property
+    def facets(self):
+        return self._load('facets')
+
+    @property
+    def screening_index(self):
+        return self._load('screening_index')
+
+    @property
+    def symptom_index(self):
+        if 'symptom_index.object' not in self._loaded:
+            self._loaded['symptom_index.object'] = SymptomIndex.from_state(self._load('symptom_index'))
+        return self._loaded['symptom_index.object']
+
+    @property
+    def versions(self):
+        return self.meta['versions']
+
+    def matches(self, conn):
+        return (self.meta['database_id'] == get_database_id(conn)
+                and self.versions == snapshot_versions(conn))
+
+    def close(self):
+        self._loaded.clear()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+
+# 打开快照，文件不存在或与数据库不一致时返回 None
+def open_snapshot(path, conn=None):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        snapshot = Snapshot(path)
+    except ValueError:
+        return None
+    if conn is not None and not snapshot.matches(conn):
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='构建或查看识药匙预构建快照')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='从数据库构建快照')
+    build_parser.add_argument('output', help='快照文件路径')
+    build_parser.add_argument('--db', required=True, help='SQLite 数据库文件路径，快照只对该数据库有效')
+
+    info_parser = subparsers.add_parser('info', help='查看快照信息')
+    info_parser.add_argument('path', help='快照文件路径')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.time()
+        meta = build_snapshot(init_database(args.db), args.output)
+        print(f"快照已写入 {args.output}: {meta['medicine_count']} 种药品，用时 {time.time() - start:.1f} 秒",
+              file=sys.stderr)
+    else:
+        snapshot = Snapshot(args.path)
+        print(json.dumps(snapshot.meta, ensure_ascii=False, indent=2))
+        for name, section in snapshot._sections.items():
+            print(f"{name:40s} {section['kind']:8s} {section['length']:>12d} 字节")
+        snapshot.close()
+
+
+if __name__ == '__main__':
+    main()
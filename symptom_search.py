@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 症状搜索
+对适应症与副作用文本建立字符二元组倒排索引，按 BM25 排序，
+支持“孩子发烧头痛”这类自由文本查询并按适用人群过滤
+"""
+
+import heapq
+import math
+import re
+
+from screening import split_items
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 副作用中出现查询症状时降权：该药可能引起而不是缓解这个症状
+SIDE_EFFECT_PENALTY = 0.5
+
+# 口语症状 -> 说明书用语
+SYMPTOM_SYNONYMS = {
+    '发烧': '发热',
+    '高烧': '发热',
+    '拉肚子': '腹泻',
+    '拉稀': '腹泻',
+    '胃疼': '胃痛',
+    '肚子疼': '腹痛',
+    '嗓子疼': '咽喉肿痛',
+    '喉咙痛': '咽喉肿痛',
+    '牙疼': '牙痛',
+    '头疼': '头痛',
+    '抽筋': '钙缺乏',
+    '缺钙': '钙缺乏'
+}
+
+# 查询中的人群词 -> suitable_for 中的人群
+POPULATION_WORDS = {
+    '孩子': '儿童',
+    '小孩': '儿童',
+    '宝宝': '儿童',
+    '儿童': '儿童',
+    '成人': '成人',
+    '大人': '成人'
+}
+
+# 这些人群值表示任何人都适用
+UNIVERSAL_POPULATIONS = {'全人群'}
+
+_PUNCTUATION = re.compile(r'[\s，。、；：,.;:（）()“”"\'！!？?-]+')
+
+
+def _bigrams(text):
+    chars = _PUNCTUATION.sub('', text)
+    if len(chars) == 1:
+        return [chars]
+    return [chars[i:i + 2] for i in range(len(chars) - 1)]
+
+
+def _tokens(text):
+    tokens = []
+    for item in split_items(text):
+        tokens.extend(_bigrams(item))
+    return tokens
+
+
+# 规范化查询：替换口语症状、抽出人群词
+def parse_query(query):
+    populations = set()
+    for word, population in POPULATION_WORDS.items():
+        if word in query:
+            populations.add(population)
+            query = query.replace(word, ' ')
+    for word, standard in sorted(SYMPTOM_SYNONYMS.items(), key=lambda item: -len(item[0])):
+        query = query.replace(word, f' {standard} ')
+    terms = []
+    for part in query.split():
+        terms.extend(_bigrams(part))
+    return list(dict.fromkeys(terms)), populations
+
+
+class _FieldIndex:
+    def __init__(self, docs):
+        postings = {}
+        doc_len = []
+        for doc_idx, tokens in enumerate(docs):
+            doc_len.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_idx, tf))
+
+        n_docs = len(docs)
+        avg_len = (sum(doc_len) / n_docs) if n_docs else 1.0
+        # 构建时直接算好每个 (词, 文档) 的 BM25 贡献值，查询时只剩累加
+        self.impacts = {}
+        for token, plist in postings.items():
+            idf = math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            doc_ids = tuple(doc_idx for doc_idx, _ in plist)
+            impacts = tuple(
+                idf * tf * (BM25_K1 + 1) /
+                (tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len[doc_idx] / (avg_len or 1.0)))
+                for doc_idx, tf in plist
+            )
+            self.impacts[token] = (doc_ids, impacts)
+
+    @classmethod
+    def from_impacts(cls, impacts):
+        index = cls.__new__(cls)
+        index.impacts = impacts
+        return index
+
+    # 累加查询词的分数 {文档编号: 分数}，只触及倒排表中的文档
+    # 最长的倒排表直接构造成字典，其余逐条合并
+    def score(self, terms):
+        entries = sorted((self.impacts[term] for term in terms if term in self.impacts),
+                         key=lambda entry: -len(entry[0]))
+        if not entries:
+            return {}
+        scores = dict(zip(*entries[0]))
+        for doc_ids, impacts in entries[1:]:
+            get = scores.get
+            for doc_idx, impact in zip(doc_ids, impacts):
+                scores[doc_idx] = get(doc_idx, 0.0) + impact
+        return scores
+
+
+class SymptomIndex:
+    def __init__(self, rows):
+        # rows: [(id, generic_name, brand_name, indications, side_effects, suitable_for), ...]
+        self.rows = rows
+        self.indications = _FieldIndex([_tokens(row[3]) for row in rows])
+        self.side_effects = _FieldIndex([_tokens(row[4]) for row in rows])
+        self.position = {row[0]: doc_idx for doc_idx, row in enumerate(rows)}
+        # 人群 -> 适用的文档编号（已并入“全人群”药品）
+        self.population_docs = {}
+        universal_docs = set()
+        for doc_idx, row in enumerate(rows):
+            for population in split_items(row[5]):
+                if population in UNIVERSAL_POPULATIONS:
+                    universal_docs.add(doc_idx)
+                else:
+                    self.population_docs.setdefault(population, set()).add(doc_idx)
+        for population in set(POPULATION_WORDS.values()) | set(self.population_docs):
+            self.population_docs[population] = frozenset(self.population_docs.get(population, set()) | universal_docs)
+
+    # 索引的全部数据（只含字典、元组、集合等基本类型），用于写入快照
+    def state(self):
+        return {
+            'rows': self.rows,
+            'indications': self.indications.impacts,
+            'side_effects': self.side_effects.impacts,
+            'position': self.position,
+            'population_docs': self.population_docs
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls.__new__(cls)
+        index.rows = state['rows']
+        index.indications = _FieldIndex.from_impacts(state['indications'])
+        index.side_effects = _FieldIndex.from_impacts(state['side_effects'])
+        index.position = state['position']
+        index.population_docs = state['population_docs']
+        return index
+
+    # 返回 [(药品行, 分数, 是否可能引起该症状), ...]，按分数降序
+    # exclude_ids: 不参与排序的药品编号（如患者禁用的药品）
+    def search(self, query, populations=None, limit=10, exclude_ids=None):
+        terms, query_populations = parse_query(query)
+        populations = set(populations or ()) | query_populations
+        if not terms:
+            return []
+
+        scores = self.indications.score(terms)
+        if not scores:
+            return []
+
+        # 人群条件只与命中的文档求交集，不预先合并各人群的全部文档
+        hits = scores.keys()
+        if populations:
+            hits = set().union(*(self.population_docs.get(population, frozenset()).intersection(scores)
+                                 for population in populations))
+        if exclude_ids:
+            hits = set(hits)
+            hits.difference_update(self.position[medicine_id] for medicine_id in exclude_ids
+                                   if medicine_id in self.position)
+        if not hits:
+            return []
+
+        # 副作用命中同一症状的药品降权并标记，只处理仍在结果中的文档
+        side_effect_scores = self.side_effects.score(terms)
+        caution = side_effect_scores.keys() & hits
+        for doc_idx in caution:
+            scores[doc_idx] -= side_effect_scores[doc_idx] * SIDE_EFFECT_PENALTY
+
+        top = heapq.nlargest(limit, hits, key=scores.__getitem__)
+        return [(self.rows[doc_idx], scores[doc_idx], doc_idx in caution) for doc_idx in top if scores[doc_idx] > 0]
+
+
+def build_symptom_index(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT id, generic_name, brand_name, indications, side_effects, suitable_for
+    FROM medicines
+    """)
+    return SymptomIndex(cursor.fetchall())
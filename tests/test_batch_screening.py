@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 批量用药筛查测试
+"""
+
+import csv
+import json
+
+import pytest
+
+from batch_screening import parse_list, run_batch, screen_chunk
+from database import init_database
+from screening import build_screening_index, check_duplications, check_interactions, find_allergy_warnings
+
+PATIENTS = [
+    {'patient_id': 'p1', 'medications': '布洛芬;华法林', 'allergies': ''},
+    {'patient_id': 'p2', 'medications': '芬必得、布洛芬', 'allergies': '维生素D'},
+    {'patient_id': 'p3', 'medications': '布洛芬;华法林', 'allergies': ''},
+    {'patient_id': 'p4', 'medications': '钙尔奇；阿莫西林', 'allergies': '维生素D'},
+    {'patient_id': 'p5', 'medications': '维生素C', 'allergies': ''}
+]
+
+
+@pytest.fixture(scope='module')
+def index():
+    conn = init_database(':memory:')
+    yield build_screening_index(conn)
+    conn.close()
+
+
+def test_parse_list():
+    assert parse_list('布洛芬; 华法林、\n阿司匹林；') == ['布洛芬', '华法林', '阿司匹林']
+    assert parse_list(['布洛芬', ' ', 3]) == ['布洛芬', '3']
+    assert parse_list(None) == []
+
+
+# 缓存按清单复用的结果与逐个患者直接检查一致
+def test_screen_chunk_matches_single_patient_checks(index):
+    count, findings = screen_chunk(PATIENTS, index)
+    assert count == len(PATIENTS)
+    for patient in PATIENTS:
+        meds = parse_list(patient['medications'])
+        allergies = parse_list(patient['allergies'])
+        got = [f for f in findings if f['patient_id'] == patient['patient_id']]
+        assert [(f['finding_type'], f['drug1']) for f in got] == (
+            [('interaction', f['drug1']) for f in check_interactions(meds, index)]
+            + [('duplication', d['drugs'][0]) for d in check_duplications(meds, index)]
+            + [('allergy', w['medicine']) for w in find_allergy_warnings(allergies, index, meds)]
+        )
+    assert [f['patient_id'] for f in findings if f['finding_type'] == 'interaction'] == ['p1', 'p3']
+
+
+def _write_csv(path, patients):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['patient_id', 'medications', 'allergies'])
+        writer.writeheader()
+        writer.writerows(patients)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_batch_streams_findings(tmp_path, workers):
+    input_path = str(tmp_path / 'patients.csv')
+    output_path = str(tmp_path / 'findings.jsonl')
+    _write_csv(input_path, PATIENTS * 3)
+
+    patient_count, finding_count = run_batch(input_path, output_path, workers=workers, chunk_size=4)
+    with open(output_path, encoding='utf-8') as f:
+        findings = [json.loads(line) for line in f]
+    assert patient_count == 15
+    assert finding_count == len(findings)
+    assert [f['patient_id'] for f in findings if f['finding_type'] == 'allergy'] == ['p4'] * 3
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 列式药品目录测试
+"""
+
+import pytest
+
+from catalog import build_catalog
+from database import init_database
+from export import medicine_filter_query
+
+
+@pytest.fixture(scope='module')
+def conn():
+    conn = init_database(':memory:')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope='module')
+def catalog(conn):
+    return build_catalog(conn)
+
+
+# 名称搜索与原先的 LIKE 查询结果一致，ASCII 字母不区分大小写
+@pytest.mark.parametrize('term', ['维生素c', '维生素C', '布洛芬', '芬必得', '素', ' 泰诺 ', '不存在'])
+def test_search_names_matches_like(conn, catalog, term):
+    pattern = f"%{term.strip()}%"
+    expected = [row[0] for row in conn.execute(
+        "SELECT id FROM medicines WHERE generic_name LIKE ? OR brand_name LIKE ? ORDER BY id", (pattern, pattern))]
+    assert [med.id for med in catalog.search_names(term)] == expected
+
+
+def test_search_names_limit_and_blank(catalog):
+    assert len(catalog.search_names('素', limit=1)) == 1
+    assert catalog.search_names('  ') == []
+
+
+# 页面上的目录筛选与导出 SQL 对同一组条件返回相同的药品
+@pytest.mark.parametrize('filters, exclude_ids', [
+    ({'indications': ['头痛', '胃溃疡']}, ()),
+    ({'indications': ['溃疡']}, ()),
+    ({'groups': ['成人', '儿童'], 'categories': ['非处方药', '处方药']}, ()),
+    ({'ingredients': ['维生素C', '葡萄糖酸钙'], 'prices': ['15-30元', '10-25元']}, ()),
+    ({'groups': ['全人群']}, (1, 3)),
+    ({}, (2,))
+])
+def test_filter_matches_export_query(conn, catalog, filters, exclude_ids):
+    expected = [catalog.ids[pos] for pos in catalog.filter(**filters) if catalog.ids[pos] not in exclude_ids]
+    sql, params = medicine_filter_query(exclude_ids=exclude_ids, **filters)
+    assert [row[0] for row in conn.execute(sql, params)] == expected
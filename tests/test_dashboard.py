@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 数据可视化图表预计算测试
+"""
+
+import json
+
+from dashboard import build_dashboard
+from database import init_database
+from review_trends import ensure_review_rollups
+from side_effect_mining import mine_side_effects
+
+
+# 图表在生成时序列化一次，页面取到的是同一份 JSON；需要图表对象时也只解析一次
+def test_dashboard_keeps_serialized_figures():
+    conn = init_database(':memory:')
+    ensure_review_rollups(conn)
+    mine_side_effects(conn)
+    dashboard = build_dashboard(conn)
+    conn.close()
+
+    assert {'category_pie', 'trend_month', 'side_effects', 'ingredients'} <= set(dashboard.figures)
+    spec = dashboard.spec('category_pie')
+    assert isinstance(spec, str) and json.loads(spec)['data']
+    assert dashboard.spec('category_pie') is spec
+    assert dashboard.figure('category_pie') is dashboard.figure('category_pie')
+    assert dashboard.spec('missing') is None and dashboard.figure('missing') is None
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 数据库初始化与迁移测试
+"""
+
+import sqlite3
+
+from database import connect, format_day, init_database, to_day_number
+from hot_reload import CatalogStore
+from review_trends import ensure_review_rollups, get_review_trend
+
+
+# 早期文件数据库的评论表：日期为 TEXT
+def _create_legacy_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE medicines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        generic_name TEXT NOT NULL,
+        brand_name TEXT,
+        indications TEXT,
+        contraindications TEXT,
+        side_effects TEXT,
+        ingredients TEXT,
+        suitable_for TEXT,
+        price_range TEXT,
+        category TEXT
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medicine_id INTEGER,
+        user_id TEXT,
+        rating INTEGER,
+        content TEXT,
+        date TEXT,
+        helpful_count INTEGER,
+        verified_purchase INTEGER,
+        credibility_score REAL,
+        tags TEXT
+    )
+    ''')
+    conn.execute("INSERT INTO medicines (generic_name) VALUES ('布洛芬')")
+    conn.executemany('''
+    INSERT INTO reviews (id, medicine_id, user_id, rating, content, date, credibility_score, tags)
+    VALUES (?, 1, ?, ?, ?, ?, 0.8, '可信')
+    ''', [(3, 'u1', 5, '有效', '2023-10-15'), (7, 'u2', 4, '还行', '2023-11-02'), (9, 'u3', 3, '日期错误', '未知')])
+    conn.commit()
+    conn.close()
+
+
+def test_text_dates_migrated(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    _create_legacy_database(path)
+
+    conn = init_database(path)
+    rows = conn.execute("SELECT id, date, typeof(date) FROM reviews ORDER BY id").fetchall()
+    assert rows == [(3, to_day_number('2023-10-15'), 'integer'),
+                    (7, to_day_number('2023-11-02'), 'integer'),
+                    (9, None, 'null')]
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(reviews)")}
+    assert {'idx_reviews_medicine_date', 'idx_reviews_user'} <= indexes
+
+    # 迁移后可以正常构建趋势汇总，新评论编号接着旧编号
+    ensure_review_rollups(conn)
+    assert [period for period, *_ in get_review_trend(conn, None, 'month')] == ['2023-10', '2023-11']
+    conn.execute("INSERT INTO reviews (medicine_id, date) VALUES (1, 20000)")
+    assert conn.execute("SELECT MAX(id) FROM reviews").fetchone()[0] == 10
+    conn.commit()
+    conn.close()
+
+    # 再次打开不重复迁移
+    conn = init_database(path)
+    assert conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0] == 4
+    conn.close()
+
+
+# 无法解析的日期迁移为 NULL，评论页经 DataFrame 读入后为 NaN，两者都显示为空
+def test_unparseable_date_renders_empty(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    _create_legacy_database(path)
+    conn = init_database(path)
+    days = [day for (day,) in conn.execute("SELECT date FROM reviews ORDER BY id")]
+    conn.close()
+    assert [format_day(day) for day in days] == ['2023-10-15', '2023-11-02', '']
+    assert format_day(float('nan')) == ''
+
+
+def test_new_database_uses_day_numbers():
+    conn = init_database(':memory:')
+    assert conn.execute("SELECT DISTINCT typeof(date) FROM reviews").fetchall() == [('integer',)]
+    conn.close()
+
+
+# 文件数据库：写事务未提交时，读连接和索引重建都只看到已提交的数据，也不会因锁报错
+def test_readers_see_only_committed_writes(tmp_path):
+    path = str(tmp_path / 'medicines.db')
+    init_database(path).close()
+    count_medicines = lambda conn: conn.execute("SELECT COUNT(*) FROM medicines").fetchone()[0]
+    store = CatalogStore(path, {'count': ({'medicines'}, count_medicines)})
+    before = store.get('count')
+
+    writer = connect(path)
+    writer.execute("INSERT INTO medicines (generic_name) VALUES ('未提交药品')")
+    reader = connect(path)
+    assert reader.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert count_medicines(reader) == before
+    assert store.refresh() == set()
+
+    writer.commit()
+    assert count_medicines(reader) == before + 1
+    assert store.refresh() == {'medicines'}
+    assert store.get('count') == before + 1
+    for conn in (reader, writer, store._conn):
+        conn.close()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 压测脚本冒烟测试
+在进程内模拟会话跑一轮完整流程，不需要启动服务端；未安装 streamlit 时跳过
+"""
+
+import pytest
+
+from load_test import percentile
+
+
+def test_percentile_nearest_rank():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert percentile(values, 50) == 5
+    assert percentile(values, 95) == 10
+    assert percentile(values, 0) == 1
+    assert percentile([], 99) == 0.0
+
+
+def test_round_runs_without_server(tmp_path, monkeypatch):
+    pytest.importorskip('streamlit.testing.v1')
+    from load_test import run_round
+
+    monkeypatch.setenv('MEDICINE_DB_PATH', str(tmp_path / 'medicines.db'))
+    monkeypatch.setenv('MEDICINE_SNAPSHOT', str(tmp_path / 'missing.snapshot'))
+    result = run_round(2, iterations=1, timeout=60)
+    assert result['errors'] == 0
+    assert result['reruns'] >= 2 * 4
+    assert {'switch_page', 'search', 'select_medicine', 'symptom_search', 'screen_regimen'} <= set(result['steps'])
+    assert result['p50_ms'] <= result['p95_ms'] <= result['max_ms']
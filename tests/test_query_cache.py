@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 跨会话查询结果缓存测试
+"""
+
+from database import get_data_versions, init_database
+from query_cache import QueryCache
+
+COUNT_SQL = "SELECT COUNT(*) FROM reviews WHERE medicine_id = ?"
+
+
+# 以数据库当前版本为键：写入提交后立即换键，不依赖热更新线程清理
+def test_write_changes_key_without_invalidation():
+    conn = init_database(':memory:')
+    cache = QueryCache()
+    before = cache.fetchall(conn, COUNT_SQL, (1,), ['reviews'], get_data_versions(conn))
+    assert cache.fetchall(conn, COUNT_SQL, (1,), ['reviews'], get_data_versions(conn)) == before
+    assert cache.hits == 1
+
+    conn.execute("INSERT INTO reviews (medicine_id, rating, date) VALUES (1, 5, 19000)")
+    conn.commit()
+    after = cache.fetchall(conn, COUNT_SQL, (1,), ['reviews'], get_data_versions(conn))
+    assert after[0][0] == before[0][0] + 1
+    # 不相关表的查询仍然命中
+    cache.fetchall(conn, "SELECT COUNT(*) FROM medicines", (), ['medicines'], get_data_versions(conn))
+    assert cache.fetchall(conn, "SELECT COUNT(*) FROM medicines", (), ['medicines'], get_data_versions(conn))
+    assert cache.hits == 2
+    conn.close()
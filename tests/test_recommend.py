@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 相似药品推荐测试
+"""
+
+import pytest
+
+from database import init_database
+from recommend import SIMILARITY_FIELDS, _medicine_terms, _tfidf_vectors, build_similarity_table, get_similar_medicines
+
+
+@pytest.fixture
+def conn():
+    conn = init_database(':memory:')
+    build_similarity_table(conn)
+    yield conn
+    conn.close()
+
+
+# 字段权重小于 1 时特征仍应保留（TF 变换后再乘权重）
+def test_fractional_field_weight_keeps_features():
+    rows = {
+        1: {'indications': '胃溃疡', 'ingredients': '甲', 'suitable_for': '成人', 'category': '处方药'},
+        2: {'indications': '感冒', 'ingredients': '乙', 'suitable_for': '儿童', 'category': '非处方药'}
+    }
+    vectors = _tfidf_vectors({mid: _medicine_terms(row) for mid, row in rows.items()})
+    assert 'category:处方药' in vectors[1]
+    assert SIMILARITY_FIELDS['category'] < 1
+
+
+# 只与其他药品共享类别和人群的药品也有推荐，且同类别排在最前
+def test_same_category_recommended(conn):
+    similar = get_similar_medicines(conn, 3)
+    assert similar
+    assert similar[0][0] == '阿莫西林'
+
+
+def test_category_change_updates_neighbours(conn):
+    conn.execute("UPDATE medicines SET category = '保健品' WHERE id = 7")
+    conn.commit()
+    assert build_similarity_table(conn) > 0
+    assert [row[5] for row in get_similar_medicines(conn, 4)][:1] == [8]
+    assert 7 in [row[5] for row in get_similar_medicines(conn, 4)]
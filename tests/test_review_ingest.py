@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论后台写入测试
+"""
+
+import os
+
+import pytest
+
+from database import init_database
+from review_ingest import CLAIMED_SUFFIX, REJECTED_FILE, SPOOL_SUFFIX, ReviewIngestor, enqueue_reviews
+
+
+def _review(medicine_id=1, content='吃了两天头痛缓解了', **extra):
+    return dict({'medicine_id': medicine_id, 'user_id': 'u1', 'rating': 4, 'content': content,
+                 'date': '2024-03-01'}, **extra)
+
+
+@pytest.fixture
+def ingestor(tmp_path):
+    db_path = str(tmp_path / 'medicine.db')
+    init_database(db_path).close()
+    ingestor = ReviewIngestor(db_path, str(tmp_path / 'spool'))
+    yield ingestor
+    ingestor.conn.close()
+
+
+def _review_count(ingestor):
+    return ingestor.conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+
+def _rollup_count(ingestor):
+    return ingestor.conn.execute(
+        "SELECT COALESCE(SUM(review_count), 0) FROM review_rollups WHERE medicine_id = 0 AND bucket = 'day'"
+    ).fetchone()[0]
+
+
+def test_batches_written_and_files_removed(ingestor):
+    before = _review_count(ingestor)
+    enqueue_reviews(ingestor.spool_dir, [_review(), _review(2)])
+    enqueue_reviews(ingestor.spool_dir, [_review(3)])
+    assert ingestor.process_pending() == 3
+    assert _review_count(ingestor) == before + 3
+    assert _rollup_count(ingestor) == 3
+    assert os.listdir(ingestor.spool_dir) == []
+    assert ingestor.process_pending() == 0
+
+
+# 领取后未提交就退出：改名后的文件在重启时重新领取
+def test_claimed_file_reclaimed_after_crash(ingestor):
+    before = _review_count(ingestor)
+    path = enqueue_reviews(ingestor.spool_dir, [_review(), _review(2)])
+    os.replace(path, path[:-len(SPOOL_SUFFIX)] + CLAIMED_SUFFIX)
+
+    restarted = ReviewIngestor(ingestor.db_path, ingestor.spool_dir)
+    assert restarted.process_pending() == 2
+    assert _review_count(restarted) == before + 2
+    assert os.listdir(ingestor.spool_dir) == []
+    restarted.conn.close()
+
+
+# 已提交但来不及删除的文件（或重复投递的同名文件）不会再次写入
+def test_committed_file_not_written_twice(ingestor):
+    before = _review_count(ingestor)
+    path = enqueue_reviews(ingestor.spool_dir, [_review()])
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    assert ingestor.process_pending() == 1
+
+    with open(path[:-len(SPOOL_SUFFIX)] + CLAIMED_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(content)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    assert ingestor.process_pending() == 0
+    assert _review_count(ingestor) == before + 1
+    assert _rollup_count(ingestor) == 1
+    assert os.listdir(ingestor.spool_dir) == []
+
+
+# 任一字段无效的行只记入拒绝文件，不写入评论表
+def test_invalid_lines_rejected_once(ingestor):
+    before = _review_count(ingestor)
+    path = enqueue_reviews(ingestor.spool_dir, [
+        _review(),
+        _review(rating=9),
+        _review(enqueued_at='昨天'),
+        _review(medicine_id=999),
+        {'user_id': 'u2', 'rating': 3}
+    ])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{不是 JSON\n')
+
+    assert ingestor.process_pending() == 1
+    assert ingestor.rejected == 5
+    assert _review_count(ingestor) == before + 1
+    assert _rollup_count(ingestor) == 1
+    with open(os.path.join(ingestor.spool_dir, REJECTED_FILE), encoding='utf-8') as f:
+        rejected = f.read().splitlines()
+    assert len(rejected) == 5
+    assert any(line.startswith('药品不存在: 999') for line in rejected)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论用户行为分析测试
+"""
+
+from database import init_database
+from review_ingest import ReviewIngestor, enqueue_reviews, score_review
+from review_trends import ALL_MEDICINES, ensure_review_rollups
+from reviewer_signals import get_flagged_reviewers
+from side_effect_mining import mine_side_effects
+
+
+def _rollup_credibility(conn, medicine_id, bucket):
+    return conn.execute('''
+    SELECT period, review_count, credibility_sum FROM review_rollups
+    WHERE medicine_id = ? AND bucket = ? ORDER BY period
+    ''', (medicine_id, bucket)).fetchall()
+
+
+def _review_credibility(conn, medicine_id, period_expr):
+    where = '' if medicine_id == ALL_MEDICINES else 'WHERE medicine_id = ?'
+    params = () if medicine_id == ALL_MEDICINES else (medicine_id,)
+    return conn.execute(f'''
+    SELECT {period_expr} AS period, COUNT(*), SUM(credibility_score) FROM reviews
+    {where} GROUP BY period ORDER BY period
+    ''', params).fetchall()
+
+
+def _assert_rollups_match(conn, medicine_ids):
+    for medicine_id in medicine_ids:
+        expected = _review_credibility(conn, medicine_id, 'date')
+        actual = _rollup_credibility(conn, medicine_id, 'day')
+        assert [row[:2] for row in actual] == [row[:2] for row in expected]
+        for (_, _, rollup_sum), (_, _, review_sum) in zip(actual, expected):
+            assert abs(rollup_sum - review_sum) < 1e-9
+        month_sum = sum(row[2] for row in _rollup_credibility(conn, medicine_id, 'month'))
+        assert abs(month_sum - sum(row[2] for row in expected)) < 1e-9
+
+
+BURST_CONTENT = '吃完有点头晕'
+
+
+# 同一用户一天内对多个药品集中评论，分两批写入：第二批会提高因子并调整第一批
+def _ingest_burst(tmp_path):
+    db_path = str(tmp_path / 'medicine.db')
+    conn = init_database(db_path)
+    ensure_review_rollups(conn)
+    spool_dir = str(tmp_path / 'spool')
+    ingestor = ReviewIngestor(db_path, spool_dir)
+    burst = [{'medicine_id': mid % 6 + 1, 'user_id': 'farm', 'rating': 5, 'content': BURST_CONTENT,
+              'date': '2024-03-01'} for mid in range(8)]
+    enqueue_reviews(spool_dir, burst[:2])
+    ingestor.process_pending()
+    enqueue_reviews(spool_dir, burst[2:])
+    ingestor.process_pending()
+    ingestor.conn.close()
+    return conn
+
+
+# 刷评降权改写评论可信度后，趋势汇总表中的可信度和同步调整
+def test_burst_penalty_updates_rollup_credibility(tmp_path):
+    conn = _ingest_burst(tmp_path)
+    assert get_flagged_reviewers(conn, ['farm'])['farm'] > 0
+    first = conn.execute("SELECT credibility_score FROM reviews WHERE user_id = 'farm' ORDER BY id").fetchone()[0]
+    assert first < score_review(BURST_CONTENT)[0]
+    _assert_rollups_match(conn, [ALL_MEDICINES] + list(range(1, 7)))
+    conn.close()
+
+
+# 已统计的副作用加权次数同样按新的可信度调整，与全量重建结果一致
+def test_burst_penalty_updates_side_effect_weights(tmp_path):
+    conn = _ingest_burst(tmp_path)
+    query = "SELECT medicine_id, term, mention_count, weighted_count FROM side_effect_mentions ORDER BY 1, 2"
+    incremental = conn.execute(query).fetchall()
+    assert any(term == '头晕' for _, term, _, _ in incremental)
+
+    mine_side_effects(conn, rebuild=True)
+    rebuilt = conn.execute(query).fetchall()
+    assert [row[:3] for row in incremental] == [row[:3] for row in rebuilt]
+    for row, expected in zip(incremental, rebuilt):
+        assert abs(row[3] - expected[3]) < 1e-9
+    conn.close()
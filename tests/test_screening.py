@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 用药安全筛查测试
+基于 init_database() 内置示例数据验证相互作用规则的展开与优先级、品牌名解析和重复用药分组
+"""
+
+import pytest
+
+from database import init_database
+from screening import (DUPLICATE_CLASS, DUPLICATE_INGREDIENT, build_screening_index, check_duplications,
+                       check_interactions, find_allergy_warnings, interactions_for_drug, lookup_interaction,
+                       resolve_medicine)
+
+
+@pytest.fixture(scope='module')
+def index():
+    conn = init_database(':memory:')
+    yield build_screening_index(conn)
+    conn.close()
+
+
+def rules(findings):
+    return [(f['drug1'], f['drug2'], f['rule'], f['severity']) for f in findings]
+
+
+# 类别规则展开到成员药品，品牌名按成分命中
+def test_class_rule_matches_members(index):
+    assert rules(check_interactions(['芬必得', '利伐沙班'], index)) == [
+        ('芬必得', '利伐沙班', '非甾体抗炎药 + 抗凝药', '重度')
+    ]
+
+
+# 具体药品规则优先于同时命中的类别规则
+def test_literal_rule_preferred_over_class_rule(index):
+    finding = lookup_interaction('布洛芬', '阿司匹林', index)
+    assert finding['rule'] == '布洛芬 + 阿司匹林'
+    assert finding['severity'] == '中度'
+
+
+# 药对顺序与规则书写顺序相反时仍命中具体规则，结果保持输入顺序
+def test_literal_rule_beats_class_rule_regardless_of_order(index):
+    finding = lookup_interaction('华法林', '布洛芬', index)
+    assert finding['rule'] == '布洛芬 + 华法林'
+    assert (finding['drug1'], finding['drug2']) == ('华法林', '布洛芬')
+
+
+# “其他药物”通配规则与清单中任意药品都会触发，且不区分先后
+@pytest.mark.parametrize('other', ['阿莫西林', '维生素C', '库外药品'])
+def test_wildcard_rule_fires_with_any_drug(index, other):
+    for meds in (['蒙脱石散', other], [other, '蒙脱石散']):
+        assert [f['rule'] for f in check_interactions(meds, index)] == ['蒙脱石散 + 其他药物']
+
+
+def test_wildcard_rule_alone_does_not_fire(index):
+    assert check_interactions(['蒙脱石散'], index) == []
+
+
+# 复方药按成分命中规则，并报告涉及的成分
+def test_rule_matches_compound_ingredient(index):
+    finding = lookup_interaction('葡萄糖酸钙', '氢氯噻嗪', index)
+    assert finding['rule'] == '维生素D + 氢氯噻嗪'
+    assert finding['ingredient1'] == '维生素D'
+
+
+def test_no_interaction_between_unrelated_drugs(index):
+    assert check_interactions(['维生素C', '板蓝根颗粒'], index) == []
+
+
+def test_every_pair_reported_once_in_order(index):
+    findings = check_interactions(['布洛芬', '华法林', '阿司匹林', '布洛芬'], index)
+    assert [(f['drug1'], f['drug2']) for f in findings] == [
+        ('布洛芬', '华法林'), ('布洛芬', '阿司匹林'), ('华法林', '阿司匹林')
+    ]
+
+
+def test_interactions_for_drug_lists_class_rules(index):
+    others = {other for other, _ in interactions_for_drug('布洛芬', index)}
+    assert {'阿司匹林', '华法林', '抗凝药'} <= others
+
+
+def test_allergy_warning_on_ingredient(index):
+    assert find_allergy_warnings(['维生素D'], index, ['葡萄糖酸钙', '布洛芬']) == [
+        {'medicine': '葡萄糖酸钙', 'allergen': '维生素D'}
+    ]
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('芬必得', '布洛芬'),
+    (' 泰诺 ', '对乙酰氨基酚'),
+    ('布洛芬', '布洛芬'),
+    ('维生素c', '维生素C'),
+    ('库外药品', '库外药品')
+])
+def test_resolve_medicine(index, name, expected):
+    assert resolve_medicine(name, index) == expected
+
+
+def test_brand_name_uses_generic_ingredients(index):
+    finding = lookup_interaction('芬必得', '华法林', index)
+    assert finding['rule'] == '布洛芬 + 华法林'
+    assert find_allergy_warnings(['维生素D'], index, ['钙尔奇']) == [
+        {'medicine': '钙尔奇', 'allergen': '维生素D'}
+    ]
+
+
+# 品牌名与通用名同时出现是重复用药，而不是相互作用
+def test_brand_and_generic_reported_as_duplicate_ingredient(index):
+    meds = ['芬必得', '布洛芬']
+    duplications = check_duplications(meds, index)
+    assert [(d['type'], d['shared'], d['drugs']) for d in duplications] == [
+        (DUPLICATE_INGREDIENT, ['布洛芬'], ['芬必得', '布洛芬'])
+    ]
+    assert check_interactions(meds, index) == []
+
+
+# 同一组药品共有的多个成分合并为一条
+def test_shared_ingredients_merged(index):
+    duplications = check_duplications(['钙尔奇', '葡萄糖酸钙'], index)
+    assert [(d['type'], d['shared']) for d in duplications] == [
+        (DUPLICATE_INGREDIENT, ['葡萄糖酸钙', '维生素D'])
+    ]
+
+
+def test_same_class_duplicate(index):
+    duplications = check_duplications(['奥美拉唑', '兰索拉唑', '维生素C'], index)
+    assert [(d['type'], d['shared'], d['drugs']) for d in duplications] == [
+        (DUPLICATE_CLASS, ['质子泵抑制剂'], ['奥美拉唑', '兰索拉唑'])
+    ]
+
+
+# 与成分重复涉及完全相同药品的类别重复不再单独报告
+def test_class_duplicate_not_repeated_for_same_drugs(index):
+    duplications = check_duplications(['芬必得', '布洛芬', '阿司匹林'], index)
+    assert [(d['type'], d['drugs']) for d in duplications] == [
+        (DUPLICATE_INGREDIENT, ['芬必得', '布洛芬']),
+        (DUPLICATE_CLASS, ['芬必得', '布洛芬', '阿司匹林'])
+    ]
+    assert [d['type'] for d in check_duplications(['芬必得', '布洛芬'], index)] == [DUPLICATE_INGREDIENT]
+
+
+def test_repeated_entry_and_unrelated_drugs_not_flagged(index):
+    assert check_duplications(['布洛芬', '布洛芬 ', '维生素C', '阿莫西林'], index) == []
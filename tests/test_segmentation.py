@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 评论分词缓存测试
+"""
+
+import pytest
+
+from database import init_database
+from review_ingest import ReviewIngestor, enqueue_reviews
+from segmentation import get_review_tokens, segment_reviews, top_review_terms
+
+
+@pytest.fixture
+def conn():
+    conn = init_database(':memory:')
+    yield conn
+    conn.close()
+
+
+def test_segment_reviews_is_incremental(conn):
+    reviews_done, texts_done = segment_reviews(conn, workers=1)
+    assert reviews_done > 0 and 0 < texts_done <= reviews_done
+    assert segment_reviews(conn, workers=1) == (0, 0)
+
+
+def _add_review(conn, content):
+    conn.execute("INSERT INTO reviews (medicine_id, user_id, rating, content, date) VALUES (1, 'u', 4, ?, 1)",
+                 (content,))
+    conn.commit()
+    return conn.execute("SELECT MAX(id) FROM reviews").fetchone()[0]
+
+
+def _add_medicine(conn, name):
+    conn.execute("INSERT INTO medicines (generic_name, category) VALUES (?, '处方药')", (name,))
+    conn.commit()
+
+
+# 领域词表新增的词只影响包含它的评论：只重新分词这些评论，其余缓存保留
+def test_vocabulary_change_resegments_affected_texts(conn):
+    review_id = _add_review(conn, '吃了布美他尼很好')
+    segment_reviews(conn, workers=1)
+    assert '布美他尼' not in get_review_tokens(conn, [review_id])[review_id]
+
+    _add_medicine(conn, '布美他尼')
+    assert segment_reviews(conn, workers=1) == (0, 1)
+    assert '布美他尼' in get_review_tokens(conn, [review_id])[review_id]
+    # 词表未再变化时不重新收集词表，也没有待处理的文本
+    assert segment_reviews(conn, workers=1) == (0, 0)
+
+
+# 限量重新分词：待更新的文本在重新分词前仍返回旧结果，之后的调用继续处理
+def test_stale_texts_resegmented_in_bounded_batches(conn):
+    review_ids = [_add_review(conn, f'布美他尼第{i}次用') for i in range(3)]
+    segment_reviews(conn, workers=1)
+    _add_medicine(conn, '布美他尼')
+
+    assert segment_reviews(conn, workers=1, max_stale=2) == (0, 2)
+    tokens = get_review_tokens(conn, review_ids)
+    assert sum('布美他尼' in tokens[review_id] for review_id in review_ids) == 2
+    assert all(tokens[review_id] for review_id in review_ids)
+    assert segment_reviews(conn, workers=1, max_stale=2) == (0, 1)
+    tokens = get_review_tokens(conn, review_ids)
+    assert all('布美他尼' in tokens[review_id] for review_id in review_ids)
+
+
+def test_top_review_terms_reads_cache(conn):
+    review_id = _add_review(conn, '头痛缓解了，头痛不再')
+    segment_reviews(conn, workers=1)
+    terms = dict(top_review_terms(conn, 1, limit=50))
+    assert terms['头痛'] >= 1 and '了' not in terms
+    # 同一条评论里重复出现只计一次
+    conn.execute("DELETE FROM reviews WHERE medicine_id = 1 AND id != ?", (review_id,))
+    conn.commit()
+    assert dict(top_review_terms(conn, 1))['头痛'] == 1
+
+
+# 后台写入每批提交后即更新分词缓存
+def test_ingest_segments_new_reviews(tmp_path):
+    db_path = str(tmp_path / 'medicine.db')
+    init_database(db_path).close()
+    spool_dir = str(tmp_path / 'spool')
+    ingestor = ReviewIngestor(db_path, spool_dir)
+    enqueue_reviews(spool_dir, [{'medicine_id': 1, 'user_id': 'u', 'rating': 5, 'content': '头痛缓解了'}])
+    ingestor.process_pending()
+    review_id = ingestor.conn.execute("SELECT MAX(id) FROM reviews").fetchone()[0]
+    assert get_review_tokens(ingestor.conn, [review_id])[review_id] == ['头痛', '缓解', '了']
+    ingestor.conn.close()
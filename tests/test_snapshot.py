@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 预构建快照测试
+"""
+
+import pytest
+
+from database import init_database
+from hot_reload import CatalogStore
+from screening import build_screening_index, check_interactions, interactions_for_drug
+from snapshot import build_facets, build_snapshot, open_snapshot
+from symptom_search import build_symptom_index
+
+
+@pytest.fixture
+def conn():
+    conn = init_database(':memory:')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def snapshot_path(conn, tmp_path):
+    path = str(tmp_path / 'catalog.snapshot')
+    build_snapshot(conn, path)
+    return path
+
+
+def test_indexes_round_trip(conn, snapshot_path):
+    snapshot = open_snapshot(snapshot_path, conn)
+    live = build_screening_index(conn)
+    meds = ['芬必得', '利伐沙班', '蒙脱石散', '阿司匹林']
+    assert check_interactions(meds, snapshot.screening_index) == check_interactions(meds, live)
+    # 规则对象在多处共享，载入后仍按同一对象去重
+    assert interactions_for_drug('布洛芬', snapshot.screening_index) == interactions_for_drug('布洛芬', live)
+    assert snapshot.symptom_index.search('孩子发烧头痛') == build_symptom_index(conn).search('孩子发烧头痛')
+    snapshot.close()
+
+
+# 修改已有行（行数和最大编号不变）也会使快照失效
+def test_update_invalidates_snapshot(conn, snapshot_path):
+    conn.execute("UPDATE drug_interactions SET severity = '轻度' WHERE drug1 = '布洛芬' AND drug2 = '华法林'")
+    conn.commit()
+    assert open_snapshot(snapshot_path, conn) is None
+
+
+def test_new_reviews_keep_snapshot(conn, snapshot_path):
+    conn.execute("INSERT INTO reviews (medicine_id, user_id, rating, content) VALUES (1, 'u', 5, '好')")
+    conn.commit()
+    snapshot = open_snapshot(snapshot_path, conn)
+    assert snapshot is not None
+    snapshot.close()
+
+
+def test_missing_or_foreign_file(conn, tmp_path):
+    assert open_snapshot(str(tmp_path / 'missing.snapshot'), conn) is None
+    other = tmp_path / 'other.snapshot'
+    other.write_bytes(b'not a snapshot' * 4)
+    assert open_snapshot(str(other), conn) is None
+
+
+# 内容相同的另一个数据库（如重新初始化的示例库）标识不同，不使用该快照
+def test_other_database_rejected(snapshot_path):
+    other = init_database(':memory:')
+    assert open_snapshot(snapshot_path, other) is None
+    other.close()
+
+
+# 打开快照后、数据仓库启动前发生的写入：对应索引不使用快照，改为从数据库构建
+def test_store_drops_stale_seed(tmp_path):
+    path = str(tmp_path / 'medicines.db')
+    conn = init_database(path)
+    snapshot_path = str(tmp_path / 'catalog.snapshot')
+    build_snapshot(conn, snapshot_path)
+    snapshot = open_snapshot(snapshot_path, conn)
+    builders = {'facets': (['medicines'], build_facets)}
+    current = CatalogStore(path, builders, seed={'facets': snapshot.facets}, seed_versions=snapshot.versions)
+    assert current.get('facets') is snapshot.facets
+
+    conn.execute("INSERT INTO medicines (generic_name, category) VALUES ('新药', '新类别')")
+    conn.commit()
+    store = CatalogStore(path, builders, seed={'facets': snapshot.facets}, seed_versions=snapshot.versions)
+    assert '新类别' in store.get('facets')['categories']
+    assert '新类别' not in snapshot.facets['categories']
+
+    fresh = CatalogStore(path, builders, seed={'facets': snapshot.facets}, seed_versions=None)
+    assert '新类别' in fresh.get('facets')['categories']
+    for item in (snapshot, current._conn, store._conn, fresh._conn, conn):
+        item.close()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+识药匙 - 症状搜索测试
+"""
+
+import pytest
+
+from database import init_database
+from symptom_search import SymptomIndex, build_symptom_index
+
+
+@pytest.fixture(scope='module')
+def index():
+    conn = init_database(':memory:')
+    yield build_symptom_index(conn)
+    conn.close()
+
+
+def names(results):
+    return [row[1] for row, _, _ in results]
+
+
+# 口语症状规范化，人群词按适用人群过滤
+def test_colloquial_query_with_population(index):
+    assert names(index.search('孩子发烧头痛')) == ['对乙酰氨基酚']
+    assert names(index.search('拉肚子')) == ['蒙脱石散']
+
+
+def test_exclude_ids(index):
+    assert '对乙酰氨基酚' in names(index.search('头痛'))
+    assert '对乙酰氨基酚' not in names(index.search('头痛', exclude_ids={2}))
+
+
+def test_unknown_terms_return_nothing(index):
+    assert index.search('xyz') == []
+
+
+# 副作用中出现查询症状的药品降权并标记
+def test_side_effect_match_penalised():
+    rows = [
+        (1, '甲', '', '头痛、发热', '', '成人'),
+        (2, '乙', '', '头痛、发热', '头痛', '成人'),
+        (3, '丙', '', '咳嗽', '头痛', '成人')
+    ]
+    results = SymptomIndex(rows).search('头痛发热')
+    assert [(row[0], caution) for row, _, caution in results] == [(1, False), (2, True)]
+    assert results[0][1] > results[1][1]
+
+
+def test_population_filter_keeps_universal_medicines():
+    rows = [
+        (1, '甲', '', '发热', '', '成人'),
+        (2, '乙', '', '发热', '', '全人群'),
+        (3, '丙', '', '发热', '', '儿童、成人')
+    ]
+    assert sorted(row[0] for row, _, _ in SymptomIndex(rows).search('宝宝发烧')) == [2, 3]